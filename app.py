@@ -1,18 +1,30 @@
 
 import streamlit as st
-import json
+import functools
 import time
 import os
 import random
 
 # Importamos nuestras utilerías y componentes
 from utils.auth import verify_password, generate_access_code
-from utils.question_manager import select_random_questions, shuffle_options, calculate_score
+from utils.question_manager import calculate_score, is_answer_correct
 from utils.pdf_generator import generate_pdf
 from components.question_display import display_question
 from components.navigation import display_navigation
-from openai_utils.explanations import get_openai_explanation
+from components.exam_runner import display_exam_runner
+from components.question_palette import display_question_palette
+from components.explanation_display import display_explanations, show_saved_explanations
 from screens.user_data_input import user_data_input  # Se importa la función extraída
+from screens.admin_dashboard import admin_dashboard
+from screens.admin_search import admin_search
+from screens.admin_profiler import admin_profiler
+from utils.analytics import record_exam
+from utils.exams import get_exams, exam_time_limit
+from utils.attempts import save_attempt
+from utils.review_queue import record_results
+from utils.seen_items import mark_seen
+from utils import data_versions, metrics, profiler, session_reaper, session_registry
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # ─────────────────────────────────────────────────────────────
 # NUEVO IMPORT para las instrucciones
@@ -35,12 +47,19 @@ def load_css():
 
 
 def load_config():
-    """Carga el archivo data/config.json."""
-    with open('data/config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """
+    data/config.json de la versión de datos de esta sesión: la vigente hasta que
+    empieza un examen y la misma hasta el final (ver utils.data_versions).
+    """
+    return data_versions.bind(st.session_state).config
 
 
+data_versions.start_watcher()
+session_reaper.start_reaper()
 config = load_config()
+metrics.start_server(config.get("metrics_port"))
+session_registry.configure(config)
+session_reaper.configure(config)
 
 
 def initialize_session():
@@ -55,6 +74,8 @@ def initialize_session():
         st.session_state.current_question_index = 0
     if 'answers' not in st.session_state:
         st.session_state.answers = {}
+    if 'answer_positions' not in st.session_state:
+        st.session_state.answer_positions = {}
     if 'marked' not in st.session_state:
         st.session_state.marked = set()
     if 'start_time' not in st.session_state:
@@ -77,7 +98,11 @@ def access_code_generator():
         admin_pass = st.text_input("Admin password for token generation:", type="password", key="gen_admin_pass")
         gen_email = st.text_input("Student email for this exam:", key="gen_email")
 
-        exam_type_choice = st.selectbox("Exam type:", options=["Full", "Short"], index=0, key="gen_exam_type")
+        exams = get_exams(config)
+        exam_choice = st.selectbox(
+            "Exam type:", options=list(exams), format_func=lambda exam_id: exams[exam_id]["title"],
+            index=0, key="gen_exam_type",
+        )
 
         exam_date = st.date_input("Exam date (token will only work on this date):", key="gen_exam_date")
 
@@ -97,7 +122,7 @@ def access_code_generator():
             st.error("Please enter the student's email.")
             return
 
-        bases = config.get("passwords_full_base", []) if exam_type_choice == "Full" else config.get("passwords_short_base", [])
+        bases = exams[exam_choice]["password_bases"]
         if not bases:
             st.error("No base codes configured for this exam type.")
             return
@@ -134,6 +159,8 @@ def authentication_screen():
             st.error("Please enter both email and access code.")
         else:
             if verify_password(token, email):
+                if not concurrent_login_allowed(email, token):
+                    return
                 st.session_state.authenticated = True
                 st.session_state.user_data["email"] = email.strip()
                 st.success("Authentication successful.")
@@ -147,45 +174,32 @@ def authentication_screen():
         st.caption("Administrator section – students should ignore this area.")
         with st.expander("Administrator: Generate student access code", expanded=False):
             access_code_generator()
-
-
-def display_marked_questions_sidebar():
-    """Muestra preguntas marcadas en la barra lateral."""
-    if st.session_state.marked:
-        for index in st.session_state.marked:
-            question_number = index + 1
-            col1, col2 = st.sidebar.columns([3, 1])
-            with col1:
-                if st.button(f"Question {question_number}", key=f"goto_{index}"):
-                    st.session_state.current_question_index = index
-                    st.rerun()
-            with col2:
-                if st.button("X", key=f"unmark_{index}"):
-                    st.session_state.marked.remove(index)
-                    st.rerun()
-
-
-def display_unanswered_questions_sidebar():
-    """Muestra preguntas sin responder."""
-    unanswered_indices = []
-    if 'answers' not in st.session_state or 'selected_questions' not in st.session_state:
-        return
-
-    for i in range(len(st.session_state.selected_questions)):
-        if st.session_state.answers.get(str(i)) is None:
-            unanswered_indices.append(i)
-
-    if unanswered_indices:
-        st.sidebar.subheader("Unanswered Questions")
-        for i in range(0, len(unanswered_indices), 3):
-            current_group_indices = unanswered_indices[i:i+3]
-            cols = st.sidebar.columns(3)
-            for j, index in enumerate(current_group_indices):
-                question_number = index + 1
-                with cols[j]:
-                    if st.button(f"Q {question_number}", key=f"goto_unanswered_{index}"):
-                        st.session_state.current_question_index = index
-                        st.rerun()
+        st.markdown("[Open exam analytics dashboard](?admin=analytics) · [Search questions](?admin=search)"
+                    " · [Rerun profiler](?admin=profiler)")
+
+
+def concurrent_login_allowed(email, token):
+    """
+    Comprueba si el email y código ya están abiertos en otra sesión (ver utils.session_registry).
+    Según la política de config.json lo registra y deja pasar, o lo rechaza.
+    """
+    policy = session_registry.policy(config)
+    if policy == "off":
+        return True
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else ""
+    key = session_registry.access_key(email, token)
+    others = session_registry.concurrent_sessions(key, session_id)
+    if others:
+        action = "blocked" if policy == "block" else "flagged"
+        session_registry.flag_login(email, key, session_id, len(others), action)
+        if policy == "block":
+            st.error("This email and access code are already in use in another open session. "
+                     "Close that session and try again.")
+            return False
+    st.session_state.access_key = key
+    session_registry.heartbeat(session_id, key)
+    return True
 
 
 def exam_screen():
@@ -196,15 +210,18 @@ def exam_screen():
     if st.session_state.start_time is None:
         st.session_state.start_time = time.time()
 
+    # Modo navegador: la paleta de marcadas / sin responder va dentro del componente
+    runner_mode = st.session_state.get("exam_runner", False)
+
     with st.sidebar:
         st.write("User Information")
         st.text_input("Name", value=nombre, disabled=True)
         st.text_input("Email", value=email, disabled=True)
-        display_marked_questions_sidebar()
-        display_unanswered_questions_sidebar()
+        if not runner_mode:
+            display_question_palette()
 
     exam_type = st.session_state.get("exam_type", "full")
-    exam_time_limit_seconds = config.get("time_limit_seconds_short") if exam_type == "short" else config.get("time_limit_seconds", 7200)
+    exam_time_limit_seconds = exam_time_limit(st.session_state.get("exam_id", "full"), exam_type, config)
 
     elapsed_time = time.time() - st.session_state.start_time
     remaining_time = exam_time_limit_seconds - elapsed_time
@@ -220,6 +237,10 @@ def exam_screen():
         st.rerun()
         return
 
+    if runner_mode and not st.session_state.end_exam:
+        display_exam_runner(exam_time_limit_seconds, config["warning_time_seconds"])
+        return
+
     if not st.session_state.end_exam:
         current_index = st.session_state.current_question_index
         question = st.session_state.selected_questions[current_index]
@@ -247,39 +268,194 @@ def exam_screen():
                     st.warning("Please confirm completion using the button above.")
 
 
-def finalize_exam():
-    """Finaliza el examen y muestra resultados."""
-    st.session_state.end_exam = True
-    score = calculate_score()
-    status = "Passed" if score >= config["passing_score"] else "Not Passed"
+def update_review_queue(email):
+    """Envía a la cola de repaso el resultado de cada pregunta respondida."""
+    results = []
+    for idx, question in enumerate(st.session_state.selected_questions):
+        user_answer = st.session_state.answers.get(str(idx))
+        if user_answer is None or not question.get("id"):
+            continue
+        results.append((question["id"], is_answer_correct(question, idx)))
+    record_results(email, results)
+
 
+def show_results_header(score, status, classification_stats):
     st.header("Exam Results")
     st.write(f"Score Obtained: {score}")
     st.write(f"Status: {status}")
 
-    if "classification_stats" in st.session_state:
+    if classification_stats:
         st.sidebar.subheader("Detailed Breakdown by Topic")
-        for clasif, stats in st.session_state.classification_stats.items():
+        for clasif, stats in classification_stats.items():
             percent = (stats["correct"] / stats["total"]) * 100 if stats["total"] > 0 else 0.0
             st.sidebar.write(f"{clasif}: {percent:.2f}%")
 
-    explanations = get_openai_explanation(st.session_state.incorrect_answers)
+
+def _read_pdf(pdf_path):
+    # Se lee al pulsar la descarga: la sesión no guarda los bytes del PDF
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+def show_pdf_download(pdf_path):
+    st.success("Results generated in PDF.")
+    st.download_button(label="Download Results (PDF)", data=functools.partial(_read_pdf, pdf_path),
+                       file_name=os.path.basename(pdf_path), mime="application/pdf")
+
+
+def finalize_exam():
+    """Finaliza el examen y muestra resultados."""
+    final = st.session_state.get("final_result")
+    if final is not None:
+        # Examen ya guardado y su estado soltado (utils.session_reaper): solo se vuelve a pintar
+        show_results_header(final["score"], final["status"], final["classification_stats"])
+        show_saved_explanations(final["explanations"])
+        show_pdf_download(final["pdf_path"])
+        return
+
+    st.session_state.end_exam = True
+    score = calculate_score()
+    status = "Passed" if score >= config["passing_score"] else "Not Passed"
+
+    # Agregados para el panel de analítica (idempotente ante reruns)
+    exam_key = st.session_state.get("attempt_id") or f"{st.session_state.user_data.get('email', '')}|{st.session_state.start_time}"
+    try:
+        record_exam(
+            exam_key,
+            st.session_state.get("exam_type", "unknown"),
+            score,
+            status == "Passed",
+            st.session_state.get("classification_stats"),
+        )
+    except Exception as e:
+        print(f"Error al registrar analítica: {e}")
+
+    if st.session_state.get("metrics_finalized") != exam_key:
+        metrics.inc("exam_finalized_total", exam_type=st.session_state.get("exam_type", "unknown"), status=status)
+        st.session_state.metrics_finalized = exam_key
+
+    show_results_header(score, status, st.session_state.get("classification_stats"))
+
+    # Se muestran mientras llegan; el PDF se genera cuando están todas
+    explanations = display_explanations(st.session_state.incorrect_answers, exam_key)
     st.session_state.explanations = explanations
 
     pdf_path = generate_pdf(st.session_state.user_data, score, status)
-    st.success("Results generated in PDF.")
-    with open(pdf_path, "rb") as f:
-        st.download_button(label="Download Results (PDF)", data=f, file_name=os.path.basename(pdf_path), mime="application/pdf")
+
+    # Intento con las versiones de ítem vistas, para poder re-calificarlo si cambia una clave
+    saved = False
+    try:
+        newly_saved = save_attempt(
+            exam_key,
+            st.session_state.user_data,
+            st.session_state.get("exam_type", "unknown"),
+            st.session_state.start_time,
+            st.session_state.selected_questions,
+            st.session_state.answers,
+            score,
+            status,
+            st.session_state.get("classification_stats"),
+            pdf_path,
+            st.session_state.get("form_id"),
+        )
+        if newly_saved:
+            # Cola de repaso espaciado: las preguntas falladas generan tarjetas
+            update_review_queue(st.session_state.user_data.get("email", ""))
+            # Preguntas vistas: el próximo examen del usuario prefiere las no vistas
+            mark_seen(st.session_state.user_data.get("email", ""),
+                      [q.get("id") for q in st.session_state.selected_questions])
+        saved = True
+    except Exception as e:
+        print(f"Error al guardar el intento: {e}")
+
+    show_pdf_download(pdf_path)
+
+    # Intento guardado y explicaciones completas: se suelta el estado del examen
+    complete = not st.session_state.incorrect_answers or st.session_state.get("explanations_key") == exam_key
+    if saved and complete:
+        session_reaper.release_finished(st.session_state, {
+            "score": score,
+            "status": status,
+            "classification_stats": st.session_state.get("classification_stats"),
+            "explanations": explanations,
+            "pdf_path": pdf_path,
+        })
 
 
 def main_screen():
     exam_screen()
 
 
+def current_screen():
+    """Nombre de la pantalla que corresponde a la sesión (etiqueta de métricas)."""
+    admin = st.query_params.get("admin")
+    if admin == "analytics":
+        return "admin_dashboard"
+    if admin == "search":
+        return "admin_search"
+    if admin == "profiler":
+        return "admin_profiler"
+    if not st.session_state.authenticated:
+        return "authentication_screen"
+    if not st.session_state.user_data.get("nombre"):
+        return "user_data_input"
+    if not st.session_state.end_exam:
+        return "exam_screen"
+    return "finalize_exam"
+
+
 def main():
+    start = time.perf_counter()
+    expired = st.session_state.get("session_expired")
+    if expired:
+        # El reaper soltó la sesión por inactividad (ver utils.session_reaper): se empieza de nuevo
+        st.session_state.clear()
+        if expired == "submitted":
+            st.info("Your session expired while you were away; your exam was graded and saved. "
+                    "Please log in again.")
+        else:
+            st.info("Your session expired after a period of inactivity. Please log in again.")
     initialize_session()
+    screen = current_screen()
+    metrics.set_exam_type(st.session_state.get("exam_type"))
+    ctx = get_script_run_ctx()
+    run = profiler.start(screen, st.session_state.user_data.get("email", ""), ctx.session_id if ctx else "")
+    try:
+        run_screen(screen)
+    finally:
+        # También cuenta los reruns cortados por st.rerun()
+        profiler.stop(run)
+        metrics.observe("exam_rerun_seconds", time.perf_counter() - start,
+                        screen=screen, exam_type=metrics.current_exam_type())
+        if ctx is not None:
+            in_exam = screen == "exam_screen"
+            metrics.record_session(ctx.session_id, st.session_state.get("exam_type") if in_exam else None)
+            deadline = None
+            if in_exam and st.session_state.start_time:
+                deadline = st.session_state.start_time + exam_time_limit(
+                    st.session_state.get("exam_id", "full"), st.session_state.get("exam_type", "full"), config)
+            session_reaper.touch(ctx.session_id, ctx.session_state, deadline)
+            if st.session_state.get("access_key"):
+                # Latido mientras la sesión usa el código; al terminar el examen deja de contar
+                if screen == "finalize_exam":
+                    session_registry.release(ctx.session_id)
+                elif st.session_state.authenticated:
+                    session_registry.heartbeat(ctx.session_id, st.session_state.access_key)
+
+
+def run_screen(screen):
     load_css()
 
+    if screen == "admin_dashboard":
+        admin_dashboard(config)
+        return
+    if screen == "admin_search":
+        admin_search(config)
+        return
+    if screen == "admin_profiler":
+        admin_profiler(config)
+        return
+
     with st.sidebar:
         st.write("Adjust Font Size")
         font_size_multiplier = st.slider("Font Size", min_value=0.8, max_value=2.0, value=1.0, step=0.1, key="font_size_slider")
@@ -292,13 +468,13 @@ def main():
         </style>
     """, unsafe_allow_html=True)
 
-    if not st.session_state.authenticated:
+    if screen == "authentication_screen":
         instructions_tab()
         authentication_screen()
-    elif not st.session_state.user_data.get("nombre"):
+    elif screen == "user_data_input":
         instructions_tab()
         user_data_input()
-    elif not st.session_state.end_exam:
+    elif screen == "exam_screen":
         main_screen()
     else:
         finalize_exam()
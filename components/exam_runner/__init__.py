@@ -0,0 +1,179 @@
+# components/exam_runner/__init__.py
+"""
+Modo de examen en el navegador (componente personalizado "exam_runner").
+
+En el modo normal cada respuesta y cada clic en Previous/Next es un viaje al
+servidor y un rerun completo del script. Aquí el componente recibe la forma
+completa una sola vez por intento (enunciados, opciones ya ordenadas y URLs de
+los medios, sin claves de respuesta) y la navegación, el marcado, la paleta de
+preguntas sin responder y la cuenta atrás ocurren en el navegador.
+
+Las respuestas se envían en lotes con debounce. Cada lote lleva un número de
+secuencia y todos los cambios aún no confirmados. El servidor aplica el lote
+una sola vez y devuelve la secuencia confirmada en 'ack', y el navegador
+descarta lo confirmado. El componente vive en un st.fragment: un lote solo
+vuelve a ejecutar el fragmento, no la página.
+
+Los medios se registran en el MediaFileManager de Streamlit en cada rerun
+completo (los reruns del fragmento no liberan sus referencias).
+"""
+import mimetypes
+import os
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import streamlit as st
+from streamlit import runtime
+from streamlit.components.v1 import declare_component
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils import metrics, session_reaper, session_registry
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_component = declare_component("exam_runner", path=_FRONTEND_DIR)
+
+RUNNER_KEY = "exam_runner"
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.wmv')
+
+
+def register_media(questions: List[Dict[str, Any]]) -> Dict[int, Dict[str, str]]:
+    """
+    {índice de pregunta: {"url", "kind"}} de los medios que existen en disco.
+    Hay que llamarla en cada rerun completo para que Streamlit no los libere.
+    """
+    if not runtime.exists():
+        return {}
+    manager = runtime.get_instance().media_file_mgr
+    media = {}
+    for index, question in enumerate(questions):
+        media_name = (question.get('image') or "").strip()
+        if not media_name:
+            continue
+        media_path = question.get('media_path') or os.path.join("assets", "images", media_name)
+        if not os.path.exists(media_path):
+            continue
+        mimetype = mimetypes.guess_type(media_path)[0] or "application/octet-stream"
+        kind = "video" if media_name.lower().endswith(VIDEO_EXTENSIONS) else "image"
+        try:
+            media[index] = {"url": manager.add(media_path, mimetype, f"exam_runner.{index}"), "kind": kind}
+        except Exception as e:
+            print(f"No se pudo registrar el medio {media_path}: {e}")
+    return media
+
+
+def runner_form(questions: List[Dict[str, Any]], media: Dict[int, Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Forma que se envía al navegador: solo lo que se muestra (nunca claves ni clasificación).
+    """
+    return [
+        {"stem": q["enunciado"], "options": list(q["opciones"]), "media": media.get(i)}
+        for i, q in enumerate(questions)
+    ]
+
+
+def runner_state(state) -> Dict[str, Any]:
+    """
+    Respuestas (posiciones), marcadas y pregunta actual, para restaurar el componente.
+    """
+    positions = state.get("answer_positions", {})
+    return {
+        "positions": [positions.get(str(i)) for i in range(len(state["selected_questions"]))],
+        "marked": sorted(state.get("marked", ())),
+        "current": state.get("current_question_index", 0),
+    }
+
+
+def apply_batch(state, batch: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aplica un lote del navegador a la sesión (idempotente: cada secuencia una sola vez).
+    Devuelve {"changed": respuestas modificadas, "finish": bool, "need_form": bool}.
+    """
+    result = {"changed": 0, "finish": False, "need_form": False}
+    if not isinstance(batch, dict) or batch.get("attempt") != state.get("attempt_id"):
+        return result
+    seq = batch.get("seq")
+    if not isinstance(seq, int) or seq <= state.get("runner_seq", 0):
+        return result
+    state["runner_seq"] = seq
+    result["need_form"] = bool(batch.get("need_form"))
+
+    questions = state["selected_questions"]
+    positions = state.setdefault("answer_positions", {})
+    answers = state["answers"]
+    user_email = state.get("user_data", {}).get("email", "Desconocido")
+    for key, position in (batch.get("answers") or {}).items():
+        if not key.isdigit() or int(key) >= len(questions):
+            continue
+        opciones = questions[int(key)]["opciones"]
+        if position is not None and not (isinstance(position, int) and 0 <= position < len(opciones)):
+            continue
+        if positions.get(key) == position:
+            continue
+        positions[key] = position
+        answers[key] = opciones[position] if position is not None else None
+        result["changed"] += 1
+        if position is not None:
+            question = questions[int(key)]
+            if "correct_positions" in question:
+                es_correcta = position in question["correct_positions"]
+            else:
+                es_correcta = opciones[position] in question["respuesta_correcta"]
+            status_txt = "CORRECTO" if es_correcta else "INCORRECTO"
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            print(f"[{timestamp}] {user_email} | P{int(key) + 1} | {status_txt} | Respondió: {opciones[position][:50]}...", flush=True)
+
+    if isinstance(batch.get("marked"), list):
+        state["marked"] = {i for i in batch["marked"] if isinstance(i, int) and 0 <= i < len(questions)}
+    current = batch.get("current")
+    if isinstance(current, int) and 0 <= current < len(questions):
+        state["current_question_index"] = current
+    result["finish"] = bool(batch.get("finish"))
+    return result
+
+
+def display_exam_runner(time_limit_seconds: float, warning_seconds: float):
+    """
+    Pantalla del examen en modo navegador. Registra los medios (rerun completo)
+    y dibuja el fragmento que recibe los lotes.
+    """
+    st.session_state.runner_media = register_media(st.session_state.selected_questions)
+    _runner_fragment(time_limit_seconds, warning_seconds)
+
+
+@st.fragment
+def _runner_fragment(time_limit_seconds: float, warning_seconds: float):
+    start = time.perf_counter()
+    state = st.session_state
+    ctx = get_script_run_ctx()
+    fragment_run = bool(ctx and ctx.fragment_ids_this_run)
+
+    result = apply_batch(state, state.get(RUNNER_KEY))
+    remaining = time_limit_seconds - (time.time() - state.start_time)
+    if result["finish"] or remaining <= 0:
+        state.end_exam = True
+        st.rerun()
+
+    attempt = state.get("attempt_id") or ""
+    args = {
+        "attempt": attempt,
+        "ack": state.get("runner_seq", 0),
+        "remaining": max(0, int(remaining)),
+        "warning": int(warning_seconds),
+        "font_size": 16 * state.get("font_size_slider", 1.0),
+    }
+    if result["need_form"] or state.get("runner_form_sent") != attempt:
+        args["form"] = runner_form(state.selected_questions, state.get("runner_media", {}))
+        args["state"] = runner_state(state)
+        state.runner_form_sent = attempt
+    _component(key=RUNNER_KEY, default=None, **args)
+
+    if fragment_run:
+        # Los reruns del fragmento no pasan por main(): se miden aquí
+        metrics.set_exam_type(state.get("exam_type"))
+        metrics.observe("exam_rerun_seconds", time.perf_counter() - start,
+                        screen="exam_runner_sync", exam_type=metrics.current_exam_type())
+        metrics.record_session(ctx.session_id, state.get("exam_type"))
+        session_reaper.touch(ctx.session_id, ctx.session_state, state.start_time + time_limit_seconds)
+        if state.get("access_key"):
+            session_registry.heartbeat(ctx.session_id, state.access_key)
@@ -0,0 +1,79 @@
+# components/explanation_display.py
+import time
+
+import streamlit as st
+from openai_utils.explanations import stream_explanations
+from utils import metrics
+
+
+class _FirstExplanationTimer:
+    """
+    Mide el tiempo hasta que la primera explicación (o su primer token) está en pantalla.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.done = False
+
+    def shown(self):
+        if not self.done:
+            self.done = True
+            metrics.observe("exam_explanation_first_seconds", time.perf_counter() - self.start,
+                            exam_type=metrics.current_exam_type())
+
+    def wrap(self, chunks):
+        for chunk in chunks:
+            self.shown()
+            yield chunk
+
+
+def show_saved_explanations(explanations):
+    """
+    Vuelve a mostrar explicaciones ya completas ({indice_pregunta: texto}).
+    """
+    if not explanations:
+        return {}
+    st.subheader("Review of Missed Questions")
+    for question_index, text in sorted(explanations.items()):
+        st.markdown(f"**Question {question_index + 1}**")
+        st.write(text)
+    return explanations
+
+
+def display_explanations(incorrect_answers, cache_key):
+    """
+    Muestra la explicación de cada pregunta fallada en la página de resultados y
+    devuelve {indice_pregunta: texto} para el PDF.
+
+    Las explicaciones locales se muestran al momento; las del LLM, token a token
+    con st.write_stream. Ya completas, se guardan en la sesión con 'cache_key':
+    los reruns de la página de resultados (p.ej. la descarga del PDF) las
+    vuelven a mostrar sin repetir las llamadas.
+    """
+    if not incorrect_answers:
+        return {}
+
+    if st.session_state.get("explanations_key") == cache_key:
+        return show_saved_explanations(st.session_state.explanations)
+
+    st.subheader("Review of Missed Questions")
+
+    timer = _FirstExplanationTimer()
+    explanations = {}
+    try:
+        for question_index, explanation in stream_explanations(incorrect_answers):
+            st.markdown(f"**Question {question_index + 1}**")
+            if isinstance(explanation, str):
+                st.write(explanation)
+                timer.shown()
+            else:
+                streamed = st.write_stream(timer.wrap(explanation))
+                explanation = streamed.strip() if isinstance(streamed, str) else ""
+            explanations[question_index] = explanation
+    except Exception as e:
+        print(f"Error de OpenAI: {e}")
+        st.error(f"Error al obtener la explicación de OpenAI: {e}")
+        # Sin marcarlas como completas: el próximo rerun lo vuelve a intentar
+        return explanations
+
+    st.session_state.explanations_key = cache_key
+    return explanations
@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.question_manager import arrange_options
 
 def unmark_question(index):
     """ Callback function to unmark a question """
@@ -11,6 +12,38 @@ def mark_current_question():
     # st.success("Question marked for review.") #Texto en ingles - Removed  -- ¡YA NO ES NECESARIO!
     # st.rerun()  # <-- ¡ELIMINAR ESTO!  Causaba el problema.
 
+def append_adaptive_question():
+    """
+    En modo adaptativo, al pulsar Next en la última pregunta se elige la siguiente
+    con la habilidad estimada. Devuelve True si se añadió una pregunta.
+    """
+    selected = st.session_state.selected_questions
+    current_index = st.session_state.current_question_index
+    if current_index < len(selected) - 1:
+        return False
+    if len(selected) >= st.session_state.get("adaptive_length", 0):
+        return False
+    if st.session_state.answers.get(str(current_index)) is None:
+        st.warning("Please answer this question before continuing.")
+        return False
+
+    from utils.adaptive import select_next_question
+
+    exam_id = st.session_state.get("adaptive_exam", st.session_state.get("exam_id", "full"))
+    question = select_next_question(selected, st.session_state.answers, exam_id)
+    if question is None:
+        return False
+    # La posición de la respuesta correcta continúa el reparto del examen
+    used_positions = {}
+    for q in selected:
+        for pos in q.get("correct_positions", [])[:1]:
+            used_positions[pos] = used_positions.get(pos, 0) + 1
+    arrange_options([question], used_positions=used_positions)
+    selected.append(question)
+    st.session_state.answers[str(len(selected) - 1)] = None
+    st.session_state.answer_positions[str(len(selected) - 1)] = None
+    return True
+
 def display_navigation():
     """
     Displays three buttons for:
@@ -37,7 +70,10 @@ def display_navigation():
     # Botón para ir a la pregunta siguiente
     with col3:
         if st.button("Next"): #Texto en ingles
-            if st.session_state.current_question_index < len(st.session_state.selected_questions) - 1:
+            if st.session_state.get("exam_type") == "adaptive" and append_adaptive_question():
+                st.session_state.current_question_index += 1
+                st.rerun()
+            elif st.session_state.current_question_index < len(st.session_state.selected_questions) - 1:
                 st.session_state.current_question_index += 1
                 st.rerun() #Se añade rerun
             else:
@@ -2,7 +2,9 @@
 import streamlit as st
 import os
 from datetime import datetime
+from utils.metrics import timed
 
+@timed("display_question")
 def display_question(question, question_num):
     """
     Displays the question statement, image or video (if it exists), and options.
@@ -32,7 +34,8 @@ def display_question(question, question_num):
     with st.container():
         media_name = (question.get('image') or "").strip()
         if media_name:
-            media_path = os.path.join("assets", "images", media_name)
+            # El banco precompilado ya trae la ruta resuelta
+            media_path = question.get('media_path') or os.path.join("assets", "images", media_name)
             if os.path.exists(media_path):
                 try:
                     # Determinar si es video por extensión
@@ -62,38 +65,38 @@ def display_question(question, question_num):
             else:
                 st.warning("Media file not found. Please continue the exam and report this issue.")
 
-    # Mostrar opciones
+    # Mostrar opciones (la respuesta se guarda también como posición mostrada: sin búsquedas por texto)
     with st.container():
-        existing_answer = st.session_state.answers.get(str(question_num - 1), None)
-
-        if existing_answer is not None and existing_answer in question['opciones']:
-            selected_index = question['opciones'].index(existing_answer)
-        else:
-            selected_index = None
+        answer_key = str(question_num - 1)
+        positions = st.session_state.setdefault("answer_positions", {})
+        existing_position = positions.get(answer_key)
+        opciones = question['opciones']
 
         stable_key = f"respuesta_{question_num}"
 
-        labeled_options = [f"{chr(97 + i)}) {option}" for i, option in enumerate(question['opciones'])]
-
-        selected = st.radio(
+        selected_position = st.radio(
             "Select an answer:",
-            options=labeled_options,
-            index=selected_index,
+            options=range(len(opciones)),
+            format_func=lambda i: f"{chr(97 + i)}) {opciones[i]}",
+            index=existing_position,
             key=stable_key
         )
 
-        if selected:
-            selected_option_index = ord(selected[0]) - 97
-            original_selected_option = question['opciones'][selected_option_index]
+        if selected_position is not None:
+            original_selected_option = opciones[selected_position]
 
-            if existing_answer != original_selected_option:
+            if existing_position != selected_position:
                 user_email = st.session_state.user_data.get("email", "Desconocido")
                 timestamp = datetime.now().strftime("%H:%M:%S")
-                es_correcta = original_selected_option in question["respuesta_correcta"]
+                if "correct_positions" in question:
+                    es_correcta = selected_position in question["correct_positions"]
+                else:
+                    es_correcta = original_selected_option in question["respuesta_correcta"]
                 status_txt = "CORRECTO" if es_correcta else "INCORRECTO"
 
                 print(f"[{timestamp}] {user_email} | P{question_num} | {status_txt} | Respondió: {original_selected_option[:50]}...", flush=True)
         else:
             original_selected_option = None
 
-        st.session_state.answers[str(question_num - 1)] = original_selected_option
+        positions[answer_key] = selected_position
+        st.session_state.answers[answer_key] = original_selected_option
@@ -0,0 +1,63 @@
+# components/question_palette/__init__.py
+"""
+Paleta de preguntas de la barra lateral en un solo widget (componente "question_palette").
+
+Sustituye a los botones por pregunta (goto_*, unmark_*, goto_unanswered_*), que
+en un examen de 140 preguntas eran cientos de widgets en cada rerun. El
+componente recibe el estado como dos bitmaps en base64 (respondidas y
+marcadas, un bit por pregunta) más la pregunta actual, y devuelve un único
+evento {"action": "goto" | "unmark", "index", "nonce"}. El evento se aplica en
+el callback on_change, antes del rerun: no hace falta un st.rerun() adicional.
+"""
+import base64
+import os
+from typing import Iterable
+
+import streamlit as st
+from streamlit.components.v1 import declare_component
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+_component = declare_component("question_palette", path=_FRONTEND_DIR)
+
+PALETTE_KEY = "question_palette"
+
+
+def pack_bits(indices: Iterable[int], count: int) -> str:
+    """
+    Bitmap de 'count' preguntas (bit i = índice i, LSB primero) en base64.
+    """
+    bits = bytearray((count + 7) // 8)
+    for index in indices:
+        if 0 <= index < count:
+            bits[index >> 3] |= 1 << (index & 7)
+    return base64.b64encode(bytes(bits)).decode("ascii")
+
+
+def _on_palette_event():
+    event = st.session_state.get(PALETTE_KEY)
+    if not isinstance(event, dict) or not isinstance(event.get("index"), int):
+        return
+    index = event["index"]
+    if not 0 <= index < len(st.session_state.selected_questions):
+        return
+    if event.get("action") == "goto":
+        st.session_state.current_question_index = index
+    elif event.get("action") == "unmark":
+        st.session_state.marked.discard(index)
+
+
+def display_question_palette():
+    """
+    Dibuja la paleta (dentro de 'with st.sidebar:') con el estado de la sesión.
+    """
+    count = len(st.session_state.selected_questions)
+    answers = st.session_state.answers
+    _component(
+        key=PALETTE_KEY,
+        default=None,
+        on_change=_on_palette_event,
+        count=count,
+        answered=pack_bits((i for i in range(count) if answers.get(str(i)) is not None), count),
+        marked=pack_bits(st.session_state.marked, count),
+        current=st.session_state.current_question_index,
+    )
@@ -1,11 +1,28 @@
-
-import openai
+import argparse
+import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Tuple, Union
+
 import streamlit as st
 from .prompts import EXPLANATION_PROMPT  # Importa el prompt
+from utils.metrics import timed
 
-# Configuración de la API Key (desde Streamlit Secrets)
-openai.api_key = st.secrets["OPENAI_API_KEY"]
+
+def _load_openai():
+    """
+    Importa openai y configura la API Key (desde Streamlit Secrets) la primera vez
+    que se necesita, para no pagar ese costo al arrancar la app.
+    """
+    import openai
+
+    if not openai.api_key:
+        openai.api_key = st.secrets["OPENAI_API_KEY"]
+    return openai
 
 def format_question_for_openai(question_data, user_answer):
     """
@@ -26,63 +43,251 @@ def format_question_for_openai(question_data, user_answer):
     return formatted_question
 
 
+def local_explanation_text(question_data):
+    """
+    Returns the stored explanation with its 'Concept to Study:' label,
+    or an empty string if the question has no local explanation.
+    """
+    local_explanation = question_data.get("explicacion_openai", "").strip()
+    concept_label = question_data.get("concept_to_study", "").strip()
+
+    if not local_explanation:
+        return ""
+    # Para que se muestre al estilo de ChatGPT, añadimos "Concept to Study:" si corresponde
+    if concept_label:
+        # Combina la etiqueta con la explicación local
+        return f"Concept to Study: {concept_label}\n{local_explanation}"
+    # Si no hay concept_to_study, usamos la explicación local tal cual
+    return local_explanation
+
+
+# Explicaciones del LLM que se piden a la vez (se muestran en orden, en streaming)
+EXPLANATION_WORKERS = 4
+
+
+def _completion_params(prompt, stream=False):
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,
+        max_tokens=16000,
+        top_p=0.1,
+        frequency_penalty=0.0,
+        presence_penalty=0.0,
+        stream=stream,
+    )
+
+
+def explanation_prompt(question_data, user_answer):
+    formatted_question = format_question_for_openai(question_data, user_answer)
+    return EXPLANATION_PROMPT.format(
+        pregunta=formatted_question,
+        respuesta_incorrecta=user_answer,
+        respuesta_correcta=', '.join(question_data["respuesta_correcta"])
+    )
+
+
+def _stream_completion(openai, prompt, chunks: queue.Queue):
+    """
+    Hilo de trabajo: pone en la cola cada fragmento de texto, y al final None
+    (o la excepción, si la llamada falla).
+    """
+    try:
+        for event in openai.chat.completions.create(**_completion_params(prompt, stream=True)):
+            if event.choices and event.choices[0].delta.content:
+                chunks.put(event.choices[0].delta.content)
+        chunks.put(None)
+    except Exception as e:
+        chunks.put(e)
+
+
+def _drain(chunks: queue.Queue) -> Iterator[str]:
+    while True:
+        item = chunks.get()
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def stream_explanations(incorrect_answers, retrieval=True) -> Iterator[Tuple[int, Union[str, Iterator[str]]]]:
+    """
+    (indice_pregunta, explicación) de cada respuesta incorrecta, en el orden de
+    'incorrect_answers'.
+
+    Las locales o recuperadas del índice (utils.explanation_index) llegan como
+    texto completo; las del LLM, como iteradores de fragmentos. Las llamadas al
+    LLM arrancan todas al principio (EXPLANATION_WORKERS a la vez), así que
+    mientras se muestra una las siguientes ya van llegando. Un iterador lanza la
+    excepción de su llamada si falla.
+    """
+    # El índice (numpy) se carga al llegar a resultados, no al arrancar la app
+    from utils.explanation_index import retrieve_explanation
+
+    # Si hay explicación local, no llamamos a OpenAI
+    # Si no, la explicación existente de la pregunta más parecida (si es fiable)
+    texts = [
+        local_explanation_text(answer_data["pregunta"]) or (retrieval and retrieve_explanation(answer_data["pregunta"]))
+        for answer_data in incorrect_answers
+    ]
+    if all(texts):
+        for answer_data, text in zip(incorrect_answers, texts):
+            yield answer_data["indice_pregunta"], text
+        return
+
+    openai = _load_openai()
+    executor = ThreadPoolExecutor(max_workers=EXPLANATION_WORKERS, thread_name_prefix="explanations")
+    try:
+        streams = {}
+        for n, answer_data in enumerate(incorrect_answers):
+            if not texts[n]:
+                chunks = queue.Queue()
+                prompt = explanation_prompt(answer_data["pregunta"], answer_data["respuesta_usuario"])
+                executor.submit(_stream_completion, openai, prompt, chunks)
+                streams[n] = chunks
+        for n, answer_data in enumerate(incorrect_answers):
+            yield answer_data["indice_pregunta"], texts[n] or _drain(streams[n])
+    finally:
+        # Sin esperar: si el rerun se interrumpe, las llamadas en curso terminan solas
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@timed("get_openai_explanation")
 def get_openai_explanation(incorrect_answers):
     """
     Gets explanations from OpenAI for incorrect answers,
     adding 'Concept to Study:' if there's a local explanation.
     """
     explanations = {}
-    for answer_data in incorrect_answers:
-        question_data = answer_data["pregunta"]
-        user_answer = answer_data["respuesta_usuario"]
-        question_index = answer_data["indice_pregunta"]
-
-        # Si hay explicación local, no llamamos a OpenAI
-        local_explanation = question_data.get("explicacion_openai", "").strip()
-        concept_label = question_data.get("concept_to_study", "").strip()
-
-        if local_explanation:
-            # Para que se muestre al estilo de ChatGPT, añadimos "Concept to Study:" si corresponde
-            if concept_label:
-                # Combina la etiqueta con la explicación local
-                final_text = f"Concept to Study: {concept_label}\n{local_explanation}"
-            else:
-                # Si no hay concept_to_study, usamos la explicación local tal cual
-                final_text = local_explanation
-
-            explanations[question_index] = final_text
-            continue
-
-        # Si no hay explicación local, se llama a OpenAI
-        formatted_question = format_question_for_openai(question_data, user_answer)
-        prompt = EXPLANATION_PROMPT.format(
-            pregunta=formatted_question,
-            respuesta_incorrecta=user_answer,
-            respuesta_correcta=', '.join(question_data["respuesta_correcta"])
-        )
-
-        try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=16000,
-                top_p=0.1,
-                frequency_penalty=0.0,
-                presence_penalty=0.0,
-            )
-            explanation = response.choices[0].message.content.strip()
+    try:
+        for question_index, explanation in stream_explanations(incorrect_answers):
+            if not isinstance(explanation, str):
+                explanation = "".join(explanation).strip()
             explanations[question_index] = explanation
-        except openai.OpenAIError as e:
-            print(f"Error de OpenAI: {e}")
-            st.error(f"Error al obtener la explicación de OpenAI: {e}")
-            return {}
-        except Exception as e:
-            print(f"Error inesperado: {e}")
-            st.error(f"Ocurrió un error inesperado: {e}")
-            return {}
+    except Exception as e:
+        print(f"Error de OpenAI: {e}")
+        st.error(f"Error al obtener la explicación de OpenAI: {e}")
+        return {}
 
     return explanations
+
+
+class _FakeCompletionsHandler(BaseHTTPRequestHandler):
+    """
+    Servidor local compatible con /v1/chat/completions para el benchmark:
+    primer token tras FIRST_TOKEN_DELAY y uno cada TOKEN_DELAY.
+    """
+    FIRST_TOKEN_DELAY = 0.3
+    TOKEN_DELAY = 0.01
+    TOKENS = 150
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.FIRST_TOKEN_DELAY)
+        if not body.get("stream"):
+            time.sleep(self.TOKEN_DELAY * self.TOKENS)
+            self._send_json({
+                "id": "bench", "object": "chat.completion", "created": 0, "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "token " * self.TOKENS}}],
+            })
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for _ in range(self.TOKENS):
+            chunk = {"id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                     "choices": [{"index": 0, "delta": {"content": "token "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.TOKEN_DELAY)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _send_json(self, data):
+        payload = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_benchmark(num_llm: int = 8, num_local: int = 20):
+    """
+    Tiempo hasta la primera explicación y total, contra el servidor falso:
+    llamadas secuenciales sin streaming (comportamiento anterior) frente a
+    stream_explanations.
+    """
+    import openai
+    from utils.question_manager import load_bank
+
+    bank = [q for q in load_bank("full") if local_explanation_text(q)]
+    incorrect = []
+    for i, q in enumerate(bank[:num_local + num_llm]):
+        pregunta = {k: q.get(k) for k in ("enunciado", "opciones", "respuesta_correcta", "image",
+                                          "explicacion_openai", "concept_to_study")}
+        if i >= num_local:
+            pregunta["explicacion_openai"] = ""  # sin explicación local: va al LLM
+        incorrect.append({"pregunta": pregunta, "respuesta_usuario": q["opciones"][0], "indice_pregunta": i})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeCompletionsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous = openai.api_key, openai.base_url
+    openai.api_key, openai.base_url = "bench", f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    try:
+        # Anterior: una llamada completa tras otra; nada se muestra hasta el final
+        t0 = time.perf_counter()
+        for answer_data in incorrect:
+            if not local_explanation_text(answer_data["pregunta"]):
+                openai.chat.completions.create(**_completion_params(
+                    explanation_prompt(answer_data["pregunta"], answer_data["respuesta_usuario"])))
+        blocking = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        first_local = first_llm = None
+        for _, explanation in stream_explanations(incorrect, retrieval=False):
+            if isinstance(explanation, str):
+                first_local = first_local or time.perf_counter() - t0
+                continue
+            for _ in explanation:
+                first_llm = first_llm or time.perf_counter() - t0
+        streaming = time.perf_counter() - t0
+    finally:
+        openai.api_key, openai.base_url = previous
+        server.shutdown()
+    return {
+        "local": num_local,
+        "llm": num_llm,
+        "blocking_s": round(blocking, 3),
+        "stream_first_local_s": round(first_local or 0, 6),
+        "stream_first_llm_token_s": round(first_llm or 0, 3),
+        "stream_total_s": round(streaming, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explanation streaming benchmark against a local fake server.")
+    parser.add_argument("--bench", action="store_true", help="measure time to first explanation")
+    parser.add_argument("--llm", type=int, default=8, help="missed questions without a local explanation")
+    parser.add_argument("--local", type=int, default=20, help="missed questions with a local explanation")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    r = run_benchmark(args.llm, args.local)
+    print(f"{r['local']} local + {r['llm']} LLM explanations")
+    print(f"blocking:  first explanation {r['blocking_s']:.3f} s, all {r['blocking_s']:.3f} s")
+    print(f"streaming: first explanation {r['stream_first_local_s'] * 1000:.2f} ms, first LLM token "
+          f"{r['stream_first_llm_token_s']:.3f} s, all {r['stream_total_s']:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
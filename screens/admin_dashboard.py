@@ -0,0 +1,89 @@
+# screens/admin_dashboard.py
+import streamlit as st
+from utils.analytics import (
+    backfill_from_csv,
+    get_summary,
+    get_score_distribution,
+    get_classification_performance,
+    get_daily_trend,
+)
+
+
+def admin_login(config):
+    """
+    Pide la contraseña de administrador una vez por sesión.
+    Devuelve True si la sesión ya está autorizada.
+    """
+    if st.session_state.get("admin_dashboard_ok"):
+        return True
+
+    with st.form("admin_dashboard_login"):
+        admin_pass = st.text_input("Admin password:", type="password")
+        submitted = st.form_submit_button("Open")
+    if submitted:
+        expected_admin_pass = config.get("token_generator_password", "")
+        if expected_admin_pass and admin_pass == expected_admin_pass:
+            st.session_state.admin_dashboard_ok = True
+            st.rerun()
+        else:
+            st.error("Invalid admin password.")
+    return False
+
+
+def admin_dashboard(config):
+    """
+    Panel de analítica para administradores (?admin=analytics).
+    Lee solo las tablas de agregados, por lo que el tiempo de carga
+    no depende del número de exámenes históricos.
+    """
+    st.title("Exam Analytics (administrator only)")
+
+    if not admin_login(config):
+        return
+
+    summary = get_summary()
+    exam_types = sorted(summary.keys())
+    choice = st.selectbox("Exam type:", options=["All"] + exam_types, index=0)
+    exam_type = None if choice == "All" else choice
+
+    # --- Totales ---
+    if exam_type:
+        selected = [summary[exam_type]]
+    else:
+        selected = list(summary.values())
+    exams = sum(s["exams"] for s in selected)
+    passed = sum(s["passed"] for s in selected)
+    mean_score = (sum(s["mean_score"] * s["exams"] for s in selected) / exams) if exams else 0.0
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Exams", exams)
+    col2.metric("Pass rate", f"{(passed / exams) * 100 if exams else 0.0:.1f}%")
+    col3.metric("Mean score", f"{mean_score:.0f}")
+
+    if not exams:
+        st.info("No exams have been recorded yet.")
+
+    # --- Distribución de puntajes ---
+    st.subheader("Score distribution")
+    distribution = get_score_distribution(exam_type)
+    if distribution:
+        st.bar_chart(distribution, x="score", y="exams")
+
+    # --- Desempeño por clasificación ---
+    st.subheader("Performance by classification")
+    performance = get_classification_performance(exam_type)
+    if performance:
+        st.table(performance)
+
+    # --- Tendencia ---
+    st.subheader("Trend over time")
+    trend = get_daily_trend(exam_type)
+    if trend:
+        st.line_chart(trend, x="day", y=["pass_rate", "mean_score"])
+        st.bar_chart(trend, x="day", y="exams")
+
+    with st.expander("Maintenance", expanded=False):
+        st.caption("Imports rows from logs/exam_activity.csv that are not yet in the aggregates.")
+        if st.button("Import exam_activity.csv"):
+            added = backfill_from_csv()
+            st.success(f"{added} rows imported.")
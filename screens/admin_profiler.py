@@ -0,0 +1,46 @@
+# screens/admin_profiler.py
+import streamlit as st
+from screens.admin_dashboard import admin_login
+from utils import profiler
+
+
+def admin_profiler(config):
+    """
+    Perfilado bajo demanda (?admin=profiler): se activa en caliente para todo el
+    proceso y guarda perfiles de reruns lentos o de sesiones concretas.
+    """
+    st.title("Rerun Profiler (administrator only)")
+
+    if not admin_login(config):
+        return
+
+    current = profiler.settings()
+    with st.form("profiler_settings"):
+        enabled = st.checkbox("Profiling enabled", value=current["enabled"])
+        threshold_ms = st.number_input("Save reruns slower than (ms):", min_value=50, max_value=120000,
+                                       value=current["threshold_ms"], step=50)
+        emails = st.text_area("Always profile these candidates (one email per line):",
+                              value="\n".join(sorted(current["emails"])))
+        if st.form_submit_button("Apply"):
+            profiler.configure(enabled, threshold_ms, emails.splitlines())
+            st.success("Profiler enabled." if enabled else "Profiler disabled.")
+            current = profiler.settings()
+
+    st.caption(f"Sampling every {profiler.SAMPLE_INTERVAL * 1000:.0f} ms while enabled. "
+               f"The newest {profiler.MAX_PROFILES} profiles are kept.")
+
+    profiles = profiler.list_profiles()
+    st.subheader(f"Saved profiles ({len(profiles)})")
+    if not profiles:
+        st.info("No profiles yet.")
+        return
+    st.caption("Collapsed-stack format: open with speedscope or flamegraph.pl.")
+    for p in profiles[:50]:
+        col1, col2 = st.columns([4, 1])
+        col1.write(f"{p['created']} · {p['screen']} · {p['elapsed_ms']} ms · session {p['session']}")
+        with open(p["path"], "rb") as f:
+            col2.download_button("Download", data=f.read(), file_name=p["name"], mime="text/plain", key=f"dl_{p['name']}")
+    if st.button("Delete all profiles"):
+        removed = profiler.clear_profiles()
+        st.success(f"{removed} profiles deleted.")
+        st.rerun()
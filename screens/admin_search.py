@@ -0,0 +1,44 @@
+# screens/admin_search.py
+import streamlit as st
+from screens.admin_dashboard import admin_login
+from utils.exams import get_banks
+from utils.question_manager import ensure_search_index, find_questions_by_ids
+from utils.search_index import search
+
+
+def admin_search(config):
+    """
+    Buscador de preguntas para administradores (?admin=search).
+    Usa el índice FTS5 local en lugar de revisar preguntas.json a mano.
+    """
+    st.title("Question Search (administrator only)")
+
+    if not admin_login(config):
+        return
+
+    # Sincronización incremental: sin costo si los bancos no cambiaron
+    ensure_search_index()
+
+    query = st.text_input("Search stems, options, concepts and explanations:", key="admin_search_query")
+    bank = st.selectbox("Bank:", options=["All"] + list(get_banks()), index=0, key="admin_search_bank")
+    if not query.strip():
+        return
+
+    results = search(query, limit=50, banks=None if bank == "All" else [bank])
+    st.caption(f"{len(results)} result(s)")
+
+    questions = {q["id"]: q for q in find_questions_by_ids([r["item_id"] for r in results])}
+    for r in results:
+        q = questions.get(r["item_id"])
+        title = f"[{r['bank']}] {r['stem'][:90]}"
+        with st.expander(title, expanded=False):
+            st.markdown(r["snippet"])
+            if q is None:
+                continue
+            st.write(q["enunciado"])
+            for option in q["opciones"]:
+                marker = "✅" if option in q["respuesta_correcta"] else "▫️"
+                st.write(f"{marker} {option}")
+            st.caption(f"id: {q['id']} · version: {q['version']} · {q.get('clasificacion', '')}")
+            if q.get("concept_to_study"):
+                st.markdown(f"**Concept to Study:** {q['concept_to_study']}")
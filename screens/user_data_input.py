@@ -2,7 +2,23 @@
 import streamlit as st
 import time
 import os
-from utils.question_manager import select_random_questions, select_short_questions, shuffle_options
+import random
+import uuid
+from utils.exams import get_exam, exam_banks
+from utils.forms import claim_form, derive_seed
+from utils.question_manager import (
+    select_review_questions,
+    count_review_due,
+    select_concept_questions,
+    arrange_options,
+)
+
+# Número de preguntas del modo adaptativo (igual que el examen corto)
+ADAPTIVE_EXAM_LENGTH = 20
+# Máximo de tarjetas vencidas por sesión de repaso
+REVIEW_EXAM_LENGTH = 20
+# Máximo de preguntas del modo "estudiar un concepto"
+CONCEPT_EXAM_LENGTH = 20
 
 def user_data_input():
     """
@@ -32,6 +48,21 @@ def user_data_input():
             # Mostrar email fijo (no editable)
             st.text_input("Email:", value=email_guardado, disabled=True)
 
+            # Modo de examen: repaso para todos; adaptativo solo para exámenes de práctica
+            exam_id = st.session_state.get("exam_id", "full")
+            exam = get_exam(exam_id)
+            mode_options = ["Standard", "Review", "Study a concept"]
+            if exam["practice"]:
+                mode_options.insert(1, "Adaptive")
+            # Preguntas de repaso vencidas en los bancos del examen: se ven antes de elegir "Review"
+            due = count_review_due(email_guardado, exam_banks(exam_id)) if email_guardado else 0
+            mode_labels = {"Review": f"Review ({due} due)"}
+            practice_mode = st.selectbox("Exam mode:", options=mode_options, index=0,
+                                         format_func=lambda mode: mode_labels.get(mode, mode))
+            concept_query = st.text_input("Concept to study (only for 'Study a concept'):")
+            # Navegación en el navegador (no disponible en adaptativo: cada pregunta depende de la anterior)
+            runner_mode = st.checkbox("Run the exam in the browser (faster navigation; not available in Adaptive mode)")
+
             submitted = st.form_submit_button("Start Exam")
             if submitted:
                 if not nombre.strip():
@@ -47,18 +78,55 @@ def user_data_input():
                     # ───────────────────────────────────────────────
                     # BLOQUE IMPORTANTE: SELECCIÓN DE MODO DE EXAMEN
                     # ───────────────────────────────────────────────
-                    exam_type = st.session_state.get("exam_type", "full")
-                    if exam_type == "short":
-                        selected = select_short_questions(total=20)
+                    banks = exam_banks(exam_id)
+                    attempt_id = uuid.uuid4().hex
+                    form_id = None
+                    if practice_mode == "Study a concept":
+                        selected = (
+                            select_concept_questions(concept_query, total=CONCEPT_EXAM_LENGTH, banks=banks)
+                            if concept_query.strip() else []
+                        )
+                        if not selected:
+                            st.session_state.user_data.pop("nombre", None)
+                            st.info("No questions matched that concept. Try other words.")
+                            return
+                        st.session_state.exam_type = "concept"
+                    elif practice_mode == "Review":
+                        selected = select_review_questions(email_guardado, total=REVIEW_EXAM_LENGTH, banks=banks)
+                        if not selected:
+                            st.session_state.user_data.pop("nombre", None)
+                            st.info("You have no questions due for review. Choose another exam mode.")
+                            return
+                        st.session_state.exam_type = "review"
+                    elif practice_mode == "Adaptive":
+                        # La primera pregunta se elige con la habilidad inicial (theta = 0);
+                        # las siguientes se añaden en display_navigation.
+                        from utils.adaptive import select_next_question
+
+                        st.session_state.exam_type = "adaptive"
+                        st.session_state.adaptive_length = ADAPTIVE_EXAM_LENGTH
+                        st.session_state.adaptive_exam = exam["adaptive_exam"]
+                        selected = [select_next_question([], {}, exam["adaptive_exam"])]
                     else:
-                        selected = select_random_questions(total=140)
+                        # Forma pre-generada (o generada con semilla del intento), con opciones ya ordenadas
+                        st.session_state.exam_type = exam_id
+                        # Con historial, se prefieren las preguntas que el usuario aún no ha visto
+                        from utils.seen_items import seen_mask
+
+                        seen = seen_mask(email_guardado, exam["bank"])
+                        form_id, selected = claim_form(exam_id, attempt_id, seen=seen)
 
                     st.session_state.selected_questions = selected
-                    for q in st.session_state.selected_questions:
-                        q['opciones'] = shuffle_options(q)
+                    st.session_state.form_id = form_id
+                    if form_id is None:
+                        rng = random.Random(derive_seed("options", attempt_id))
+                        arrange_options(st.session_state.selected_questions, rng)
 
                     st.session_state.answers = {
                         str(i): None for i in range(len(st.session_state.selected_questions))
                     }
+                    st.session_state.answer_positions = dict(st.session_state.answers)
                     st.session_state.start_time = time.time()
+                    st.session_state.attempt_id = attempt_id
+                    st.session_state.exam_runner = runner_mode and st.session_state.exam_type != "adaptive"
                     st.rerun()
@@ -0,0 +1,215 @@
+# utils/adaptive.py
+"""
+Modo adaptativo (CAT) para usuarios de práctica.
+
+Cada pregunta siguiente se elige para maximizar la información (modelo 2PL)
+en la habilidad estimada del usuario, respetando los porcentajes del blueprint
+y sin repetir grupo de casi-duplicados (como el muestreo del examen).
+La selección usa un índice precalculado por clasificación, ordenado por
+dificultad, así que cada paso es una búsqueda binaria + una ventana pequeña
+en lugar de recorrer todo el banco.
+"""
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from utils import data_versions, metrics
+from utils.exams import get_exam
+from utils.question_manager import load_bank, _cluster
+
+# Malla para la estimación EAP de la habilidad (prior normal estándar)
+THETA_GRID = np.linspace(-4.0, 4.0, 81)
+_LOG_PRIOR = -0.5 * THETA_GRID ** 2
+
+# Ventana inicial de candidatos alrededor de b ≈ theta
+_WINDOW = 16
+
+DEFAULT_DISCRIMINATION = 1.0
+
+
+def _prob(a, b, theta):
+    return 1.0 / (1.0 + np.exp(-a * (theta - b)))
+
+
+def estimate_item_parameters(questions: List[Dict[str, Any]]):
+    """
+    Parámetros (a, b) por ítem.
+
+    - Si la pregunta trae 'irt_a' / 'irt_b' se usan tal cual.
+    - Si no, b se estima de la proporción de aciertos histórica en attempt_items
+      (logit suavizado) y a = 1.0.
+    """
+    n = len(questions)
+    a = np.full(n, DEFAULT_DISCRIMINATION)
+    b = np.zeros(n)
+
+    seen = {}
+    try:
+        from utils.attempts import get_attempts_connection
+        conn = get_attempts_connection()
+        rows = conn.execute(
+            "SELECT item_id, answer, COUNT(*) AS n FROM attempt_items "
+            "WHERE answer IS NOT NULL GROUP BY item_id, answer"
+        ).fetchall()
+        for r in rows:
+            seen.setdefault(r["item_id"], []).append((r["answer"], r["n"]))
+    except Exception as e:
+        print(f"No se pudieron leer estadísticas de ítems: {e}")
+
+    for i, q in enumerate(questions):
+        if q.get("irt_a") is not None:
+            a[i] = float(q["irt_a"])
+        if q.get("irt_b") is not None:
+            b[i] = float(q["irt_b"])
+            continue
+        counts = seen.get(q.get("id"))
+        if counts:
+            total = sum(n_ans for _, n_ans in counts)
+            correct = sum(n_ans for ans, n_ans in counts if ans in q["respuesta_correcta"])
+            p = (correct + 1) / (total + 2)
+            b[i] = float(np.clip(np.log((1 - p) / p), -3.0, 3.0))
+    return a, b
+
+
+class ItemIndex:
+    """
+    Índice por clasificación: arrays ordenados por dificultad con la posición
+    de cada ítem en el banco.
+    """
+
+    def __init__(self, questions: List[Dict[str, Any]], a: np.ndarray, b: np.ndarray,
+                 blueprint: Optional[Dict[str, int]] = None):
+        self.questions = questions
+        self.a = a
+        self.b = b
+        self.by_class: Dict[str, Dict[str, np.ndarray]] = {}
+
+        classes: Dict[str, List[int]] = {}
+        for i, q in enumerate(questions):
+            classes.setdefault(q.get("clasificacion", "Other"), []).append(i)
+        for clasif, positions in classes.items():
+            positions = np.asarray(positions, dtype=np.int64)
+            order = np.argsort(b[positions], kind="stable")
+            self.by_class[clasif] = {
+                "pos": positions[order],
+                "b": b[positions][order],
+                "a": a[positions][order],
+            }
+        # {grupo: posiciones} de los grupos de casi-duplicados con más de una pregunta
+        members: Dict[str, List[int]] = {}
+        for i, q in enumerate(questions):
+            members.setdefault(_cluster(q), []).append(i)
+        self.cluster_members = {c: pos for c, pos in members.items() if len(pos) > 1}
+        # Sin blueprint, todas las clasificaciones del banco pesan igual
+        self.blueprint = blueprint or {clasif: 100 / len(self.by_class) for clasif in self.by_class}
+
+    def best_in_class(self, clasif: str, theta: float, used: set) -> Optional[int]:
+        """
+        Posición en el banco del ítem no usado con mayor información en 'theta'.
+        """
+        entry = self.by_class.get(clasif)
+        if entry is None:
+            return None
+        size = len(entry["pos"])
+        center = int(np.searchsorted(entry["b"], theta))
+        window = _WINDOW
+        while True:
+            lo = max(0, center - window)
+            hi = min(size, center + window)
+            pos = entry["pos"][lo:hi]
+            if used:
+                free = np.fromiter((p not in used for p in pos), dtype=bool, count=len(pos))
+            else:
+                free = np.ones(len(pos), dtype=bool)
+            if free.any():
+                a = entry["a"][lo:hi]
+                p = _prob(a, entry["b"][lo:hi], theta)
+                info = np.where(free, a * a * p * (1 - p), -1.0)
+                return int(pos[int(np.argmax(info))])
+            if lo == 0 and hi == size:
+                return None
+            window *= 2
+
+
+@lru_cache(maxsize=8)
+def _shared_index(exam_id: str, version: int) -> ItemIndex:
+    exam = get_exam(exam_id)
+    questions = load_bank(exam["bank"])
+    a, b = estimate_item_parameters(questions)
+    return ItemIndex(questions, a, b, exam["blueprint"])
+
+
+def get_item_index(exam_id: str = "full") -> ItemIndex:
+    """
+    Índice del banco de un examen, compartido por todas las sesiones
+    (se construye una vez por proceso, examen y versión de los datos).
+    """
+    return _shared_index(exam_id, data_versions.active().number)
+
+
+def estimate_ability(index: ItemIndex, selected: List[Dict[str, Any]], answers: Dict[str, Any]) -> float:
+    """
+    Estimación EAP de la habilidad con las respuestas dadas hasta ahora.
+    """
+    log_post = _LOG_PRIOR.copy()
+    for i, q in enumerate(selected):
+        answer = answers.get(str(i))
+        pos = q.get("bank_pos")
+        if answer is None or pos is None:
+            continue
+        p = _prob(index.a[pos], index.b[pos], THETA_GRID)
+        if answer in q["respuesta_correcta"]:
+            log_post += np.log(p)
+        else:
+            log_post += np.log1p(-p)
+    post = np.exp(log_post - log_post.max())
+    return float((THETA_GRID * post).sum() / post.sum())
+
+
+def _next_classification(index: ItemIndex, counts: Dict[str, int], n_done: int, exhausted: set) -> Optional[str]:
+    """
+    Clasificación con mayor déficit respecto al blueprint.
+    """
+    best, best_deficit = None, None
+    for clasif, percentage in index.blueprint.items():
+        if clasif not in index.by_class or clasif in exhausted:
+            continue
+        deficit = (percentage / 100) * (n_done + 1) - counts.get(clasif, 0)
+        if best_deficit is None or deficit > best_deficit:
+            best, best_deficit = clasif, deficit
+    return best
+
+
+def select_next_question(selected: List[Dict[str, Any]], answers: Dict[str, Any],
+                         exam_id: str = "full") -> Optional[Dict[str, Any]]:
+    """
+    Devuelve una copia de la siguiente pregunta adaptativa (o None si no quedan).
+    La copia lleva 'bank_pos' para la estimación de habilidad.
+    'exam_id' es el examen cuyo banco y blueprint se usan.
+    """
+    index = get_item_index(exam_id)
+    theta = estimate_ability(index, selected, answers)
+    used = {q["bank_pos"] for q in selected if q.get("bank_pos") is not None}
+    # Como máximo una pregunta por grupo de casi-duplicados
+    for q in selected:
+        used.update(index.cluster_members.get(_cluster(q), ()))
+
+    counts: Dict[str, int] = {}
+    for q in selected:
+        clasif = q.get("clasificacion", "Other")
+        counts[clasif] = counts.get(clasif, 0) + 1
+
+    exhausted = set()
+    while True:
+        clasif = _next_classification(index, counts, len(selected), exhausted)
+        if clasif is None:
+            return None
+        pos = index.best_in_class(clasif, theta, used)
+        if pos is not None:
+            question = dict(index.questions[pos])
+            question["opciones"] = list(question["opciones"])
+            question["bank_pos"] = pos
+            metrics.inc("exam_adaptive_items_total", classification=clasif)
+            return question
+        exhausted.add(clasif)
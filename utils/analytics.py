@@ -0,0 +1,240 @@
+# utils/analytics.py
+import csv
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from utils.storage import get_connection, ensure_schema
+
+# Ancho de cada barra del histograma de puntajes (0-700)
+SCORE_BUCKET_WIDTH = 25
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recorded_exams (
+    exam_key TEXT PRIMARY KEY,
+    recorded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agg_totals (
+    exam_type TEXT PRIMARY KEY,
+    exams INTEGER NOT NULL DEFAULT 0,
+    passed INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS agg_score_hist (
+    exam_type TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    exams INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (exam_type, bucket)
+);
+CREATE TABLE IF NOT EXISTS agg_classification (
+    exam_type TEXT NOT NULL,
+    clasificacion TEXT NOT NULL,
+    correct INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (exam_type, clasificacion)
+);
+CREATE TABLE IF NOT EXISTS agg_daily (
+    day TEXT NOT NULL,
+    exam_type TEXT NOT NULL,
+    exams INTEGER NOT NULL DEFAULT 0,
+    passed INTEGER NOT NULL DEFAULT 0,
+    score_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, exam_type)
+);
+"""
+
+
+def _conn():
+    """
+    Conexión a la base de agregados; crea las tablas la primera vez.
+    """
+    return ensure_schema(get_connection(), _SCHEMA)
+
+
+def _apply(conn, exam_type: str, score: int, passed: bool, day: str,
+           classification_stats: Optional[Dict[str, Dict[str, int]]], sign: int = 1):
+    """
+    Suma (sign=1) o resta (sign=-1) un examen en todas las tablas de agregados (sin commit).
+    Cada actualización es O(número de clasificaciones), independiente del historial.
+    """
+    passed_int = sign if passed else 0
+    bucket = (int(score) // SCORE_BUCKET_WIDTH) * SCORE_BUCKET_WIDTH
+
+    conn.execute(
+        "INSERT INTO agg_totals (exam_type, exams, passed, score_sum) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(exam_type) DO UPDATE SET exams = exams + excluded.exams, "
+        "passed = passed + excluded.passed, score_sum = score_sum + excluded.score_sum",
+        (exam_type, sign, passed_int, sign * int(score)),
+    )
+    conn.execute(
+        "INSERT INTO agg_score_hist (exam_type, bucket, exams) VALUES (?, ?, ?) "
+        "ON CONFLICT(exam_type, bucket) DO UPDATE SET exams = exams + excluded.exams",
+        (exam_type, bucket, sign),
+    )
+    conn.execute(
+        "INSERT INTO agg_daily (day, exam_type, exams, passed, score_sum) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(day, exam_type) DO UPDATE SET exams = exams + excluded.exams, "
+        "passed = passed + excluded.passed, score_sum = score_sum + excluded.score_sum",
+        (day, exam_type, sign, passed_int, sign * int(score)),
+    )
+    for clasif, stats in (classification_stats or {}).items():
+        conn.execute(
+            "INSERT INTO agg_classification (exam_type, clasificacion, correct, total) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(exam_type, clasificacion) DO UPDATE SET "
+            "correct = correct + excluded.correct, total = total + excluded.total",
+            (exam_type, clasif, sign * int(stats.get("correct", 0)), sign * int(stats.get("total", 0))),
+        )
+
+
+def record_exam(exam_key: str, exam_type: str, score: int, passed: bool,
+                classification_stats: Optional[Dict[str, Dict[str, int]]] = None,
+                when: Optional[datetime] = None) -> bool:
+    """
+    Registra un examen terminado en los agregados, de forma incremental.
+
+    'exam_key' identifica el intento (p.ej. email + hora de inicio); si ya fue
+    registrado no se vuelve a sumar, así los reruns de Streamlit no duplican datos.
+    Devuelve True si el examen se sumó.
+    """
+    when = when or datetime.now()
+    conn = _conn()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO recorded_exams (exam_key, recorded_at) VALUES (?, ?)",
+                (exam_key, when.strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            _apply(conn, exam_type, score, passed, when.strftime("%Y-%m-%d"), classification_stats)
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def apply_rescore(exam_type: str, day: str,
+                  old_score: int, old_passed: bool, old_stats: Optional[Dict[str, Dict[str, int]]],
+                  new_score: int, new_passed: bool, new_stats: Optional[Dict[str, Dict[str, int]]]):
+    """
+    Sustituye en los agregados el resultado de un examen ya registrado
+    (p.ej. tras corregir la clave de un ítem). 'day' es 'YYYY-MM-DD' del examen original.
+    """
+    conn = _conn()
+    with conn:
+        _apply(conn, exam_type, old_score, old_passed, day, old_stats, sign=-1)
+        _apply(conn, exam_type, new_score, new_passed, day, new_stats, sign=1)
+
+
+def backfill_from_csv(log_file=os.path.join("logs", "exam_activity.csv")) -> int:
+    """
+    Carga en los agregados las filas históricas de logs/exam_activity.csv
+    (sin desglose por clasificación, que el CSV no guarda). Es idempotente.
+    Devuelve el número de filas nuevas.
+    """
+    if not os.path.exists(log_file):
+        return 0
+
+    added = 0
+    with open(log_file, "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                when = datetime.strptime(row["Timestamp"], "%Y-%m-%d %H:%M:%S")
+                score = int(float(row["Score"]))
+            except (KeyError, ValueError):
+                continue
+            exam_key = f"csv|{row.get('Email', '')}|{row['Timestamp']}"
+            if record_exam(exam_key, row.get("Exam Type") or "unknown", score,
+                           row.get("Status") == "Passed", None, when):
+                added += 1
+    return added
+
+
+# ==========================
+# CONSULTAS PARA EL PANEL
+# ==========================
+
+def get_summary() -> Dict[str, Any]:
+    """
+    Totales por tipo de examen: número de exámenes, aprobados, tasa y promedio.
+    """
+    rows = _conn().execute(
+        "SELECT exam_type, exams, passed, score_sum FROM agg_totals ORDER BY exam_type"
+    ).fetchall()
+    summary = {}
+    for r in rows:
+        exams = r["exams"]
+        summary[r["exam_type"]] = {
+            "exams": exams,
+            "passed": r["passed"],
+            "pass_rate": (r["passed"] / exams) * 100 if exams else 0.0,
+            "mean_score": r["score_sum"] / exams if exams else 0.0,
+        }
+    return summary
+
+
+def get_score_distribution(exam_type: Optional[str] = None):
+    """
+    Histograma de puntajes: lista de {"score": inicio_de_barra, "exams": n}.
+    """
+    if exam_type:
+        rows = _conn().execute(
+            "SELECT bucket, exams FROM agg_score_hist WHERE exam_type = ? ORDER BY bucket",
+            (exam_type,),
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            "SELECT bucket, SUM(exams) AS exams FROM agg_score_hist GROUP BY bucket ORDER BY bucket"
+        ).fetchall()
+    return [{"score": r["bucket"], "exams": r["exams"]} for r in rows]
+
+
+def get_classification_performance(exam_type: Optional[str] = None):
+    """
+    Porcentaje de aciertos por clasificación.
+    """
+    if exam_type:
+        rows = _conn().execute(
+            "SELECT clasificacion, correct, total FROM agg_classification "
+            "WHERE exam_type = ? ORDER BY clasificacion",
+            (exam_type,),
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            "SELECT clasificacion, SUM(correct) AS correct, SUM(total) AS total "
+            "FROM agg_classification GROUP BY clasificacion ORDER BY clasificacion"
+        ).fetchall()
+    return [
+        {
+            "Classification": r["clasificacion"],
+            "Correct": r["correct"],
+            "Asked": r["total"],
+            "%": round((r["correct"] / r["total"]) * 100, 2) if r["total"] else 0.0,
+        }
+        for r in rows
+    ]
+
+
+def get_daily_trend(exam_type: Optional[str] = None, days: int = 90):
+    """
+    Tendencia diaria (últimos 'days' días con actividad): exámenes, tasa de aprobación y promedio.
+    """
+    if exam_type:
+        rows = _conn().execute(
+            "SELECT day, exams, passed, score_sum FROM agg_daily WHERE exam_type = ? "
+            "ORDER BY day DESC LIMIT ?",
+            (exam_type, days),
+        ).fetchall()
+    else:
+        rows = _conn().execute(
+            "SELECT day, SUM(exams) AS exams, SUM(passed) AS passed, SUM(score_sum) AS score_sum "
+            "FROM agg_daily GROUP BY day ORDER BY day DESC LIMIT ?",
+            (days,),
+        ).fetchall()
+    return [
+        {
+            "day": r["day"],
+            "exams": r["exams"],
+            "pass_rate": (r["passed"] / r["exams"]) * 100 if r["exams"] else 0.0,
+            "mean_score": r["score_sum"] / r["exams"] if r["exams"] else 0.0,
+        }
+        for r in reversed(rows)
+    ]
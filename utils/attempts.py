@@ -0,0 +1,146 @@
+# utils/attempts.py
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from utils.storage import get_connection, ensure_schema
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    attempt_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    nombre TEXT,
+    exam_type TEXT,
+    started_at REAL,
+    finished_at TEXT,
+    score INTEGER,
+    status TEXT,
+    classification_stats TEXT,
+    pdf_path TEXT,
+    rescored_at TEXT,
+    form_id TEXT
+);
+CREATE TABLE IF NOT EXISTS attempt_items (
+    attempt_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    item_version TEXT NOT NULL,
+    clasificacion TEXT,
+    answer TEXT,
+    PRIMARY KEY (attempt_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_attempt_items_item ON attempt_items (item_id, item_version);
+CREATE TABLE IF NOT EXISTS item_versions (
+    item_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    respuesta_correcta TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (item_id, version)
+);
+"""
+
+def _upgrade(conn):
+    # Bases creadas antes de las formas reproducibles (utils.forms)
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(attempts)")}
+    if "form_id" not in columns:
+        conn.execute("ALTER TABLE attempts ADD COLUMN form_id TEXT")
+
+
+def get_attempts_connection():
+    """
+    Conexión a la base de intentos; crea las tablas la primera vez.
+    """
+    return ensure_schema(get_connection(), _SCHEMA, _upgrade)
+
+
+def save_attempt(
+    attempt_id: str,
+    user_data: Dict[str, Any],
+    exam_type: str,
+    started_at: Optional[float],
+    questions: List[Dict[str, Any]],
+    answers: Dict[str, Any],
+    score: int,
+    status: str,
+    classification_stats: Optional[Dict[str, Dict[str, int]]] = None,
+    pdf_path: Optional[str] = None,
+    form_id: Optional[str] = None,
+) -> bool:
+    """
+    Guarda un intento terminado junto con la versión de cada ítem que vio
+    (y su clave en item_versions, para poder re-calificarlo aunque el ítem se
+    edite o retire) y la forma (utils.forms) con la que se generó, si la hay.
+    Es idempotente: si el intento ya existe no hace nada y devuelve False.
+    """
+    conn = get_attempts_connection()
+    if conn.execute("SELECT 1 FROM attempts WHERE attempt_id = ?", (attempt_id,)).fetchone():
+        return False
+
+    with conn:
+        conn.execute(
+            "INSERT INTO attempts (attempt_id, email, nombre, exam_type, started_at, finished_at, "
+            "score, status, classification_stats, pdf_path, form_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                attempt_id,
+                user_data.get("email", ""),
+                user_data.get("nombre", ""),
+                exam_type,
+                started_at,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                int(score),
+                status,
+                json.dumps(classification_stats or {}, ensure_ascii=False),
+                pdf_path,
+                form_id,
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO attempt_items (attempt_id, position, item_id, item_version, clasificacion, answer) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    attempt_id,
+                    idx,
+                    q.get("id", ""),
+                    q.get("version", ""),
+                    q.get("clasificacion", "Other"),
+                    answers.get(str(idx)),
+                )
+                for idx, q in enumerate(questions)
+            ],
+        )
+        _insert_item_versions(conn, [q for q in questions if q.get("id") and q.get("version")])
+    return True
+
+
+def set_pdf_path(attempt_id: str, pdf_path: str):
+    """
+    Actualiza la ruta del reporte PDF de un intento.
+    """
+    conn = get_attempts_connection()
+    with conn:
+        conn.execute("UPDATE attempts SET pdf_path = ? WHERE attempt_id = ?", (pdf_path, attempt_id))
+
+
+def register_item_versions(questions: List[Dict[str, Any]]) -> int:
+    """
+    Registra en el historial las versiones actuales de los ítems del banco.
+    Devuelve cuántas versiones nuevas se añadieron.
+    """
+    conn = get_attempts_connection()
+    before = conn.total_changes
+    with conn:
+        _insert_item_versions(conn, questions)
+    return conn.total_changes - before
+
+
+def _insert_item_versions(conn, questions: List[Dict[str, Any]]):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany(
+        "INSERT OR IGNORE INTO item_versions (item_id, version, respuesta_correcta, first_seen) "
+        "VALUES (?, ?, ?, ?)",
+        [
+            (q["id"], q["version"], json.dumps(q.get("respuesta_correcta", []), ensure_ascii=False), now)
+            for q in questions
+        ],
+    )
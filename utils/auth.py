@@ -1,10 +1,10 @@
 # utils/auth.py
 
-import json
 import hashlib
 from datetime import datetime
 from zoneinfo import ZoneInfo  # Python 3.9+
 import streamlit as st
+from utils.data_versions import active
 
 
 # ==========================
@@ -13,10 +13,9 @@ import streamlit as st
 
 def load_config():
     """
-    Carga el archivo data/config.json.
+    data/config.json de la versión de datos en uso (ver utils.data_versions).
     """
-    with open('data/config.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return active().config
 
 
 # ==========================
@@ -71,23 +70,39 @@ def generate_access_code(email, base, date_str=None):
 # VERIFICACIÓN DE CONTRASEÑA
 # ==========================
 
+def _start_exam_session(exam_id):
+    """
+    Guarda el examen autorizado en la sesión.
+    'exam_id' identifica la definición (utils.exams); 'exam_type' puede cambiar
+    después si el usuario elige un modo de práctica.
+    """
+    st.session_state["exam_id"] = exam_id
+    st.session_state["exam_type"] = exam_id
+
+
 def verify_password(token, email):
     """
     Verifica si el 'token' (código de acceso) es válido para el 'email' dado.
 
-    Reglas:
-    1) Si token coincide con master_password_full → acceso FULL sin filtros.
-    2) Si token coincide con master_password_short → acceso SHORT sin filtros.
-    3) En otro caso:
-       - Se recalcula el código esperado para cada base FULL con generate_access_code(email, base).
-       - Si token == expected para alguna base FULL → acceso FULL.
-       - Idem para bases SHORT → acceso SHORT.
+    Reglas (para cada examen definido en config.json, ver utils.exams):
+    1) Si token coincide con su 'master_password' → acceso sin filtros.
+    2) En otro caso:
+       - Se recalcula el código esperado para cada una de sus 'password_bases'
+         con generate_access_code(email, base).
+       - Si token == expected para alguna base → acceso a ese examen.
+
+    Para "full" / "short" las claves salen de master_password_full/short y
+    passwords_full_base/passwords_short_base.
 
     En caso de éxito, establece:
-      - st.session_state["exam_type"] = "full" | "short"
+      - st.session_state["exam_id"] = id del examen ("full", "short", ...)
+      - st.session_state["exam_type"] = el mismo id
     y devuelve True. En caso contrario, devuelve False.
     """
+    from utils.exams import get_exams
+
     config = load_config()
+    exams = get_exams(config)
     token = token.strip()
     email_clean = email.strip()
 
@@ -97,42 +112,25 @@ def verify_password(token, email):
     # ====================================
     # 1) CLAVES MAESTRAS (sin filtros)
     # ====================================
-    master_full = config.get("master_password_full")
-    master_short = config.get("master_password_short")
-
-    if master_full and token == master_full:
-        st.session_state["exam_type"] = "full"
-        return True
-
-    if master_short and token == master_short:
-        st.session_state["exam_type"] = "short"
-        return True
-
-    # ====================================
-    # 2) CLAVES DIARIAS POR EMAIL (FULL)
-    # ====================================
-    for base in config.get("passwords_full_base", []):
-        try:
-            expected = generate_access_code(email_clean, base)
-        except Exception:
-            continue
-
-        if token == expected:
-            st.session_state["exam_type"] = "full"
+    for exam_id, exam in exams.items():
+        master = exam.get("master_password")
+        if master and token == master:
+            _start_exam_session(exam_id)
             return True
 
     # ====================================
-    # 3) CLAVES DIARIAS POR EMAIL (SHORT)
+    # 2) CLAVES DIARIAS POR EMAIL
     # ====================================
-    for base in config.get("passwords_short_base", []):
-        try:
-            expected = generate_access_code(email_clean, base)
-        except Exception:
-            continue
-
-        if token == expected:
-            st.session_state["exam_type"] = "short"
-            return True
+    for exam_id, exam in exams.items():
+        for base in exam.get("password_bases", []):
+            try:
+                expected = generate_access_code(email_clean, base)
+            except Exception:
+                continue
+
+            if token == expected:
+                _start_exam_session(exam_id)
+                return True
 
     # Nada coincidió
     return False
@@ -0,0 +1,341 @@
+# utils/bank_builder.py
+"""
+Validación y precompilación del banco de preguntas.
+
+Recorre el banco una sola vez (el archivo se lee por bloques y los ítems se
+decodifican de uno en uno) y revisa cada pregunta: campos obligatorios, clasificación contra el blueprint,
+'respuesta_correcta' dentro de 'opciones', archivos multimedia y enunciados
+duplicados. Emite un reporte JSON y, si no hay errores, escribe el artefacto
+normalizado que carga la app (ids estables, códigos de clasificación
+canónicos, rutas multimedia resueltas y grupo de casi-duplicados). Si la app
+no encuentra el artefacto al día (data/build/ no se versiona), lo compila al
+cargar el banco.
+
+Uso:
+    python -m utils.bank_builder data/preguntas.json data/preguntas_corto.json
+    python -m utils.bank_builder data/preguntas.json --report build_report.json --fail-fast
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Any, Iterator, Tuple
+
+from utils.item_versions import item_id, item_version
+
+BUILD_DIR = os.path.join("data", "build")
+MEDIA_DIR = os.path.join("assets", "images")
+ARTIFACT_FORMAT = 1
+# Tamaño de cada lectura del banco (caracteres)
+READ_CHUNK = 1 << 16
+
+REQUIRED_FIELDS = ("clasificacion", "enunciado", "opciones", "respuesta_correcta")
+
+# Códigos canónicos del blueprint RVT (mismas claves que CLASSIFICATION_PERCENTAGES)
+CLASSIFICATION_CODES = {
+    "Normal Anatomy, Perfusion, and Function": "NAPF",
+    "Pathology, Perfusion, and Function": "PPF",
+    "Surgically Altered Anatomy and Pathology": "SAAP",
+    "Physiologic Exams": "PE",
+    "Ultrasound-guided Procedures/Intraoperative Assessment": "UGP",
+    "Quality Assurance, Safety, and Physical Principles": "QASP",
+    "Preparation,Documentation, and communication": "PDC",
+}
+
+
+def _classification_key(name: str) -> str:
+    """
+    Forma comparable de una clasificación: minúsculas, sin espacios.
+    ('Preparation,Documentation,and communication' == 'Preparation,Documentation, and communication')
+    """
+    return re.sub(r"\s+", "", str(name)).lower()
+
+
+_CANONICAL_BY_KEY = {_classification_key(name): name for name in CLASSIFICATION_CODES}
+
+
+def canonical_classification(name: str):
+    """
+    Nombre canónico del blueprint para una clasificación, o None si no coincide.
+    """
+    return _CANONICAL_BY_KEY.get(_classification_key(name))
+
+
+def artifact_path(source_path: str) -> str:
+    """
+    Ruta del artefacto compilado para un banco: data/build/<nombre>.compiled.json
+    """
+    base = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(BUILD_DIR, f"{base}.compiled.json")
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def iter_items(path: str, chunk_size: int = READ_CHUNK) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Decodifica el arreglo JSON del banco ítem por ítem, leyendo el archivo por
+    bloques: en memoria solo está el bloque en curso, no el archivo completo.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        text = ""
+        while "[" not in text:
+            block = f.read(chunk_size)
+            if not block:
+                raise ValueError(f"{path}: expected a JSON array")
+            text += block
+        pos = text.index("[") + 1
+        index = 0
+        while True:
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(text) and text[pos] == "]":
+                return
+            try:
+                if pos >= len(text):
+                    raise ValueError("end of block")
+                item, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                # Ítem cortado por el final del bloque: se lee el siguiente
+                block = f.read(chunk_size)
+                if not block:
+                    if pos >= len(text):
+                        return
+                    raise
+                text = text[pos:] + block
+                pos = 0
+                continue
+            yield index, item
+            index += 1
+
+
+def _check_item(index: int, q: Dict[str, Any], media_dir: str):
+    """
+    Valida una pregunta. Devuelve (errores, advertencias) como listas de (check, mensaje).
+    """
+    errors, warnings = [], []
+
+    missing = [field for field in REQUIRED_FIELDS if field not in q]
+    if missing:
+        errors.append(("missing_fields", f"missing fields: {', '.join(missing)}"))
+        return errors, warnings
+
+    if not str(q["enunciado"]).strip():
+        errors.append(("empty_stem", "enunciado is empty"))
+
+    opciones = q["opciones"]
+    respuesta = q["respuesta_correcta"]
+    if not isinstance(opciones, list) or len(opciones) < 2:
+        errors.append(("options", "opciones must be a list with at least 2 entries"))
+        opciones = opciones if isinstance(opciones, list) else []
+    elif len(set(opciones)) != len(opciones):
+        errors.append(("duplicate_options", "opciones contains repeated values"))
+
+    if not isinstance(respuesta, list) or not respuesta:
+        errors.append(("answer_key", "respuesta_correcta must be a non-empty list"))
+    else:
+        absent = [r for r in respuesta if r not in opciones]
+        if absent:
+            errors.append(("answer_not_in_options", f"respuesta_correcta not in opciones: {absent}"))
+
+    if canonical_classification(q["clasificacion"]) is None:
+        errors.append(("unknown_classification", f"clasificacion not in blueprint: {q['clasificacion']!r}"))
+
+    media = (q.get("image") or "").strip()
+    if media and not os.path.exists(os.path.join(media_dir, media)):
+        errors.append(("missing_media", f"media file not found: {media}"))
+
+    if not (q.get("explicacion_openai") or "").strip():
+        warnings.append(("no_explanation", "explicacion_openai is empty"))
+
+    return errors, warnings
+
+
+def normalize_item(q: Dict[str, Any], media_dir: str = MEDIA_DIR) -> Dict[str, Any]:
+    """
+    Copia normalizada de una pregunta válida para el artefacto.
+    """
+    item = dict(q)
+    canonical = canonical_classification(q["clasificacion"])
+    item["clasificacion"] = canonical
+    item["clasificacion_code"] = CLASSIFICATION_CODES[canonical]
+    media = (q.get("image") or "").strip()
+    item["image"] = media
+    item["media_path"] = os.path.join(media_dir, media) if media else ""
+    item["id"] = item_id(item)
+    item["version"] = item_version(item)
+    return item
+
+
+def build_bank(source_path: str, fail_fast: bool = False, write_artifact: bool = True,
+               media_dir: str = MEDIA_DIR) -> Dict[str, Any]:
+    """
+    Valida un banco en una pasada y, si no hay errores, escribe su artefacto.
+    Devuelve el reporte.
+    """
+    items, report = compile_bank(source_path, fail_fast, media_dir)
+    if report["ok"] and write_artifact:
+        report["artifact"] = _write_artifact(source_path, items)
+    return report
+
+
+def compile_bank(source_path: str, fail_fast: bool = False, media_dir: str = MEDIA_DIR):
+    """
+    Valida y normaliza un banco en una pasada, sin escribir nada.
+    Devuelve (ítems válidos normalizados, reporte).
+    """
+    report = {
+        "bank": source_path,
+        "items": 0,
+        "errors": [],
+        "warnings": [],
+        "counts_by_classification": {},
+        "near_duplicate_clusters": [],
+        "artifact": None,
+    }
+    items = []
+    stems: Dict[str, int] = {}
+    ids: Dict[str, int] = {}
+
+    try:
+        for index, q in iter_items(source_path):
+            report["items"] += 1
+            errors, warnings = _check_item(index, q, media_dir)
+
+            if not errors:
+                item = normalize_item(q, media_dir)
+                stem = item["enunciado"].strip()
+                if stem in stems:
+                    warnings.append(("duplicate_stem", f"same enunciado as item {stems[stem]}"))
+                else:
+                    stems[stem] = index
+                if item["id"] in ids:
+                    errors.append(("duplicate_item", f"same enunciado and opciones as item {ids[item['id']]}"))
+                else:
+                    ids[item["id"]] = index
+                    items.append(item)
+                    code = item["clasificacion_code"]
+                    report["counts_by_classification"][code] = report["counts_by_classification"].get(code, 0) + 1
+
+            for check, message in errors:
+                report["errors"].append({"index": index, "check": check, "message": message})
+            for check, message in warnings:
+                report["warnings"].append({"index": index, "check": check, "message": message})
+
+            if errors and fail_fast:
+                break
+    except (ValueError, OSError) as e:
+        report["errors"].append({"index": None, "check": "parse", "message": str(e)})
+
+    # Grupos de casi-duplicados: el muestreo usa como máximo uno por grupo
+    if items:
+        from utils.near_duplicates import assign_cluster_keys
+
+        clusters = assign_cluster_keys(items)
+        report["near_duplicate_clusters"] = [
+            {"ids": [items[i]["id"] for i in members], "indices": [ids[items[i]["id"]] for i in members]}
+            for members in clusters.values()
+        ]
+
+    report["ok"] = not report["errors"]
+    return items, report
+
+
+def _write_artifact(source_path: str, items) -> str:
+    """
+    Escribe el artefacto de forma atómica (archivo temporal + rename).
+    """
+    if not os.path.exists(BUILD_DIR):
+        os.makedirs(BUILD_DIR)
+    path = artifact_path(source_path)
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "source": source_path,
+        "source_sha1": file_sha1(source_path),
+        "built_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "classifications": {code: name for name, code in CLASSIFICATION_CODES.items()},
+        "items": items,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def compile_items(source_path: str):
+    """
+    Ítems normalizados de un banco sin artefacto al día: los compila y escribe el
+    artefacto para la próxima carga. Los ítems inválidos se omiten (como en el
+    artefacto); un banco que no se puede leer lanza ValueError.
+    """
+    items, report = compile_bank(source_path)
+    parse_errors = [e["message"] for e in report["errors"] if e["check"] == "parse"]
+    if parse_errors:
+        raise ValueError(f"{source_path}: {parse_errors[0]}")
+    if not report["ok"]:
+        print(f"Banco {source_path}: {len(report['errors'])} ítems inválidos omitidos. "
+              f"Revisa 'python -m utils.bank_builder {source_path} --check-only'.")
+        return items
+    try:
+        _write_artifact(source_path, items)
+    except OSError as e:
+        print(f"No se pudo escribir el artefacto de {source_path}: {e}")
+    return items
+
+
+def load_compiled_items(source_path: str):
+    """
+    Ítems del artefacto compilado si existe y corresponde al banco actual; si no, None.
+    """
+    path = artifact_path(source_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Artefacto inválido {path}: {e}")
+        return None
+    if artifact.get("format") != ARTIFACT_FORMAT or artifact.get("source_sha1") != file_sha1(source_path):
+        print(f"Artefacto desactualizado: {path}. Ejecuta 'python -m utils.bank_builder {source_path}'.")
+        return None
+    return artifact["items"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and precompile question banks.")
+    parser.add_argument("banks", nargs="*", default=[os.path.join("data", "preguntas.json"),
+                                                      os.path.join("data", "preguntas_corto.json")])
+    parser.add_argument("--report", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--fail-fast", action="store_true", help="stop at the first invalid item")
+    parser.add_argument("--check-only", action="store_true", help="validate without writing artifacts")
+    args = parser.parse_args()
+
+    reports = [build_bank(path, fail_fast=args.fail_fast, write_artifact=not args.check_only)
+               for path in args.banks]
+    output = json.dumps({"ok": all(r["ok"] for r in reports), "banks": reports}, indent=2, ensure_ascii=False)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for r in reports:
+        status = "OK" if r["ok"] else "FAILED"
+        print(f"{status}: {r['bank']} - {r['items']} items, {len(r['errors'])} errors, "
+              f"{len(r['warnings'])} warnings", file=sys.stderr)
+    sys.exit(0 if all(r["ok"] for r in reports) else 1)
+
+
+if __name__ == "__main__":
+    main()
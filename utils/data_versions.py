@@ -0,0 +1,305 @@
+# utils/data_versions.py
+"""
+Versiones en memoria de data/config.json y de los bancos de preguntas.
+
+Una versión (DataVersion) es config + todos sus bancos (+ índice por id y hash
+de cada archivo) leídos juntos y nunca modificados después. La versión vigente
+se sustituye de una vez (asignar una referencia es atómico): quien la leyó
+sigue usando la anterior completa, nunca una mezcla.
+
+- Un hilo "watcher" (start_watcher) mira cada WATCH_INTERVAL_SECONDS el mtime y
+  tamaño de los archivos y, si cambian, carga la versión nueva en segundo
+  plano: ningún rerun paga la recarga ni un os.stat. Un archivo a medio
+  escribir (JSON inválido) deja la versión anterior y se reintenta cuando el
+  archivo vuelva a cambiar. Sin watcher (CLI), current() comprueba los archivos
+  en cada llamada, como antes.
+- Cada sesión guarda su versión en session_state (bind): fuera de un examen
+  toma la vigente en cada rerun; desde que tiene preguntas se queda con la suya.
+  load_bank, load_config y el hash de los bancos leen la versión del rerun en
+  curso (threading.local), así que un examen no ve cambios a mitad.
+- Una versión antigua solo la referencian las sesiones fijadas a ella: se
+  libera al terminar la última (live_versions la sigue con referencias débiles).
+
+Uso:
+    python -m utils.data_versions --bench
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple
+
+from utils import metrics
+from utils.bank_builder import file_sha1
+from utils.exams import CONFIG_PATH, get_banks
+
+# Cada cuánto mira el watcher si cambiaron los archivos
+WATCH_INTERVAL_SECONDS = 2.0
+
+STATE_KEY = "data_version"
+
+
+class DataVersion:
+    """
+    Config y bancos de una versión. Compartida entre sesiones: no modificar.
+    """
+    def __init__(self, number: int, config: Dict[str, Any], banks: Dict[str, List[Dict[str, Any]]],
+                 sha1: Dict[str, str], signature: Tuple):
+        self.number = number
+        self.config = config
+        self.banks = banks
+        self.sha1 = sha1
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.indexes = {name: {q["id"]: q for q in questions} for name, questions in banks.items()}
+
+    def __repr__(self):
+        return f"DataVersion({self.number}, banks={ {k: len(v) for k, v in self.banks.items()} })"
+
+
+_current: Optional[DataVersion] = None
+_reload_lock = threading.Lock()
+_local = threading.local()
+# {número: versión} de las versiones que alguien sigue usando
+_live: "weakref.WeakValueDictionary[int, DataVersion]" = weakref.WeakValueDictionary()
+_last_number = 0
+_failed_signature = None
+_watcher = None
+
+
+def _signature(paths: Dict[str, str]) -> Tuple:
+    entries = []
+    for path in [CONFIG_PATH, *sorted(set(paths.values()))]:
+        try:
+            stat = os.stat(path)
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            entries.append((path, None, None))
+    return tuple(entries)
+
+
+def _read_config() -> Dict[str, Any]:
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _changed(version: DataVersion) -> bool:
+    return _signature(get_banks(version.config)) != version.signature
+
+
+def _needs_reload(version: DataVersion) -> bool:
+    # Una firma que ya falló no se reintenta hasta que el archivo vuelva a cambiar
+    signature = _signature(get_banks(version.config))
+    return signature != version.signature and signature != _failed_signature
+
+
+def _load(number: int) -> DataVersion:
+    from utils.question_manager import _load_bank
+
+    # La firma se toma antes de leer: un cambio durante la lectura provoca otra recarga
+    config = _read_config()
+    paths = get_banks(config)
+    signature = _signature(paths)
+    banks = {name: _load_bank(path) for name, path in paths.items()}
+    sha1 = {name: file_sha1(path) for name, path in paths.items()}
+    return DataVersion(number, config, banks, sha1, signature)
+
+
+def reload(force: bool = False) -> DataVersion:
+    """
+    Carga y publica una versión nueva si los archivos cambiaron (o si 'force').
+    Si la carga falla se conserva la vigente (y se lanza si no había ninguna).
+    """
+    global _current, _last_number, _failed_signature
+    with _reload_lock:
+        version = _current
+        if version is not None and not force and not _changed(version):
+            return version
+        start = time.perf_counter()
+        try:
+            new = _load(_last_number + 1)
+        except (OSError, ValueError, KeyError) as e:
+            if version is None:
+                raise
+            _failed_signature = _signature(get_banks(version.config))
+            metrics.inc("exam_data_reloads_total", result="error")
+            print(f"Recarga de datos fallida, se mantiene la versión {version.number}: {e}")
+            return version
+        _last_number = new.number
+        _live[new.number] = new
+        _current = new
+        _failed_signature = None
+        metrics.inc("exam_data_reloads_total", result="ok")
+        if version is not None:
+            print(f"Datos recargados: versión {new.number} en {time.perf_counter() - start:.2f} s")
+        return new
+
+
+def current() -> DataVersion:
+    """
+    Versión vigente (la carga la primera vez). Sin watcher, comprueba antes los archivos.
+    """
+    version = _current
+    if version is None or (_watcher is None and _needs_reload(version)):
+        version = reload()
+    return version
+
+
+def active() -> DataVersion:
+    """
+    Versión del rerun en curso (la de la sesión, ver bind) o la vigente.
+    """
+    return getattr(_local, "version", None) or current()
+
+
+def bind(state: MutableMapping[str, Any]) -> DataVersion:
+    """
+    Fija la versión de la sesión para este rerun: la vigente mientras no hay
+    examen; la misma desde que la sesión tiene preguntas.
+    """
+    version = state.get(STATE_KEY)
+    if version is None or not state.get("selected_questions"):
+        version = current()
+        state[STATE_KEY] = version
+    _local.version = version
+    return version
+
+
+def unbind():
+    """
+    Olvida la versión fijada en este hilo (hilos de fondo que atienden varias sesiones).
+    """
+    _local.version = None
+
+
+def live_versions() -> List[int]:
+    """
+    Números de las versiones aún en memoria (la vigente y las que tienen sesiones fijadas).
+    """
+    return sorted(_live.keys())
+
+
+def _watch(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            version = _current
+            if version is not None and _needs_reload(version):
+                reload()
+        except Exception as e:
+            print(f"Error en el watcher de datos: {e}")
+
+
+def start_watcher(interval: float = WATCH_INTERVAL_SECONDS):
+    """
+    Arranca (una vez por proceso) el hilo que recarga los datos al cambiar.
+    """
+    global _watcher
+    if _watcher is not None:
+        return _watcher
+    with _reload_lock:
+        if _watcher is None:
+            thread = threading.Thread(target=_watch, args=(interval,), name="data-versions-watcher", daemon=True)
+            thread.start()
+            _watcher = thread
+    current()
+    return _watcher
+
+
+def run_benchmark(rounds: int = 20000) -> Dict[str, Any]:
+    """
+    En una copia de data/: coste por rerun de obtener un banco (antes: os.stat +
+    lru_cache; ahora: referencia), recarga en segundo plano mientras otro hilo lee,
+    fijación de sesiones y liberación de la versión antigua.
+    """
+    global _current, _watcher
+    from utils.question_manager import _load_bank
+
+    previous_cwd, previous_current, previous_watcher = os.getcwd(), _current, _watcher
+    tmp = tempfile.mkdtemp(prefix="data_versions_")
+    result: Dict[str, Any] = {}
+    try:
+        shutil.copytree("data", os.path.join(tmp, "data"))
+        os.chdir(tmp)
+        _current, _watcher = None, None
+        reload(force=True)
+
+        # Antes: stat del archivo en cada load_bank
+        path = get_banks()["full"]
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            stat = os.stat(path)
+            (path, stat.st_mtime_ns, stat.st_size)
+        result["stat_us"] = round((time.perf_counter() - t0) / rounds * 1e6, 2)
+        t0 = time.perf_counter()
+        _load_bank(path)
+        result["inline_reload_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        _watcher = True  # como con el watcher en marcha: sin stat en el camino de la petición
+        sessions = [{"selected_questions": [1]} for _ in range(3)]
+        for session in sessions:
+            bind(session)
+        del session
+        _local.version = None
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            active().banks["full"]
+        result["active_us"] = round((time.perf_counter() - t0) / rounds * 1e6, 2)
+
+        # Recarga en otro hilo mientras este sigue leyendo
+        with open(CONFIG_PATH, "a", encoding="utf-8") as f:
+            f.write("\n")
+        worst = 0.0
+        reloader = threading.Thread(target=reload)
+        started = time.perf_counter()
+        reloader.start()
+        reads = 0
+        while reloader.is_alive():
+            t0 = time.perf_counter()
+            active().banks["full"]
+            worst = max(worst, time.perf_counter() - t0)
+            reads += 1
+        result["reload_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["reads_during_reload"] = reads
+        result["worst_read_us"] = round(worst * 1e6, 1)
+
+        old = sessions[0][STATE_KEY]
+        pinned = all(bind(state) is old for state in sessions)
+        fresh = bind({})
+        result["pinned"] = pinned and fresh is not old and fresh is _current
+        result["live_before"] = live_versions()
+        del old
+        sessions.clear()
+        _local.version = None
+        gc.collect()
+        result["live_after"] = live_versions()
+    finally:
+        os.chdir(previous_cwd)
+        _local.version = None
+        _current, _watcher = previous_current, previous_watcher
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned, hot-reloaded config and question banks.")
+    parser.add_argument("--bench", action="store_true", help="request-path cost, background reload and pinning")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    r = run_benchmark()
+    print(f"per call: os.stat {r['stat_us']:.2f} us before, active() {r['active_us']:.2f} us now")
+    print(f"reload: {r['inline_reload_ms']:.0f} ms paid by the first request before; now {r['reload_ms']:.0f} ms "
+          f"in the watcher ({r['reads_during_reload']} reads meanwhile, worst {r['worst_read_us']:.0f} us)")
+    print(f"sessions pinned to the old version: {r['pinned']}; live versions {r['live_before']} "
+          f"-> {r['live_after']} after the last pinned session ended")
+
+
+if __name__ == "__main__":
+    main()
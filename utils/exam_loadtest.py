@@ -0,0 +1,230 @@
+# utils/exam_loadtest.py
+"""
+Prueba de carga: coste en servidor de responder un examen en el modo normal
+frente al modo navegador (components.exam_runner).
+
+Cada candidato simulado (AppTest) entra, inicia el examen y responde todas las
+preguntas. Se mide desde "Start Exam" hasta tener todas las respuestas en la
+sesión (la finalización es igual en ambos modos y queda fuera):
+
+- normal: por pregunta, elegir la opción (un rerun) y pulsar Next (otro).
+- navegador: un rerun que envía la forma y un lote cada --batch respuestas.
+
+Se cuentan reruns y CPU del proceso por examen. AppTest ejecuta cada lote como
+rerun completo; en el servidor real un lote solo ejecuta el fragmento del
+componente, así que la cifra del modo navegador es una cota superior.
+
+--sidebar compara además, por rerun, la barra lateral de navegación anterior
+(un st.button por pregunta marcada / sin responder) con la paleta de un solo
+widget (components.question_palette): tiempo de rerun y bytes de los protos de
+la barra lateral.
+
+Uso:
+    python -m utils.exam_loadtest --candidates 5 --batch 10
+    python -m utils.exam_loadtest --sidebar --questions 140
+"""
+import argparse
+import json
+import os
+import random
+import time
+from typing import Dict, Any
+
+APP_SCRIPT = os.path.abspath("app.py")
+LOGIN_EMAIL = "loadtest@example.com"
+
+
+def _login(at, access_code: str, runner: bool):
+    at.run()
+    at.text_input[0].input(LOGIN_EMAIL)
+    at.text_input[1].input(access_code)
+    at.button[0].click().run()
+    [t for t in at.text_input if t.label == "Full Name:"][0].input("Load Test")
+    if runner:
+        [c for c in at.checkbox if c.label.startswith("Run the exam")][0].check()
+    return [b for b in at.button if b.label == "Start Exam"][0]
+
+
+def _standard_exam(at, rng: random.Random) -> int:
+    runs = 0
+    while True:
+        radio = at.radio[0]
+        radio.set_value(rng.randrange(len(radio.options))).run()
+        runs += 1
+        index = at.session_state["current_question_index"]
+        if index >= len(at.session_state["selected_questions"]) - 1:
+            return runs
+        [b for b in at.button if b.label == "Next"][0].click().run()
+        runs += 1
+
+
+def _runner_exam(at, rng: random.Random, batch_size: int) -> int:
+    from components.exam_runner import RUNNER_KEY
+
+    questions = at.session_state["selected_questions"]
+    attempt = at.session_state["attempt_id"]
+    runs = 0
+    batch: Dict[str, int] = {}
+    for index, question in enumerate(questions):
+        batch[str(index)] = rng.randrange(len(question["opciones"]))
+        if len(batch) >= batch_size or index == len(questions) - 1:
+            runs += 1
+            at.session_state[RUNNER_KEY] = {
+                "attempt": attempt, "seq": runs, "answers": batch, "marked": [], "current": index,
+            }
+            at.run()
+            batch = {}
+    return runs
+
+
+def run_candidate(mode: str, access_code: str, batch_size: int, seed: int) -> Dict[str, Any]:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=300)
+    start_button = _login(at, access_code, mode == "runner")
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    start_button.click().run()
+    if mode == "runner":
+        runs = 1 + _runner_exam(at, rng, batch_size)
+    else:
+        runs = 1 + _standard_exam(at, rng)
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+
+    if at.exception:
+        raise RuntimeError(f"{mode}: {at.exception[0].message}")
+    answers = at.session_state["answers"]
+    questions = at.session_state["selected_questions"]
+    assert all(answers.get(str(i)) is not None for i in range(len(questions))), f"{mode}: unanswered questions"
+    return {
+        "questions": len(questions),
+        "runs": runs,
+        "cpu_ms": cpu * 1000,
+        "wall_ms": wall * 1000,
+    }
+
+
+def run_loadtest(candidates: int, access_code: str, batch_size: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for mode in ("standard", "runner"):
+        rows = [run_candidate(mode, access_code, batch_size, seed) for seed in range(candidates)]
+        results[mode] = {
+            "questions": rows[0]["questions"],
+            "runs_per_exam": sum(r["runs"] for r in rows) / len(rows),
+            "cpu_ms_per_exam": sum(r["cpu_ms"] for r in rows) / len(rows),
+            "wall_ms_per_exam": sum(r["wall_ms"] for r in rows) / len(rows),
+        }
+    return results
+
+
+_SIDEBAR_STATE = """
+import streamlit as st
+if "selected_questions" not in st.session_state:
+    n = {questions}
+    st.session_state.selected_questions = [{{"id": str(i)}} for i in range(n)]
+    st.session_state.answers = {{str(i): ("a" if i % 3 else None) for i in range(n)}}
+    st.session_state.marked = set(range(0, n, 14))
+    st.session_state.current_question_index = 0
+"""
+
+# Barra lateral anterior (app.py hasta la paleta), como referencia
+_LEGACY_SIDEBAR = """
+if st.session_state.marked:
+    for index in st.session_state.marked:
+        question_number = index + 1
+        col1, col2 = st.sidebar.columns([3, 1])
+        with col1:
+            if st.button(f"Question {question_number}", key=f"goto_{index}"):
+                st.session_state.current_question_index = index
+                st.rerun()
+        with col2:
+            if st.button("X", key=f"unmark_{index}"):
+                st.session_state.marked.remove(index)
+                st.rerun()
+unanswered_indices = [i for i in range(len(st.session_state.selected_questions))
+                      if st.session_state.answers.get(str(i)) is None]
+if unanswered_indices:
+    st.sidebar.subheader("Unanswered Questions")
+    for i in range(0, len(unanswered_indices), 3):
+        cols = st.sidebar.columns(3)
+        for j, index in enumerate(unanswered_indices[i:i+3]):
+            with cols[j]:
+                if st.button(f"Q {index + 1}", key=f"goto_unanswered_{index}"):
+                    st.session_state.current_question_index = index
+                    st.rerun()
+"""
+
+_PALETTE_SIDEBAR = """
+from components.question_palette import display_question_palette
+with st.sidebar:
+    display_question_palette()
+"""
+
+
+def _tree_stats(node):
+    """
+    (widgets/elementos, bytes de sus protos) de un subárbol de AppTest.
+    """
+    proto = getattr(node, "proto", None)
+    elements, size = (1, len(proto.SerializeToString())) if proto is not None else (0, 0)
+    for child in getattr(node, "children", {}).values():
+        e, b = _tree_stats(child)
+        elements += e
+        size += b
+    return elements, size
+
+
+def run_sidebar_benchmark(questions: int = 140, repeat: int = 20) -> Dict[str, Dict[str, float]]:
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    baseline = None
+    for label, body in (("empty", ""), ("legacy buttons", _LEGACY_SIDEBAR), ("palette", _PALETTE_SIDEBAR)):
+        at = AppTest.from_string(_SIDEBAR_STATE.format(questions=questions) + body, default_timeout=60).run()
+        if at.exception:
+            raise RuntimeError(f"{label}: {at.exception[0].message}")
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            at.run()
+        rerun_ms = (time.perf_counter() - t0) / repeat * 1000
+        elements, size = _tree_stats(at.sidebar)
+        if baseline is None:
+            baseline = rerun_ms
+            continue
+        results[label] = {
+            "elements": elements,
+            "sidebar_bytes": size,
+            "rerun_ms": round(rerun_ms, 2),
+            "sidebar_ms": round(rerun_ms - baseline, 2),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare server cost per exam: standard mode vs browser runner.")
+    parser.add_argument("--candidates", type=int, default=3, help="simulated candidates per mode")
+    parser.add_argument("--batch", type=int, default=10, help="answers per sync batch in runner mode")
+    parser.add_argument("--code", default="prueba2", help="access code valid for the exam to test")
+    parser.add_argument("--sidebar", action="store_true", help="benchmark the navigation sidebar instead")
+    parser.add_argument("--questions", type=int, default=140, help="exam length for --sidebar")
+    args = parser.parse_args()
+
+    if args.sidebar:
+        results = run_sidebar_benchmark(args.questions)
+        for label, r in results.items():
+            print(f"{label:15s} {r['elements']:4d} elements {r['sidebar_bytes']:7d} B "
+                  f"rerun {r['rerun_ms']:6.2f} ms (sidebar {r['sidebar_ms']:6.2f} ms)")
+        return
+
+    results = run_loadtest(args.candidates, args.code, args.batch)
+    print(json.dumps(results, indent=2))
+    standard, runner = results["standard"], results["runner"]
+    print(f"{standard['questions']} questions: standard {standard['runs_per_exam']:.0f} runs / "
+          f"{standard['cpu_ms_per_exam']:.0f} ms CPU, runner {runner['runs_per_exam']:.0f} runs / "
+          f"{runner['cpu_ms_per_exam']:.0f} ms CPU "
+          f"({standard['cpu_ms_per_exam'] / max(runner['cpu_ms_per_exam'], 1e-9):.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
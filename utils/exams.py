@@ -0,0 +1,163 @@
+# utils/exams.py
+"""
+Definiciones de examen como datos (data/config.json → "banks" y "exams").
+
+Cada examen declara su banco, número de preguntas, blueprint por clasificación,
+refuerzo de preguntas con imagen, límite de tiempo y claves de acceso. Los
+campos que falten en "full" / "short" se toman de las claves históricas de
+config.json, así que un config antiguo sin "exams" sigue funcionando.
+
+Ejemplo para añadir un examen:
+
+    "banks": {"spi": "data/preguntas_spi.json"},
+    "exams": {
+        "spi": {
+            "title": "ARDMS SPI",
+            "bank": "spi",
+            "num_questions": 110,
+            "time_limit_seconds": 7200,
+            "blueprint": {"Clinical Safety": 20, "...": 80},
+            "password_bases": ["SPI#A1B2"]
+        }
+    }
+
+Las sesiones de un examen solo ven su banco: el modo adaptativo y "Study a
+concept" usan el banco del propio examen. Para practicar con el banco de otro
+examen hay que declararlo de forma explícita con "adaptive_exam" (por ejemplo
+"adaptive_exam": "full" en "short" abre el banco completo a los códigos cortos).
+"""
+from typing import List, Dict, Any, Optional
+
+CONFIG_PATH = 'data/config.json'
+
+DEFAULT_BANKS = {
+    "full": 'data/preguntas.json',
+    "short": 'data/preguntas_corto.json',
+}
+
+# Blueprint RVT: porcentaje de preguntas por clasificación
+CLASSIFICATION_PERCENTAGES = {
+    "Normal Anatomy, Perfusion, and Function": 21,
+    "Pathology, Perfusion, and Function": 32,
+    "Surgically Altered Anatomy and Pathology": 6,
+    "Physiologic Exams": 12,
+    "Ultrasound-guided Procedures/Intraoperative Assessment": 7,
+    "Quality Assurance, Safety, and Physical Principles": 14,
+    "Preparation,Documentation, and communication": 8,
+}
+
+# Preguntas con imagen que se suman por clasificación en el examen RVT completo
+RVT_IMAGE_BOOST = {
+    "Normal Anatomy, Perfusion, and Function": 7,
+    "Pathology, Perfusion, and Function": 7,
+    "Surgically Altered Anatomy and Pathology": 4,
+}
+
+# Modos de práctica elegidos en la pantalla de datos: usan el límite de tiempo corto
+PRACTICE_MODES = ("adaptive", "review", "concept")
+
+
+def load_config():
+    """
+    data/config.json de la versión de datos en uso (ver utils.data_versions). No modificar el dict devuelto.
+    """
+    from utils.data_versions import active
+
+    return active().config
+
+
+def _legacy_exams(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Exámenes RVT históricos (full / short) a partir de las claves sueltas de config.json.
+    """
+    return {
+        "full": {
+            "title": "ARDMS RVT",
+            "bank": "full",
+            "num_questions": 140,
+            "time_limit_seconds": config.get("time_limit_seconds", 7200),
+            "blueprint": CLASSIFICATION_PERCENTAGES,
+            "image_boost": RVT_IMAGE_BOOST,
+            "password_bases": config.get("passwords_full_base", []),
+            "master_password": config.get("master_password_full"),
+        },
+        "short": {
+            "title": "ARDMS RVT (short)",
+            "bank": "short",
+            "num_questions": 20,
+            "time_limit_seconds": config.get("time_limit_seconds_short"),
+            "practice": True,
+            "password_bases": config.get("passwords_short_base", []),
+            "master_password": config.get("master_password_short"),
+        },
+    }
+
+
+def get_banks(config: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """
+    Bancos disponibles: {nombre: ruta del JSON}.
+    """
+    config = config if config is not None else load_config()
+    return {**DEFAULT_BANKS, **config.get("banks", {})}
+
+
+def get_exams(config: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Definiciones de examen completas: {exam_id: definición}, en el orden de config.json.
+    """
+    config = config if config is not None else load_config()
+    legacy = _legacy_exams(config)
+    declared = config.get("exams") or legacy
+
+    exams = {}
+    for exam_id, spec in declared.items():
+        exam = {
+            "title": exam_id,
+            "num_questions": 20,
+            "time_limit_seconds": config.get("time_limit_seconds", 7200),
+            "blueprint": None,
+            "image_boost": {},
+            "practice": False,
+            "password_bases": [],
+            "master_password": None,
+        }
+        exam.update(legacy.get(exam_id, {}))
+        exam.update(spec)
+        exam["id"] = exam_id
+        exam.setdefault("bank", exam_id)
+        exam.setdefault("adaptive_exam", exam_id)
+        exams[exam_id] = exam
+    return exams
+
+
+def get_exam(exam_id: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Definición de un examen. Lanza ValueError si no existe.
+    """
+    exams = get_exams(config)
+    if exam_id not in exams:
+        raise ValueError(f"Unknown exam: {exam_id!r}")
+    return exams[exam_id]
+
+
+def exam_banks(exam_id: str, config: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Bancos que puede usar una sesión de este examen (el suyo y el del modo adaptativo).
+    """
+    exams = get_exams(config)
+    exam = exams[exam_id]
+    banks = [exam["bank"]]
+    adaptive = exams.get(exam["adaptive_exam"])
+    if adaptive and adaptive["bank"] not in banks:
+        banks.append(adaptive["bank"])
+    return banks
+
+
+def exam_time_limit(exam_id: str, exam_type: str, config: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Límite de tiempo en segundos. Los modos de práctica usan 'time_limit_seconds_short'.
+    """
+    config = config if config is not None else load_config()
+    if exam_type in PRACTICE_MODES:
+        return config.get("time_limit_seconds_short", 1200)
+    return get_exam(exam_id, config)["time_limit_seconds"]
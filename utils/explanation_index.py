@@ -0,0 +1,238 @@
+# utils/explanation_index.py
+"""
+Índice TF-IDF en memoria sobre las explicaciones ya existentes del banco.
+
+Cuando una pregunta fallada no trae 'explicacion_openai' (banco corto, ítems
+nuevos), antes de llamar al LLM se busca la pregunta más parecida que sí la
+tiene: mismo concepto, mismo tipo de enunciado. Se usa su explicación (con su
+'Concept to Study') solo si la similitud coseno llega a SIMILARITY_THRESHOLD y,
+además, la respuesta correcta coincide (ANSWER_OVERLAP) y, si la pregunta trae
+concepto, también el concepto (CONCEPT_OVERLAP); si no, se llama al LLM como antes.
+
+Cada documento es una pregunta con explicación: enunciado + respuesta
+correcta + concepto (el concepto cuenta doble). El índice son listas de
+postings por término (arrays de numpy), así que una búsqueda son unas decenas
+de sumas vectorizadas: decenas de microsegundos. Se construye una vez por
+proceso y por versión de los datos (utils.data_versions).
+
+Los aciertos y fallos se cuentan en exam_explanation_lookups_total{result}.
+
+Uso:
+    python -m utils.explanation_index --bench
+"""
+import argparse
+import math
+import re
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from utils import data_versions, metrics
+from utils.exams import get_banks
+
+# Similitud coseno mínima para reutilizar una explicación (ver --bench)
+SIMILARITY_THRESHOLD = 0.8
+# Solapamiento mínimo (Jaccard de términos) de la respuesta correcta y del concepto
+ANSWER_OVERLAP = 0.7
+CONCEPT_OVERLAP = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have in is it its of on or that the this to was were "
+    "which with what when where who why how most likely following best would will not no".split()
+)
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _answer_terms(question: Dict[str, Any]) -> frozenset:
+    return frozenset(_tokens(" ".join(question.get("respuesta_correcta", []) or [])))
+
+
+def _overlap(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _document(question: Dict[str, Any]) -> List[str]:
+    concept = question.get("concept_to_study", "") or ""
+    answers = " ".join(question.get("respuesta_correcta", []) or [])
+    return _tokens(f"{question.get('enunciado', '')} {answers} {concept} {concept}")
+
+
+class ExplanationIndex:
+    """
+    TF-IDF (tf sublineal, normalización L2) sobre preguntas con explicación.
+    """
+    def __init__(self, questions: List[Dict[str, Any]]):
+        from openai_utils.explanations import local_explanation_text
+
+        self.ids: List[str] = []
+        self.concepts: List[str] = []
+        self.explanations: List[str] = []
+        self.answer_terms: List[frozenset] = []
+        docs = []
+        for q in questions:
+            text = local_explanation_text(q)
+            if not text:
+                continue
+            self.ids.append(q.get("id", ""))
+            self.concepts.append(q.get("concept_to_study", "") or "")
+            self.explanations.append(text)
+            self.answer_terms.append(_answer_terms(q))
+            docs.append(Counter(_document(q)))
+
+        n = len(docs)
+        df = Counter(term for doc in docs for term in doc)
+        self.idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self.unknown_idf = math.log(1 + n) + 1
+
+        postings: Dict[str, Tuple[list, list]] = {}
+        for doc_id, doc in enumerate(docs):
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in doc.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, w in weights.items():
+                ids, ws = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                ws.append(w / norm)
+        self.postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(ws, dtype=np.float32))
+            for term, (ids, ws) in postings.items()
+        }
+        self._scores = np.zeros(n, dtype=np.float32)
+        self._docs_by_id: Dict[str, List[int]] = {}
+        for doc_id, item_id in enumerate(self.ids):
+            self._docs_by_id.setdefault(item_id, []).append(doc_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nearest(self, question: Dict[str, Any], exclude_id: Optional[str] = None) -> Optional[Tuple[int, float]]:
+        """
+        (documento más parecido, similitud coseno) o None si no comparte ningún término.
+        """
+        counts = Counter(_document(question))
+        if not counts or not self.ids:
+            return None
+        weights = {term: (1 + math.log(tf)) * self.idf.get(term, self.unknown_idf) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        scores = np.zeros_like(self._scores)
+        for term, w in weights.items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1] * (w / norm)
+        for doc_id in self._docs_by_id.get(exclude_id, ()):
+            scores[doc_id] = 0.0
+        best = int(scores.argmax())
+        if scores[best] <= 0:
+            return None
+        return best, float(scores[best])
+
+    def agrees(self, doc_id: int, question: Dict[str, Any]) -> bool:
+        """
+        True si el documento tiene la misma respuesta correcta y, si la pregunta
+        trae concepto, el mismo concepto (por solapamiento de términos).
+        """
+        if _overlap(self.answer_terms[doc_id], _answer_terms(question)) < ANSWER_OVERLAP:
+            return False
+        concept = frozenset(_tokens(question.get("concept_to_study", "") or ""))
+        return not concept or _overlap(frozenset(_tokens(self.concepts[doc_id])), concept) >= CONCEPT_OVERLAP
+
+
+@lru_cache(maxsize=4)
+def _shared_index(version: int) -> ExplanationIndex:
+    from utils.question_manager import load_bank
+
+    questions = []
+    for bank in sorted(get_banks()):
+        questions.extend(load_bank(bank))
+    return ExplanationIndex(questions)
+
+
+def get_index() -> ExplanationIndex:
+    """
+    Índice de todos los bancos de config.json (compartido; uno por versión de datos).
+    """
+    return _shared_index(data_versions.active().number)
+
+
+def retrieve_explanation(question: Dict[str, Any], threshold: float = SIMILARITY_THRESHOLD) -> Optional[str]:
+    """
+    Explicación existente de la pregunta más parecida, o None si ninguna llega al
+    umbral o no coincide en respuesta correcta (y concepto).
+    """
+    index = get_index()
+    found = index.nearest(question)
+    if found is None or found[1] < threshold or not index.agrees(found[0], question):
+        metrics.inc("exam_explanation_lookups_total", result="miss")
+        return None
+    metrics.inc("exam_explanation_lookups_total", result="hit")
+    return index.explanations[found[0]]
+
+
+def run_benchmark(threshold: float = SIMILARITY_THRESHOLD) -> Dict[str, Any]:
+    """
+    Dejando fuera cada pregunta del banco completo: tasa de aciertos al umbral
+    (con la comprobación de respuesta correcta), cuántos aciertos comparten el
+    concepto de la pregunta (etiqueta exacta o por términos) y latencia por búsqueda.
+    """
+    from utils.question_manager import load_bank
+
+    t0 = time.perf_counter()
+    index = get_index()
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    questions = [q for q in load_bank("full") if q.get("concept_to_study")]
+    # Como un ítem nuevo: sin concepto ni explicación en la consulta
+    queries = [{k: q[k] for k in ("enunciado", "respuesta_correcta")} for q in questions]
+    t0 = time.perf_counter()
+    results = [index.nearest(query, exclude_id=q.get("id")) for query, q in zip(queries, questions)]
+    lookup_us = (time.perf_counter() - t0) / max(1, len(questions)) * 1e6
+
+    concept_docs = Counter(c.strip().lower() for c in index.concepts)
+    hits = same_concept = shared = related = 0
+    for q, query, found in zip(questions, queries, results):
+        if found is None or found[1] < threshold or not index.agrees(found[0], query):
+            continue
+        hits += 1
+        concept = q["concept_to_study"].strip().lower()
+        related += _overlap(frozenset(_tokens(index.concepts[found[0]])),
+                            frozenset(_tokens(concept))) >= CONCEPT_OVERLAP
+        # Solo se puede acertar la etiqueta exacta si otra pregunta la comparte
+        if concept_docs[concept] > 1:
+            shared += 1
+            same_concept += index.concepts[found[0]].strip().lower() == concept
+    return {
+        "documents": len(index),
+        "build_ms": round(build_ms, 1),
+        "queries": len(questions),
+        "threshold": threshold,
+        "hit_rate": round(hits / max(1, len(questions)), 3),
+        "same_concept": round(same_concept / max(1, shared), 3),
+        "related_concept": round(related / max(1, hits), 3),
+        "lookup_us": round(lookup_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval fallback for missed-question explanations.")
+    parser.add_argument("--bench", action="store_true", help="leave-one-out hit rate and lookup latency")
+    parser.add_argument("--threshold", type=float, nargs="*", default=[SIMILARITY_THRESHOLD])
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    for threshold in args.threshold:
+        r = run_benchmark(threshold)
+        print(f"threshold {r['threshold']:.2f}: {r['documents']} documents (built in {r['build_ms']:.0f} ms), "
+              f"hit rate {r['hit_rate']:.1%} of {r['queries']}, same concept {r['same_concept']:.1%} "
+              f"(related {r['related_concept']:.1%}), "
+              f"{r['lookup_us']:.0f} us/lookup")
+
+
+if __name__ == "__main__":
+    main()
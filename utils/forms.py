@@ -0,0 +1,325 @@
+# utils/forms.py
+"""
+Formas de examen reproducibles.
+
+Una forma es la lista ordenada de preguntas de un examen junto con el orden de
+sus opciones, guardado como índice de permutación (utils.permutations) con la
+respuesta correcta repartida entre las posiciones. Se genera con un RNG aislado (random.Random(seed)): la misma
+semilla con la misma versión del banco produce siempre la misma forma, así que
+cualquier intento puede reconstruirse para auditoría.
+
+Antes de una ventana de examen se pre-generan miles de formas válidas según el
+blueprint; al iniciar el examen solo se reserva una forma libre (una consulta),
+en lugar de muestrear el banco bajo carga. Si no queda ninguna, se genera una
+con semilla derivada del intento. Un usuario con historial (utils.seen_items)
+recibe, entre SEEN_CANDIDATES formas libres, la que menos preguntas ya vistas
+repite; solo si todas pasan de MAX_SEEN_OVERLAP se genera una para él
+(forma "seen", que la semilla sola no reproduce).
+
+Uso:
+    python -m utils.forms --exam full --count 5000
+    python -m utils.forms --show full-0a1b2c3d4e5f6a7
+    python -m utils.forms --stats
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from utils import data_versions
+from utils.exams import get_exam, get_exams
+from utils.permutations import perm_rank
+from utils.question_manager import load_bank, load_bank_index, select_exam_questions, arrange_options, apply_permutation, _session_copy
+from utils.storage import get_connection, ensure_schema
+
+DB_NAME = "forms.db"
+
+# Formas libres que se comparan con lo ya visto por el usuario
+SEEN_CANDIDATES = 64
+# Fracción máxima de preguntas ya vistas para usar una forma pre-generada
+MAX_SEEN_OVERLAP = 0.15
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forms (
+    form_id TEXT PRIMARY KEY,
+    exam_id TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    bank_sha1 TEXT NOT NULL,
+    items TEXT NOT NULL,
+    sequence INTEGER,
+    created_at TEXT NOT NULL,
+    attempt_id TEXT,
+    claimed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_forms_free ON forms (exam_id, bank_sha1) WHERE attempt_id IS NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_forms_attempt ON forms (attempt_id) WHERE attempt_id IS NOT NULL;
+"""
+
+
+def _conn():
+    return ensure_schema(get_connection(DB_NAME), _SCHEMA)
+
+
+def derive_seed(*parts: str) -> int:
+    """
+    Semilla de 60 bits derivada de forma estable de un texto (p.ej. exam_id + attempt_id).
+    """
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return int(digest[:15], 16)
+
+
+def form_id_for(exam_id: str, seed: int, seen: bool = False) -> str:
+    return f"{exam_id}-seen-{seed:015x}" if seen else f"{exam_id}-{seed:015x}"
+
+
+def is_seen_form(form_id: str) -> bool:
+    """
+    True si la forma se generó con preguntas vistas (build_form con 'seen'):
+    no se puede reconstruir solo con su semilla.
+    """
+    return "-seen-" in form_id
+
+
+def bank_sha1(exam_id: str) -> str:
+    """
+    Hash del archivo del banco del examen (la forma solo vale para esa versión).
+    Es el de la versión de datos de la sesión (utils.data_versions).
+    """
+    return data_versions.active().sha1[get_exam(exam_id)["bank"]]
+
+
+def build_form(exam_id: str, seed: int, seen=None) -> Dict[str, Any]:
+    """
+    Genera la forma de 'exam_id' para 'seed'. Determinista para una versión del banco
+    (y, con 'seen', para esa máscara de preguntas ya vistas).
+    """
+    rng = random.Random(seed)
+    questions = select_exam_questions(exam_id, rng=rng, seen=seen)
+    ranks = arrange_options(questions, rng)
+    return {
+        "form_id": form_id_for(exam_id, seed, seen=seen is not None),
+        "exam_id": exam_id,
+        "seed": seed,
+        "bank_sha1": bank_sha1(exam_id),
+        "items": [[q["id"], rank] for q, rank in zip(questions, ranks)],
+    }
+
+
+def check_form(exam: Dict[str, Any], questions: List[Dict[str, Any]]) -> List[str]:
+    """
+    Problemas de una forma respecto a su examen (lista vacía si es válida):
+    número de preguntas, repetidas y mínimo por clasificación del blueprint.
+    """
+    problems = []
+    if len(questions) != exam["num_questions"]:
+        problems.append(f"{len(questions)} questions instead of {exam['num_questions']}")
+    ids = [q["id"] for q in questions]
+    if len(set(ids)) != len(ids):
+        problems.append("repeated questions")
+    if exam["blueprint"]:
+        counts: Dict[str, int] = {}
+        for q in questions:
+            counts[q.get("clasificacion", "Other")] = counts.get(q.get("clasificacion", "Other"), 0) + 1
+        for clasif, percentage in exam["blueprint"].items():
+            expected = int(exam["num_questions"] * (percentage / 100))
+            if counts.get(clasif, 0) < expected:
+                problems.append(f"{clasif}: {counts.get(clasif, 0)} < {expected}")
+    return problems
+
+
+def _insert(conn, form: Dict[str, Any], sequence: Optional[int] = None, attempt_id: Optional[str] = None):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn.execute(
+        "INSERT OR IGNORE INTO forms (form_id, exam_id, seed, bank_sha1, items, sequence, created_at, "
+        "attempt_id, claimed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            form["form_id"], form["exam_id"], form["seed"], form["bank_sha1"],
+            json.dumps(form["items"], ensure_ascii=False, separators=(",", ":")),
+            sequence, now, attempt_id, now if attempt_id else None,
+        ),
+    )
+
+
+def pregenerate_forms(exam_id: str, count: int) -> Dict[str, int]:
+    """
+    Añade 'count' formas libres para la versión actual del banco.
+    Las semillas siguen la secuencia (examen, banco, n), así que repetir el trabajo
+    continúa la secuencia en lugar de duplicar formas.
+    """
+    exam = get_exam(exam_id)
+    sha = bank_sha1(exam_id)
+    bank = {q["id"]: q for q in load_bank(exam["bank"])}
+    conn = _conn()
+    start = conn.execute(
+        "SELECT COALESCE(MAX(sequence) + 1, 0) FROM forms WHERE exam_id = ? AND bank_sha1 = ?",
+        (exam_id, sha),
+    ).fetchone()[0]
+
+    stats = {"generated": 0, "rejected": 0}
+    batch = []
+    for n in range(start, start + count):
+        form = build_form(exam_id, derive_seed(exam_id, sha, "pregen", n))
+        problems = check_form(exam, [bank[item_id] for item_id, _ in form["items"]])
+        if problems:
+            stats["rejected"] += 1
+            print(f"Forma {form['form_id']} descartada: {'; '.join(problems)}", file=sys.stderr)
+            continue
+        batch.append((form, n))
+        if len(batch) >= 500:
+            with conn:
+                for f, sequence in batch:
+                    _insert(conn, f, sequence)
+            stats["generated"] += len(batch)
+            batch = []
+    with conn:
+        for f, sequence in batch:
+            _insert(conn, f, sequence)
+    stats["generated"] += len(batch)
+    return stats
+
+
+def materialize_form(exam_id: str, items) -> Optional[List[Dict[str, Any]]]:
+    """
+    Preguntas de sesión (copias) para una forma; None si alguna ya no existe en el banco.
+    'items' es [[item_id, índice de permutación]] (o la lista de opciones en formas antiguas).
+    """
+    bank = load_bank_index(get_exam(exam_id)["bank"])
+    questions = []
+    for item_id, arrangement in items:
+        if item_id not in bank:
+            return None
+        q = _session_copy(bank[item_id])
+        if isinstance(arrangement, list):
+            arrangement = perm_rank(q["opciones"].index(option) for option in arrangement)
+        questions.append(apply_permutation(q, arrangement))
+    return questions
+
+
+def stored_form_items(form_id: str):
+    """
+    Ítems [[item_id, índice de permutación]] de una forma guardada, o None.
+    """
+    row = _conn().execute("SELECT items FROM forms WHERE form_id = ?", (form_id,)).fetchone()
+    return json.loads(row["items"]) if row else None
+
+
+def _claim_least_seen(conn, exam_id: str, sha: str, attempt_id: str, seen) -> list:
+    """
+    Reserva, entre SEEN_CANDIDATES formas libres, la que menos preguntas vistas
+    repite, si no pasa de MAX_SEEN_OVERLAP. Devuelve las filas reservadas (o []).
+    """
+    bank = load_bank(get_exam(exam_id)["bank"])
+    seen_ids = {bank[i]["id"] for i in seen.nonzero()[0]}
+    candidates = []
+    for row in conn.execute(
+        "SELECT form_id, items FROM forms WHERE exam_id = ? AND bank_sha1 = ? AND attempt_id IS NULL LIMIT ?",
+        (exam_id, sha, SEEN_CANDIDATES),
+    ):
+        items = json.loads(row["items"])
+        overlap = sum(item_id in seen_ids for item_id, _ in items) / max(1, len(items))
+        candidates.append((overlap, row["form_id"]))
+    for overlap, form_id in sorted(candidates):
+        if overlap > MAX_SEEN_OVERLAP:
+            break
+        # Otra sesión pudo reservarla entre la consulta y el UPDATE: se prueba la siguiente
+        with conn:
+            rows = conn.execute(
+                "UPDATE forms SET attempt_id = ?, claimed_at = ? WHERE form_id = ? AND attempt_id IS NULL "
+                "RETURNING form_id, items",
+                (attempt_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), form_id),
+            ).fetchall()
+        if rows:
+            return rows
+    return []
+
+
+def claim_form(exam_id: str, attempt_id: str, seen=None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Reserva una forma para un intento y devuelve (form_id, preguntas con opciones ya ordenadas).
+
+    Toma una forma pre-generada libre de la versión actual del banco; si no hay,
+    genera una con semilla derivada de (exam_id, attempt_id) y la registra.
+    Con 'seen' (utils.seen_items.seen_mask) toma la forma libre que menos
+    preguntas vistas repite (_claim_least_seen); si todas repiten demasiadas,
+    genera la del intento prefiriendo preguntas no vistas (forma "seen": se
+    audita por sus ítems guardados, la semilla sola no la reproduce).
+    Repetir la llamada con el mismo intento devuelve la misma forma.
+    """
+    conn = _conn()
+    sha = bank_sha1(exam_id)
+
+    rows = conn.execute("SELECT form_id, items FROM forms WHERE attempt_id = ?", (attempt_id,)).fetchall()
+    if not rows and seen is not None:
+        rows = _claim_least_seen(conn, exam_id, sha, attempt_id, seen)
+    elif not rows:
+        # Un solo UPDATE: dos sesiones nunca reciben la misma forma
+        with conn:
+            rows = conn.execute(
+                "UPDATE forms SET attempt_id = ?, claimed_at = ? WHERE form_id = ("
+                "SELECT form_id FROM forms WHERE exam_id = ? AND bank_sha1 = ? AND attempt_id IS NULL LIMIT 1"
+                ") RETURNING form_id, items",
+                (attempt_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), exam_id, sha),
+            ).fetchall()
+
+    if rows:
+        questions = materialize_form(exam_id, json.loads(rows[0]["items"]))
+        if questions is not None:
+            return rows[0]["form_id"], questions
+
+    form = build_form(exam_id, derive_seed(exam_id, attempt_id), seen=seen)
+    with conn:
+        # Una forma reservada que ya no corresponde al banco se descarta
+        conn.execute("DELETE FROM forms WHERE attempt_id = ?", (attempt_id,))
+        _insert(conn, form, attempt_id=attempt_id)
+    return form["form_id"], materialize_form(exam_id, form["items"])
+
+
+def form_stats() -> List[Dict[str, Any]]:
+    """
+    Formas por examen y versión de banco: totales y libres.
+    """
+    rows = _conn().execute(
+        "SELECT exam_id, bank_sha1, COUNT(*) AS total, SUM(attempt_id IS NULL) AS free "
+        "FROM forms GROUP BY exam_id, bank_sha1 ORDER BY exam_id"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate and inspect reproducible exam forms.")
+    parser.add_argument("--exam", help="exam id from config.json (e.g. full)")
+    parser.add_argument("--count", type=int, default=1000, help="number of forms to add")
+    parser.add_argument("--show", metavar="FORM_ID", help="print a stored form and check it can be rebuilt")
+    parser.add_argument("--stats", action="store_true", help="forms per exam and bank version")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(form_stats(), indent=2))
+        return
+
+    if args.show:
+        row = _conn().execute("SELECT * FROM forms WHERE form_id = ?", (args.show,)).fetchone()
+        if row is None:
+            sys.exit(f"Form not found: {args.show}")
+        form = dict(row)
+        form["items"] = json.loads(form["items"])
+        if is_seen_form(form["form_id"]):
+            form["reproducible"] = False  # depende de lo visto por el usuario al generarla
+        elif form["bank_sha1"] == bank_sha1(form["exam_id"]):
+            form["reproducible"] = build_form(form["exam_id"], form["seed"])["items"] == form["items"]
+        else:
+            form["reproducible"] = None  # banco distinto al de la forma
+        print(json.dumps(form, indent=2, ensure_ascii=False))
+        return
+
+    if args.exam not in get_exams():
+        parser.error(f"--exam must be one of: {', '.join(get_exams())}")
+    stats = pregenerate_forms(args.exam, args.count)
+    print(f"{args.exam}: {stats['generated']} forms generated, {stats['rejected']} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# utils/import_profile.py
+"""
+Reporte de arranque en frío de la app.
+
+Importa app.py en un proceso Python nuevo con '-X importtime', igual que un
+worker recién iniciado, y reporta:
+  - tiempo total de importación y los módulos más costosos,
+  - RSS máximo del proceso,
+  - dependencias pesadas que deberían cargarse solo al finalizar el examen
+    (openai, fpdf, pandas, numpy) pero aparecieron al arrancar.
+
+Uso:
+    python -m utils.import_profile
+    python -m utils.import_profile --budget-ms 1500 --budget-rss-mb 200 --json
+
+Sale con código 1 si se excede algún presupuesto o se detecta una dependencia diferida.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Dependencias que solo se necesitan al finalizar el examen
+DEFERRED_MODULES = ("openai", "fpdf", "pandas", "numpy")
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# El proceso hijo importa la app y reporta su RSS máximo (KB en Linux, bytes en macOS)
+_CHILD_CODE = (
+    "import resource, sys, time\n"
+    "t0 = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "if sys.platform == 'darwin': rss //= 1024\n"
+    "print(f'__PROFILE__ {elapsed:.6f} {rss}')\n"
+)
+
+
+def profile_cold_start(app_dir="."):
+    """
+    Ejecuta la importación en frío y devuelve un dict con los resultados.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD_CODE],
+        cwd=app_dir,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing app failed:\n{proc.stderr[-2000:]}")
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": (len(indent) - 1) // 2,
+            })
+
+    elapsed_s, rss_kb = None, None
+    for line in proc.stdout.splitlines():
+        if line.startswith("__PROFILE__"):
+            _, elapsed, rss = line.split()
+            elapsed_s, rss_kb = float(elapsed), int(rss)
+
+    loaded = {m["module"].split(".")[0] for m in modules}
+    return {
+        "import_app_ms": round(elapsed_s * 1000, 1) if elapsed_s is not None else None,
+        "max_rss_mb": round(rss_kb / 1024, 1) if rss_kb is not None else None,
+        "deferred_loaded": sorted(loaded.intersection(DEFERRED_MODULES)),
+        # Importaciones hechas directamente por app.py y sus módulos de primer nivel
+        "top_modules": sorted(
+            (m for m in modules if m["depth"] <= 1), key=lambda m: m["cumulative_ms"], reverse=True
+        )[:15],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import profile for app.py")
+    parser.add_argument("--budget-ms", type=float, default=None, help="max import time of app.py")
+    parser.add_argument("--budget-rss-mb", type=float, default=None, help="max RSS after import")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    report = profile_cold_start()
+    failures = []
+    if report["deferred_loaded"]:
+        failures.append(f"deferred modules imported at startup: {', '.join(report['deferred_loaded'])}")
+    if args.budget_ms is not None and report["import_app_ms"] > args.budget_ms:
+        failures.append(f"import time {report['import_app_ms']} ms > budget {args.budget_ms} ms")
+    if args.budget_rss_mb is not None and report["max_rss_mb"] > args.budget_rss_mb:
+        failures.append(f"RSS {report['max_rss_mb']} MB > budget {args.budget_rss_mb} MB")
+    report["failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import app: {report['import_app_ms']} ms, max RSS: {report['max_rss_mb']} MB")
+        print("Slowest imports up to one level below app (cumulative ms):")
+        for m in report["top_modules"]:
+            print(f"  {m['cumulative_ms']:9.1f}  {m['module']}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# utils/item_versions.py
+import hashlib
+import json
+from typing import Dict, Any
+
+
+def _digest(payload: str) -> str:
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def item_id(q: Dict[str, Any]) -> str:
+    """
+    Identificador estable de la pregunta.
+
+    Se deriva del enunciado y del conjunto de opciones (sin importar el orden),
+    para distinguir los enunciados repetidos del banco que tienen opciones distintas.
+    No depende de 'respuesta_correcta', así que corregir la clave no cambia el id.
+    """
+    if q.get("id"):
+        return str(q["id"])
+    opciones = sorted(str(o) for o in q.get("opciones", []))
+    return _digest(q.get("enunciado", "") + "\x1f" + "\x1f".join(opciones))
+
+
+def item_version(q: Dict[str, Any]) -> str:
+    """
+    Hash del contenido que afecta la calificación (enunciado, opciones y clave).
+    Cambia cuando se corrige 'respuesta_correcta'.
+    """
+    content = {
+        "enunciado": q.get("enunciado", ""),
+        "opciones": sorted(str(o) for o in q.get("opciones", [])),
+        "respuesta_correcta": sorted(str(r) for r in q.get("respuesta_correcta", [])),
+    }
+    return _digest(json.dumps(content, ensure_ascii=False, sort_keys=True))
+
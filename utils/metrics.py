@@ -0,0 +1,268 @@
+# utils/metrics.py
+"""
+Métricas del proceso en formato Prometheus.
+
+- Histogramas de duración por tipo de examen: cada rerun de main() (por pantalla)
+  y las funciones caras (display_question, calculate_score,
+  get_openai_explanation, generate_pdf), marcadas con @timed, y el tiempo hasta
+  la primera explicación en la página de resultados.
+- Contadores: exámenes finalizados, excepciones por función, logins con el
+  mismo email y código ya abiertos en otra sesión, preguntas elegidas por el
+  modo adaptativo, recargas de datos y sesiones cuyo estado se soltó (y bytes
+  liberados).
+- Gauges: sesiones activas y exámenes en curso por tipo, calculados al leer
+  /metrics a partir del último rerun de cada sesión.
+
+Todo vive en memoria del proceso. Un hilo "sidecar" (http.server) sirve
+GET /metrics en 127.0.0.1:<metrics_port> de data/config.json. El config que se
+distribuye no trae esa clave, así que por defecto no se abre ningún puerto; cada
+proceso de la app en la misma máquina necesita un puerto distinto (si está
+ocupado, se avisa y ese proceso no sirve métricas). Registrar una observación cuesta unos pocos
+microsegundos (ver --bench), frente a decenas de milisegundos por rerun.
+
+Uso:
+    python -m utils.metrics --bench
+"""
+import argparse
+import functools
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, Optional
+
+# Límites (segundos) de los buckets de los histogramas
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Una sesión sin reruns en este tiempo deja de contar como activa
+ACTIVE_SESSION_SECONDS = 300
+
+_HELP = {
+    "exam_rerun_seconds": ("histogram", "Duration of one Streamlit script run, by screen and exam type."),
+    "exam_function_seconds": ("histogram", "Duration of instrumented hot-path functions, by exam type."),
+    "exam_function_errors_total": ("counter", "Exceptions raised by instrumented functions."),
+    "exam_explanation_first_seconds": ("histogram", "Time until the first explanation is on the results page."),
+    "exam_explanation_lookups_total": ("counter", "Retrieval lookups for missed questions without an explanation, by result."),
+    "exam_concurrent_logins_total": ("counter", "Logins whose email and access code were already open in another session, by action."),
+    "exam_adaptive_items_total": ("counter", "Questions chosen by the adaptive (CAT) selector, by classification."),
+    "exam_data_reloads_total": ("counter", "Background reloads of config and question banks, by result."),
+    "exam_sessions_reaped_total": ("counter", "Sessions whose exam state was released, by reason."),
+    "exam_session_reclaimed_bytes_total": ("counter", "Estimated bytes of session state released, by reason."),
+    "exam_finalized_total": ("counter", "Exams finalized, by exam type and status."),
+    "exam_active_sessions": ("gauge", "Sessions with a script run in the last five minutes."),
+    "exam_in_progress": ("gauge", "Active sessions currently taking an exam, by exam type."),
+}
+
+_lock = threading.Lock()
+# {(métrica, etiquetas ordenadas): [conteos por bucket..., +Inf, suma]}
+_histograms: Dict[Tuple[str, Tuple], list] = {}
+_counters: Dict[Tuple[str, Tuple], float] = {}
+# {session_id: (último rerun, exam_type o None si no está en examen)}
+_sessions: Dict[str, Tuple[float, Optional[str]]] = {}
+
+_server = None
+_current = threading.local()
+
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Añade una observación (en segundos) al histograma 'name' con esas etiquetas.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    slot = bisect_left(BUCKETS, seconds)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        hist[slot] += 1
+        hist[-1] += seconds
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_exam_type(exam_type: Optional[str]):
+    """
+    Tipo de examen del rerun en curso. Streamlit ejecuta cada sesión en su propio
+    hilo, así que @timed lo lee de un threading.local sin tocar session_state.
+    """
+    _current.exam_type = exam_type or "none"
+
+
+def current_exam_type() -> str:
+    return getattr(_current, "exam_type", "none")
+
+
+def timed(function: str):
+    """
+    Decorador: mide la función en exam_function_seconds{function, exam_type}.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                inc("exam_function_errors_total", function=function)
+                raise
+            finally:
+                observe("exam_function_seconds", time.perf_counter() - start,
+                        function=function, exam_type=current_exam_type())
+        return wrapper
+    return decorator
+
+
+def record_session(session_id: str, exam_type: Optional[str]):
+    """
+    Marca un rerun de la sesión; exam_type solo si está respondiendo un examen.
+    """
+    with _lock:
+        _sessions[session_id] = (time.time(), exam_type)
+
+
+def _session_gauges():
+    cutoff = time.time() - ACTIVE_SESSION_SECONDS
+    active = 0
+    in_progress: Dict[str, int] = {}
+    with _lock:
+        for session_id, (last_seen, exam_type) in list(_sessions.items()):
+            if last_seen < cutoff:
+                del _sessions[session_id]
+                continue
+            active += 1
+            if exam_type:
+                in_progress[exam_type] = in_progress.get(exam_type, 0) + 1
+    return active, in_progress
+
+
+def _format_labels(labels, extra=()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    """
+    Todas las métricas en formato de texto de Prometheus (0.0.4).
+    """
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    active, in_progress = _session_gauges()
+
+    lines = []
+    written = set()
+
+    def header(name):
+        if name not in written:
+            kind, text = _HELP[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            written.add(name)
+
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), hist):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist[-1]:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+    header("exam_active_sessions")
+    lines.append(f"exam_active_sessions {active}")
+    header("exam_in_progress")
+    for exam_type, count in sorted(in_progress.items()):
+        lines.append(f'exam_in_progress{{exam_type="{exam_type}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # sin una línea por scrape en la consola de Streamlit
+
+
+def start_server(port: Optional[int], host: str = "127.0.0.1"):
+    """
+    Arranca (una vez por proceso) el hilo que sirve /metrics. Sin puerto no hace nada.
+    """
+    global _server
+    if not port or _server is not None:
+        return _server
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+        except OSError as e:
+            print(f"No se pudo abrir el endpoint de métricas en {host}:{port}: {e}")
+            _server = False  # no reintentar en cada rerun
+            return _server
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-sidecar", daemon=True).start()
+        _server = server
+    return _server
+
+
+def run_benchmark(n: int = 100000):
+    """
+    Coste por llamada de una función @timed vacía frente a la misma sin instrumentar.
+    """
+    def plain():
+        return None
+
+    instrumented = timed("benchmark")(plain)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        plain()
+    base = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        instrumented()
+    total = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        observe("exam_rerun_seconds", 0.02, screen="benchmark", exam_type="none")
+    observe_only = time.perf_counter() - t0
+    with _lock:
+        for key in [k for k in _histograms if ("function", "benchmark") in k[1] or ("screen", "benchmark") in k[1]]:
+            del _histograms[key]
+    return {
+        "timed_call_us": round((total - base) / n * 1e6, 2),
+        "observe_us": round(observe_only / n * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process metrics (Prometheus format).")
+    parser.add_argument("--bench", action="store_true", help="measure instrumentation overhead")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    r = run_benchmark()
+    print(f"@timed overhead {r['timed_call_us']:.2f} us/call, observe {r['observe_us']:.2f} us/call")
+    print(f"per rerun (1 rerun + 5 functions): {6 * r['timed_call_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# utils/near_duplicates.py
+"""
+Índice de casi-duplicados del banco (MinHash + LSH).
+
+Cada pregunta se resume en una firma MinHash sobre trigramas de palabras de
+'enunciado' + 'opciones'. Las firmas se agrupan por bandas (LSH), de modo que
+solo se comparan las preguntas que comparten alguna banda: el costo crece
+linealmente con el tamaño del banco, sin comparar todos los pares.
+
+El resultado es una clave de grupo por pregunta ('cluster'); el muestreo del
+examen usa como máximo una pregunta por grupo.
+"""
+import re
+import zlib
+from typing import List, Dict, Any
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Jaccard estimado mínimo para considerar dos preguntas casi-duplicadas
+SIMILARITY_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _shingles(q: Dict[str, Any]) -> np.ndarray:
+    """
+    Hashes (uint32) de los trigramas de palabras del enunciado y las opciones.
+    """
+    opciones = " ".join(sorted(str(o) for o in q.get("opciones", [])))
+    tokens = _TOKEN_RE.findall(f"{q.get('enunciado', '')} {opciones}".lower())
+    if len(tokens) < 3:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2)]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+
+
+def minhash_signature(q: Dict[str, Any]) -> np.ndarray:
+    """
+    Firma MinHash (NUM_PERM valores) de una pregunta.
+    """
+    hashes = _shingles(q)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return (permuted & _MAX_HASH).min(axis=1)
+
+
+def find_clusters(questions: List[Dict[str, Any]], threshold: float = SIMILARITY_THRESHOLD) -> List[int]:
+    """
+    Devuelve, para cada pregunta, el índice del representante de su grupo
+    (la primera pregunta del grupo en el banco). Las preguntas sin casi-duplicados
+    son su propio representante.
+    """
+    n = len(questions)
+    if n == 0:
+        return []
+    signatures = np.vstack([minhash_signature(q) for q in questions])
+
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = np.arange(n)
+    for band in range(BANDS):
+        band_sig = np.ascontiguousarray(signatures[:, band * ROWS:(band + 1) * ROWS])
+        # Bucket por banda: primera pregunta con la misma porción de firma
+        _, first_idx, inverse = np.unique(band_sig, axis=0, return_index=True, return_inverse=True)
+        firsts = first_idx[inverse.ravel()]
+        candidates = rows[firsts != rows]
+        if not len(candidates):
+            continue
+        # Se compara solo contra el primer miembro del bucket (no todos los pares)
+        similarity = (signatures[firsts[candidates]] == signatures[candidates]).mean(axis=1)
+        for i in candidates[similarity >= threshold]:
+            root_a, root_b = find(int(firsts[i])), find(int(i))
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return [find(i) for i in range(n)]
+
+
+def assign_cluster_keys(questions: List[Dict[str, Any]], threshold: float = SIMILARITY_THRESHOLD) -> Dict[int, List[int]]:
+    """
+    Añade 'cluster' (id de la pregunta representante) a cada pregunta, in place.
+    Devuelve los grupos con más de un miembro: {representante: [índices]}.
+    """
+    representatives = find_clusters(questions, threshold)
+    groups: Dict[int, List[int]] = {}
+    for i, rep in enumerate(representatives):
+        questions[i]["cluster"] = questions[rep]["id"]
+        groups.setdefault(rep, []).append(i)
+    return {rep: members for rep, members in groups.items() if len(members) > 1}
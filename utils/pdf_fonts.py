@@ -0,0 +1,180 @@
+# utils/pdf_fonts.py
+"""
+Fuentes TrueType (Unicode) para los reportes PDF, con caché por proceso.
+
+fpdf, con add_font(uni=True), vuelve a leer las métricas de la fuente (o su
+.pkl) y a construir el subconjunto de glifos en cada documento. Aquí ambas
+cosas se guardan una sola vez por proceso:
+
+- Métricas (anchos por carácter, descriptor): lru_cache por (ruta, mtime, tamaño).
+- Subconjunto embebido: el programa de fuente recortado, el CIDToGIDMap y la
+  tabla de anchos /W ya comprimidos. El subconjunto crece de forma incremental:
+  empieza con Latin-1 y la puntuación habitual, y solo se reconstruye (una vez)
+  cuando un reporte usa caracteres nuevos; los siguientes reportes reutilizan
+  los mismos bytes.
+
+DejaVu Sans (normal y negrita) va en assets/fonts con su licencia
+(assets/fonts/LICENSE); la cursiva usa la normal. Si falta la normal, los
+reportes usan Arial con texto Latin-1 (los caracteres fuera de Latin-1 salen
+como '?') y se avisa una vez por proceso.
+"""
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import Dict, Any, Optional, FrozenSet
+
+from fpdf.ttfonts import TTFontFile
+
+FONT_DIR = os.path.join("assets", "fonts")
+
+REPORT_FONT_FAMILY = "DejaVu"
+REPORT_FONT_FILES = {
+    "": os.path.join(FONT_DIR, "DejaVuSans.ttf"),
+    "B": os.path.join(FONT_DIR, "DejaVuSans-Bold.ttf"),
+}
+
+# Caracteres con los que nace cada subconjunto: Latin-1 imprimible, Latin
+# Extended-A, puntuación tipográfica, símbolos y flechas frecuentes.
+BASE_CHARS: FrozenSet[int] = frozenset(
+    list(range(32, 127)) + list(range(160, 384)) + list(range(0x2010, 0x2027))
+    + [0x2030, 0x2039, 0x203A, 0x20AC, 0x2122, 0x2190, 0x2191, 0x2192, 0x2193,
+       0x2212, 0x2248, 0x2260, 0x2264, 0x2265, 0x03B1, 0x03B2, 0x0394, 0x03BC]
+)
+
+_subsets: Dict[tuple, Dict[str, Any]] = {}
+_subsets_lock = threading.Lock()
+_missing_warned = False
+
+
+class GlyphSet(set):
+    """
+    Conjunto de caracteres usados por un documento. fpdf llama a
+    font['subset'].append() por cada carácter escrito (CustomPDF.cell usa
+    update() con todo el texto); con un set no crece.
+    """
+    append = set.add
+
+
+def font_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=8)
+def font_metrics(key: tuple) -> Dict[str, Any]:
+    """
+    Métricas de la fuente, como las calcula fpdf.add_font (compartidas: no modificar).
+    """
+    path = key[0]
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    return {
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'type': 'TTF',
+        'desc': {
+            'Ascent': int(round(ttf.ascent, 0)),
+            'Descent': int(round(ttf.descent, 0)),
+            'CapHeight': int(round(ttf.capHeight, 0)),
+            'Flags': ttf.flags,
+            'FontBBox': "[%s %s %s %s]" % tuple(int(round(v, 0)) for v in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV, 0)),
+            'MissingWidth': int(round(ttf.defaultWidth, 0)),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'ttffile': path,
+        'cw': ttf.charWidths,
+    }
+
+
+@lru_cache(maxsize=8)
+def char_widths(key: tuple) -> Dict[str, int]:
+    """
+    {carácter: ancho} para medir texto (multi_cell mide carácter a carácter).
+    """
+    return {chr(code): width for code, width in enumerate(font_metrics(key)['cw'])}
+
+
+def _widths_array(cw, chars) -> str:
+    """
+    Entrada /W del CIDFont: anchos de los caracteres del subconjunto, por tramos consecutivos.
+    """
+    runs = []
+    for cid in sorted(chars):
+        if cid <= 0 or cid >= len(cw) or cw[cid] == 0:
+            continue
+        width = 0 if cw[cid] == 65535 else cw[cid]
+        if runs and runs[-1][0] + len(runs[-1][1]) == cid:
+            runs[-1][1].append(width)
+        else:
+            runs.append((cid, [width]))
+    return '/W [' + ''.join(' %d [ %s ]' % (start, ' '.join(map(str, ws))) for start, ws in runs) + ']'
+
+
+def _build_subset(key: tuple, chars: FrozenSet[int]) -> Dict[str, Any]:
+    ttf = TTFontFile()
+    program = ttf.makeSubset(key[0], sorted(chars))
+    cidtogid = bytearray(256 * 256 * 2)
+    for code, glyph in ttf.codeToGlyph.items():
+        if code < 65536:
+            cidtogid[code * 2] = glyph >> 8
+            cidtogid[code * 2 + 1] = glyph & 0xFF
+    return {
+        'chars': chars,
+        'font_file': zlib.compress(program),
+        'length1': len(program),
+        'cidtogidmap': zlib.compress(bytes(cidtogid)),
+        'widths': _widths_array(font_metrics(key)['cw'], chars),
+    }
+
+
+def font_subset(key: tuple, used) -> Dict[str, Any]:
+    """
+    Subconjunto embebible que contiene al menos los caracteres 'used'.
+    Reutiliza el del proceso si ya los cubre; si no, lo amplía y lo reconstruye.
+    """
+    entry = _subsets.get(key)
+    if entry is not None and entry['chars'].issuperset(used):
+        return entry
+    with _subsets_lock:
+        entry = _subsets.get(key)
+        if entry is None or not entry['chars'].issuperset(used):
+            chars = BASE_CHARS | frozenset(c for c in used if c > 0)
+            if entry is not None:
+                chars |= entry['chars']
+            entry = _build_subset(key, frozenset(chars))
+            _subsets[key] = entry
+    return entry
+
+
+def available_report_fonts() -> Optional[Dict[str, tuple]]:
+    """
+    {estilo: clave de fuente} para la familia de los reportes, o None si falta
+    la fuente normal. Los estilos sin archivo usan la normal.
+    """
+    global _missing_warned
+    regular = REPORT_FONT_FILES.get("")
+    if not regular or not os.path.exists(regular):
+        if regular and not _missing_warned:
+            _missing_warned = True
+            print(f"Fuente de reportes no encontrada ({regular}): los PDF usan Arial "
+                  "y los caracteres fuera de Latin-1 salen como '?'.")
+        return None
+    keys = {}
+    for style in ("", "B", "I"):
+        path = REPORT_FONT_FILES.get(style)
+        keys[style] = font_key(path if path and os.path.exists(path) else regular)
+    return keys
+
+
+def clear_cache():
+    """
+    Vacía las cachés de métricas y subconjuntos (benchmarks).
+    """
+    font_metrics.cache_clear()
+    char_widths.cache_clear()
+    with _subsets_lock:
+        _subsets.clear()
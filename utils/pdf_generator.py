@@ -2,7 +2,10 @@ import os
 import textwrap
 import streamlit as st
 from datetime import datetime
-from fpdf import FPDF
+from utils.metrics import timed
+
+# Carpeta de los PDF de resultados (la poda opcional de utils.session_reaper también la usa)
+RESULTS_DIR = "results"
 
 def to_latin1(s: str) -> str:
     """
@@ -11,37 +14,469 @@ def to_latin1(s: str) -> str:
     """
     return s.encode("latin-1", errors="replace").decode("latin-1")
 
-class CustomPDF(FPDF):
-    def __init__(self):
-        super().__init__()
-        # Para usar en footer (total de páginas)
-        self.alias_nb_pages()
-
-    def header(self):
-        """
-        Header desactivado (sello de agua comentado).
-        """
-        pass  # No se modifica
-
-    def footer(self):
-        """
-        Pie de página con número de página y fecha/hora.
-        """
-        self.set_y(-15)
-        self.set_font("Arial", 'I', 8)
-        # Número de página
-        page_text = f"Page {self.page_no()}/{''}"
-        page_text = to_latin1(page_text)
-        self.cell(0, 5, page_text, align='C')
-
-        # Debajo, fecha/hora
-        self.set_y(-10)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        timestamp = to_latin1(timestamp)
-        self.cell(0, 5, f"Generated on: ", align='C')
+
+def _utf16_escape(s: str) -> str:
+    """
+    Texto como cadena PDF UTF-16BE escapada (lo que escribe fpdf con fuentes TTF).
+    """
+    s = s.encode("utf-16-be").decode("latin-1")
+    return s.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').replace('\r', '\\r')
+
+
+_custom_pdf_class = None
+
+# CMap ToUnicode identidad (igual al que escribe fpdf para fuentes TTF)
+_TO_UNICODE_CMAP = (
+    "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+    "/CIDSystemInfo\n<</Registry (Adobe)\n/Ordering (UCS)\n/Supplement 0\n>> def\n"
+    "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+    "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+    "1 beginbfrange\n<0000> <FFFF> <0000>\nendbfrange\n"
+    "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend"
+)
+
+
+def _get_custom_pdf_class():
+    """
+    Define CustomPDF la primera vez que se genera un reporte:
+    fpdf solo se importa al finalizar un examen, no al arrancar la app.
+    """
+    global _custom_pdf_class
+    if _custom_pdf_class is not None:
+        return _custom_pdf_class
+
+    from fpdf import FPDF
+    from utils import pdf_fonts
+
+    class CustomPDF(FPDF):
+        def __init__(self):
+            super().__init__()
+            # Para usar en footer (total de páginas)
+            self.alias_nb_pages()
+            # Fuente TrueType Unicode si está instalada en assets/fonts; si no, Arial (Latin-1)
+            self.report_font = "Arial"
+            self.unicode_text = False
+            fonts = pdf_fonts.available_report_fonts()
+            if fonts:
+                for style, key in fonts.items():
+                    self._add_cached_font(pdf_fonts.REPORT_FONT_FAMILY, style, key)
+                self.report_font = pdf_fonts.REPORT_FONT_FAMILY
+                self.unicode_text = True
+
+        def report_text(self, s: str) -> str:
+            """
+            Texto listo para la fuente del reporte (Latin-1 solo con fuentes core).
+            """
+            return s if self.unicode_text else to_latin1(s)
+
+        def _add_cached_font(self, family, style, key):
+            """
+            Como add_font(uni=True), pero con las métricas de la caché del proceso.
+            """
+            metrics = pdf_fonts.font_metrics(key)
+            fontkey = family.lower() + style
+            self.fonts[fontkey] = {
+                'i': len(self.fonts) + 1, 'type': 'TTF',
+                'name': metrics['name'], 'desc': metrics['desc'],
+                'up': metrics['up'], 'ut': metrics['ut'],
+                'ttffile': metrics['ttffile'], 'fontkey': fontkey,
+                'subset': pdf_fonts.GlyphSet(), 'unifilename': None,
+                'cache_key': key,
+                # {carácter: ancho}: get_string_width y multi_cell no usan la lista por código
+                'cw': pdf_fonts.char_widths(key),
+            }
+
+        def get_string_width(self, s):
+            if not (self.unifontsubset and 'cache_key' in self.current_font):
+                return super().get_string_width(s)
+            font = self.current_font
+            missing = font['desc']['MissingWidth'] or 500
+            w = sum(font['cw'].get(c, missing) for c in s)
+            return w * self.font_size / 1000.0
+
+        def multi_cell(self, w, h, txt='', border=0, align='J', fill=0, split_only=False):
+            """
+            Con fuentes Unicode, fpdf llama a get_string_width por cada carácter para
+            partir las líneas. Como 'cw' ya es un dict por carácter, se mide por la rama
+            de las fuentes core; cell() vuelve a escribir el texto como Unicode.
+            """
+            if not (self.unifontsubset and 'cache_key' in self.current_font):
+                return super().multi_cell(w, h, txt, border, align, fill, split_only)
+            self.unifontsubset = False
+            self._measuring_unicode = True
+            try:
+                return super().multi_cell(w, h, txt, border, align, fill, split_only)
+            finally:
+                self._measuring_unicode = False
+                self.unifontsubset = True
+
+        def cell(self, w, h=0, txt='', border=0, ln=0, align='', fill=0, link=''):
+            if getattr(self, '_measuring_unicode', False):
+                self.unifontsubset = True
+                try:
+                    return self._unicode_cell(w, h, txt, border, ln, align, fill, link)
+                finally:
+                    self.unifontsubset = False
+            if self.unifontsubset and 'cache_key' in self.current_font:
+                return self._unicode_cell(w, h, txt, border, ln, align, fill, link)
+            return super().cell(w, h, txt, border, ln, align, fill, link)
+
+        def _unicode_cell(self, w, h, txt, border, ln, align, fill, link):
+            """
+            cell() con fuente TTF de la caché. fpdf convierte a UTF-16 palabra a
+            palabra y añade cada carácter al subconjunto con una llamada por
+            carácter; aquí el texto se convierte de una vez y el subconjunto se
+            actualiza con update(). Borde, relleno y salto de página siguen en
+            fpdf (cell sin texto); el texto se escribe igual que en fpdf.
+            """
+            if not txt or self.underline or link:
+                return super().cell(w, h, txt, border, ln, align, fill, link)
+            if w == 0:
+                w = self.w - self.r_margin - self.x
+            super().cell(w, h, '', border, 0, '', fill)
+            x = self.x - w
+            k = self.k
+            if align == 'R':
+                dx = w - self.c_margin - self.get_string_width(txt)
+            elif align == 'C':
+                dx = (w - self.get_string_width(txt)) / 2.0
+            else:
+                dx = self.c_margin
+            self.current_font['subset'].update(map(ord, txt))
+            x_pt = (x + dx) * k
+            y_pt = (self.h - (self.y + .5 * h + .3 * self.font_size)) * k
+            text = _utf16_escape(txt)
+            if self.ws:
+                # Con texto multibyte Tw no tiene efecto: se ajusta antes de cada espacio
+                sep = ') %d(\x00 ) (' % (-(self.ws * k) * 1000 / self.font_size_pt)
+                if text.count('\x00 ') == txt.count(' '):
+                    words = text.replace('\x00 ', sep)
+                else:
+                    # Un par de bytes 00 20 que no es un espacio: palabra a palabra
+                    words = sep.join(_utf16_escape(word) for word in txt.split(' '))
+                s = 'BT 0 Tw %.2F %.2F Td [(%s) ] TJ ET' % (x_pt, y_pt, words)
+            else:
+                s = 'BT %.2f %.2f Td (%s) Tj ET' % (x_pt, y_pt, text)
+            if self.color_flag:
+                s = 'q ' + self.text_color + ' ' + s + ' Q'
+            self._out(s)
+            if ln > 0:
+                self.y += h
+                self.x = self.l_margin if ln == 1 else x
+
+        def _putfonts(self):
+            fonts = self.fonts
+            self.fonts = {k: f for k, f in fonts.items() if 'cache_key' not in f}
+            try:
+                super()._putfonts()
+            finally:
+                self.fonts = fonts
+            # Un objeto de fuente por archivo, aunque lo usen varios estilos
+            by_key = {}
+            for font in fonts.values():
+                if 'cache_key' in font:
+                    by_key.setdefault(font['cache_key'], []).append(font)
+            for key, group in by_key.items():
+                used = set().union(*(f['subset'] for f in group))
+                n = self._put_cached_ttf(group[0], pdf_fonts.font_subset(key, used))
+                for font in group:
+                    font['n'] = n
+
+        def _put_cached_ttf(self, font, subset):
+            """
+            Escribe una fuente Type0/CIDFontType2 con el subconjunto ya construido.
+            Mismos objetos que fpdf._putfonts para 'TTF'. Devuelve el número del objeto Type0.
+            """
+            fontname = 'MPDFAA+' + font['name']
+            self._newobj()
+            type0 = self.n
+            self._out('<</Type /Font')
+            self._out('/Subtype /Type0')
+            self._out('/BaseFont /' + fontname)
+            self._out('/Encoding /Identity-H')
+            self._out('/DescendantFonts [' + str(self.n + 1) + ' 0 R]')
+            self._out('/ToUnicode ' + str(self.n + 2) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Type /Font')
+            self._out('/Subtype /CIDFontType2')
+            self._out('/BaseFont /' + fontname)
+            self._out('/CIDSystemInfo ' + str(self.n + 2) + ' 0 R')
+            self._out('/FontDescriptor ' + str(self.n + 3) + ' 0 R')
+            if font['desc'].get('MissingWidth'):
+                self._out('/DW %d' % font['desc']['MissingWidth'])
+            self._out(subset['widths'])
+            self._out('/CIDToGIDMap ' + str(self.n + 4) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Length ' + str(len(_TO_UNICODE_CMAP)) + '>>')
+            self._putstream(_TO_UNICODE_CMAP)
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Registry (Adobe)')
+            self._out('/Ordering (UCS)')
+            self._out('/Supplement 0')
+            self._out('>>')
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Type /FontDescriptor')
+            self._out('/FontName /' + fontname)
+            for kd in ('Ascent', 'Descent', 'CapHeight', 'Flags', 'FontBBox', 'ItalicAngle', 'StemV', 'MissingWidth'):
+                v = font['desc'][kd]
+                if kd == 'Flags':
+                    v = (v | 4) & ~32
+                self._out(' /%s %s' % (kd, v))
+            self._out('/FontFile2 ' + str(self.n + 2) + ' 0 R')
+            self._out('>>')
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Length ' + str(len(subset['cidtogidmap'])))
+            self._out('/Filter /FlateDecode')
+            self._out('>>')
+            self._putstream(subset['cidtogidmap'])
+            self._out('endobj')
+
+            self._newobj()
+            self._out('<</Length ' + str(len(subset['font_file'])))
+            self._out('/Filter /FlateDecode')
+            self._out('/Length1 ' + str(subset['length1']))
+            self._out('>>')
+            self._putstream(subset['font_file'])
+            self._out('endobj')
+            return type0
+
+        def header(self):
+            """
+            Header desactivado (sello de agua comentado).
+            """
+            pass  # No se modifica
+
+        def footer(self):
+            """
+            Pie de página con número de página y fecha/hora.
+            """
+            self.set_y(-15)
+            self.set_font(self.report_font, 'I', 8)
+            # Número de página
+            page_text = f"Page {self.page_no()}/{''}"
+            page_text = self.report_text(page_text)
+            self.cell(0, 5, page_text, align='C')
+
+            # Debajo, fecha/hora
+            self.set_y(-10)
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            timestamp = self.report_text(timestamp)
+            self.cell(0, 5, f"Generated on: ", align='C')
+
+    _custom_pdf_class = CustomPDF
+    return CustomPDF
+
+
+# Imágenes ya analizadas, compartidas por todos los reportes del proceso:
+# {(ruta, mtime_ns, tamaño): info de fpdf}. Analizar el logo PNG con canal alfa
+# (separar color y transparencia fila a fila) es lo más caro de cada reporte.
+_image_cache = {}
+
+_streaming_pdf_class = None
+
+
+def _get_streaming_pdf_class():
+    """
+    Define StreamingPDF (sobre CustomPDF) la primera vez que se usa.
+
+    StreamingPDF escribe cada página terminada directamente en el archivo de
+    salida y libera su contenido, en lugar de acumular el documento entero en
+    memoria hasta output(). El archivo se escribe como '<ruta>.tmp' y se mueve a
+    su nombre final al cerrar, así que nunca queda un PDF a medias visible.
+
+    Limitaciones: no admite enlaces ni el alias de total de páginas ({nb}),
+    porque una página se escribe antes de conocer el resto del documento.
+    """
+    global _streaming_pdf_class
+    if _streaming_pdf_class is not None:
+        return _streaming_pdf_class
+
+    import zlib
+    CustomPDF = _get_custom_pdf_class()
+
+    class StreamingPDF(CustomPDF):
+        def __init__(self, path):
+            super().__init__()
+            self.path = path
+            self._file = None
+            self._written = 0
+            self._page_chunks = []
+            self._page_objects = []
+            # Transparencias (logo PNG con alfa) desde el principio: la cabecera
+            # se escribe antes de analizar las imágenes
+            self.pdf_version = '1.4'
+
+        def alias_nb_pages(self, alias='{nb}'):
+            """
+            Sin alias de total de páginas: el total no se conoce al escribir cada página.
+            """
+            pass
+
+        def link(self, x, y, w, h, link):
+            self.error('links are not supported by StreamingPDF')
+
+        def open(self):
+            self._file = open(self.path + '.tmp', 'wb')
+            self.state = 1
+            self._out('%PDF-' + self.pdf_version)
+
+        def _out(self, s):
+            if isinstance(s, bytes):
+                data = s
+            else:
+                data = str(s).encode('latin1')
+            if self.state == 2:
+                self._page_chunks.append(data)
+                self._page_chunks.append(b'\n')
+            else:
+                self._file.write(data)
+                self._file.write(b'\n')
+                self._written += len(data) + 1
+
+        def _newobj(self):
+            self.n += 1
+            self.offsets[self.n] = self._written
+            self._out(str(self.n) + ' 0 obj')
+
+        def _beginpage(self, orientation):
+            super()._beginpage(orientation)
+            self._page_chunks = []
+
+        def _endpage(self):
+            """
+            Escribe la página terminada (objeto página + contenido) y la libera.
+            """
+            if self.state != 2:
+                return
+            self.state = 1
+            content = b''.join(self._page_chunks)
+            self._page_chunks = []
+            self.pages[self.page] = ''
+            if self.compress:
+                content = zlib.compress(content)
+
+            self._newobj()
+            self._page_objects.append(self.n)
+            self._out('<</Type /Page')
+            self._out('/Parent 1 0 R')
+            if self.page in self.orientation_changes:
+                self._out('/MediaBox [0 0 %.2f %.2f]' % (self.fh_pt, self.fw_pt))
+            self._out('/Resources 2 0 R')
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+            self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+            self._out('endobj')
+            self._newobj()
+            self._out('<<' + ('/Filter /FlateDecode ' if self.compress else '') +
+                      '/Length ' + str(len(content)) + '>>')
+            self._putstream(content)
+            self._out('endobj')
+
+        def _putresources(self):
+            self._putfonts()
+            self._putimages()
+            self.offsets[2] = self._written
+            self._out('2 0 obj')
+            self._out('<<')
+            self._putresourcedict()
+            self._out('>>')
+            self._out('endobj')
+
+        def _enddoc(self):
+            # Raíz de páginas (objeto 1, reservado desde el inicio)
+            if self.def_orientation == 'P':
+                w_pt, h_pt = self.fw_pt, self.fh_pt
+            else:
+                w_pt, h_pt = self.fh_pt, self.fw_pt
+            self.offsets[1] = self._written
+            self._out('1 0 obj')
+            self._out('<</Type /Pages')
+            self._out('/Kids [' + ''.join(f'{n} 0 R ' for n in self._page_objects) + ']')
+            self._out('/Count ' + str(len(self._page_objects)))
+            self._out('/MediaBox [0 0 %.2f %.2f]' % (w_pt, h_pt))
+            self._out('>>')
+            self._out('endobj')
+
+            self._putresources()
+            self._newobj()
+            self._out('<<')
+            self._putinfo()
+            self._out('>>')
+            self._out('endobj')
+            self._newobj()
+            self._out('<<')
+            self._putcatalog()
+            self._out('>>')
+            self._out('endobj')
+
+            xref = self._written
+            self._out('xref')
+            self._out('0 ' + str(self.n + 1))
+            self._out('0000000000 65535 f ')
+            for i in range(1, self.n + 1):
+                self._out('%010d 00000 n ' % self.offsets[i])
+            self._out('trailer')
+            self._out('<<')
+            self._puttrailer()
+            self._out('>>')
+            self._out('startxref')
+            self._out(xref)
+            self._out('%%EOF')
+            self.state = 3
+
+        def _cached_image(self, name, parse):
+            stat = os.stat(name)
+            key = (os.path.abspath(name), stat.st_mtime_ns, stat.st_size)
+            info = _image_cache.get(key)
+            if info is None:
+                info = parse(name)
+                _image_cache[key] = info
+            # _putimages borra 'data' / 'smask' del dict: cada documento usa una copia
+            return dict(info)
+
+        def _parsepng(self, name):
+            return self._cached_image(name, super()._parsepng)
+
+        def _parsejpg(self, filename):
+            return self._cached_image(filename, super()._parsejpg)
+
+        def output(self):
+            """
+            Cierra el documento y mueve el archivo a su ruta final. Devuelve la ruta.
+            """
+            if self.state < 3:
+                self.close()
+            self._file.close()
+            os.replace(self.path + '.tmp', self.path)
+            return self.path
+
+        def discard(self):
+            """
+            Abandona un documento a medias (borra el archivo temporal).
+            """
+            if self._file is not None:
+                self._file.close()
+                if os.path.exists(self.path + '.tmp'):
+                    os.remove(self.path + '.tmp')
+            self.state = 3
+
+    _streaming_pdf_class = StreamingPDF
+    return StreamingPDF
+
 
 # --- Función Auxiliar (Modificada) ---
-def _draw_classification_row(pdf: FPDF, classification: str, value1: str, value2: str = None, value3: str = None):
+def _draw_classification_row(pdf, classification: str, value1: str, value2: str = None, value3: str = None):
     """Dibuja una fila en la tabla (ahora más flexible)."""
     line_height = 6
 
@@ -65,7 +500,7 @@ def _draw_classification_row(pdf: FPDF, classification: str, value1: str, value2
             border_mode = "LRB"
         else:
             border_mode = "LR"
-        pdf.cell(65, line_height, txt, border=border_mode, ln=1 if i < num_lines -1 else 0, align='L') # Reduje un poco
+        pdf.cell(65, line_height, pdf.report_text(txt), border=border_mode, ln=1 if i < num_lines -1 else 0, align='L') # Reduje un poco
         if i < num_lines -1:
           pdf.set_x(x_start)
 
@@ -94,19 +529,51 @@ def get_feedback(percent: float) -> str:
         return "Requires Further Study"
     return "Unknown"  # En caso de un valor inesperado
 
-def generate_pdf(user_data, score, status, photo_path=None):
+
+def _report_path(user_data, output_path=None):
+    if output_path:
+        return output_path
+    if not os.path.exists(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    file_name = f"{user_data.get('email', 'unknown')}_result.pdf"
+    return os.path.join(RESULTS_DIR, file_name)
+
+
+@timed("generate_pdf")
+def generate_pdf(user_data, score, status, photo_path=None,
+                 classification_stats=None, explanations=None, output_path=None):
     """
     Genera el PDF con dos tablas.  Ahora incluye el logo SOLO en la primera página.
+    Si no se pasan 'classification_stats' / 'explanations' se toman de st.session_state;
+    pasarlos permite regenerar reportes fuera de una sesión (p.ej. al re-calificar).
+    Las páginas se escriben al archivo a medida que se terminan (StreamingPDF).
+    """
+    if classification_stats is None:
+        classification_stats = st.session_state.get("classification_stats")
+    if explanations is None:
+        explanations = st.session_state.get("explanations")
+
+    pdf = _get_streaming_pdf_class()(_report_path(user_data, output_path))
+    try:
+        _build_report(pdf, user_data, score, status, photo_path, classification_stats, explanations)
+        return pdf.output()
+    except Exception:
+        pdf.discard()
+        raise
+
+
+def _build_report(pdf, user_data, score, status, photo_path, classification_stats, explanations):
     """
-    pdf = CustomPDF()
+    Dibuja el reporte completo en 'pdf' (CustomPDF o StreamingPDF).
+    """
+    font = pdf.report_font
+    text = pdf.report_text
     pdf.add_page()
 
     # --- Logo SOLO en la primera página ---
     # CAMBIO: Ruta del nuevo logo
     logo_path = os.path.join("assets", "images", "AllostericSolutions.png")
-    print(f"Intentando cargar logo desde: {logo_path}")
     if os.path.exists(logo_path):
-        print(f"¡El logo existe en {logo_path}!")
         pdf.image(logo_path, x=10, y=10, w=50)  # Ajusta x, y, w según el nuevo logo
     else:
         print(f"¡¡¡El logo NO se encontró en {logo_path}!!!")
@@ -115,14 +582,14 @@ def generate_pdf(user_data, score, status, photo_path=None):
     pdf.ln(40)  # Espacio DESPUÉS del logo (ajusta según sea necesario)
 
     # Título
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, to_latin1("RVT - ARDMS Exam Result"), ln=True, align='C')
+    pdf.set_font(font, 'B', 16)
+    pdf.cell(0, 10, text("RVT - ARDMS Exam Result"), ln=True, align='C')
     pdf.ln(10)
 
     # Datos de usuario
-    pdf.set_font("Arial", '', 12)
-    pdf.cell(0, 10, to_latin1(f"Name: {user_data.get('nombre', '')}"), ln=True)
-    pdf.cell(0, 10, to_latin1(f"Email: {user_data.get('email', '')}"), ln=True)
+    pdf.set_font(font, '', 12)
+    pdf.cell(0, 10, text(f"Name: {user_data.get('nombre', '')}"), ln=True)
+    pdf.cell(0, 10, text(f"Email: {user_data.get('email', '')}"), ln=True)
 
     # Foto
     if photo_path and os.path.exists(photo_path):
@@ -132,23 +599,22 @@ def generate_pdf(user_data, score, status, photo_path=None):
     pdf.ln(5)
 
     # Puntuaciones
-    pdf.set_font("Arial", 'B', 14)
-    pdf.cell(0, 10, to_latin1(f"Passing Score: 555"), ln=True)
-    pdf.cell(0, 10, to_latin1(f"Your Score: {score}"), ln=True)
-    pdf.cell(0, 10, to_latin1(f"Status: {status}"), ln=True)
+    pdf.set_font(font, 'B', 14)
+    pdf.cell(0, 10, text(f"Passing Score: 555"), ln=True)
+    pdf.cell(0, 10, text(f"Your Score: {score}"), ln=True)
+    pdf.cell(0, 10, text(f"Status: {status}"), ln=True)
     pdf.ln(5)
 
     # --- Desglose por Clasificación (Dos Tablas) ---
-    classification_stats = st.session_state.get("classification_stats")
     if classification_stats:
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, to_latin1("Detailed Breakdown by Topic"), ln=True)
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(0, 10, text("Detailed Breakdown by Topic"), ln=True)
 
         # --- Tabla 1: Clasificación y Preguntas Hechas ---
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(65, 8, to_latin1("Classification"), border=1, ln=0, align='C')
-        pdf.cell(22, 8, to_latin1("Q's Asked"), border=1, ln=1, align='C')  # Encabezado abreviado
-        pdf.set_font("Arial", '', 12)
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(65, 8, text("Classification"), border=1, ln=0, align='C')
+        pdf.cell(22, 8, text("Q's Asked"), border=1, ln=1, align='C')  # Encabezado abreviado
+        pdf.set_font(font, '', 12)
 
         total_questions_asked = 0
         for clasif, stats in classification_stats.items():
@@ -156,8 +622,8 @@ def generate_pdf(user_data, score, status, photo_path=None):
             total_questions_asked += total
             _draw_classification_row(pdf, clasif, total)
 
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(65, 8, to_latin1("TOTAL"), border=1, ln=0, align='C')
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(65, 8, text("TOTAL"), border=1, ln=0, align='C')
         pdf.cell(22, 8, str(total_questions_asked), border=1, ln=1, align='C')
 
         # CAMBIO: Salto de página después de la primera tabla
@@ -165,12 +631,12 @@ def generate_pdf(user_data, score, status, photo_path=None):
         pdf.ln(10) # Un poco de espacio al inicio de la nueva página, si es necesario
 
         # --- Tabla 2: Respuestas Correctas, Porcentaje y Comentarios ---
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(65, 8, to_latin1("Classification"), border=1, ln=0, align='C')
-        pdf.cell(22, 8, to_latin1("Correct"), border=1, ln=0, align='C')  # Encabezado abreviado
-        pdf.cell(22, 8, to_latin1("%"), border=1, ln=0, align='C')  # Encabezado abreviado
-        pdf.cell(70, 8, to_latin1("Feedback"), border=1, ln=1, align='C') # Más espacio para feedback
-        pdf.set_font("Arial", '', 12)
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(65, 8, text("Classification"), border=1, ln=0, align='C')
+        pdf.cell(22, 8, text("Correct"), border=1, ln=0, align='C')  # Encabezado abreviado
+        pdf.cell(22, 8, text("%"), border=1, ln=0, align='C')  # Encabezado abreviado
+        pdf.cell(70, 8, text("Feedback"), border=1, ln=1, align='C') # Más espacio para feedback
+        pdf.set_font(font, '', 12)
 
         total_correct_answers = 0
         for clasif, stats in classification_stats.items():
@@ -182,8 +648,8 @@ def generate_pdf(user_data, score, status, photo_path=None):
             _draw_classification_row(pdf, clasif, correct, f"{percent:.2f}%", feedback)  # Formato a 2 decimales
 
         total_percent = (total_correct_answers / total_questions_asked) * 100 if total_questions_asked > 0 else 0.0
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(65, 8, to_latin1("TOTAL"), border=1, ln=0, align='C')
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(65, 8, text("TOTAL"), border=1, ln=0, align='C')
         pdf.cell(22, 8, str(total_correct_answers), border=1, ln=0, align='C')
         pdf.cell(22, 8, f"{total_percent:.2f}%", border=1, ln=0, align='C')
         pdf.cell(70, 8, get_feedback(total_percent), border=1, ln=1, align='C')  # Feedback para el total
@@ -192,21 +658,14 @@ def generate_pdf(user_data, score, status, photo_path=None):
     pdf.ln(5)
 
     # --- Explicaciones y Feedback ---
-    explanations = st.session_state.get("explanations")
     if explanations:
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, to_latin1("Explanations & Feedback"), ln=True)
-        pdf.set_font("Arial", '', 11)
+        pdf.set_font(font, 'B', 12)
+        pdf.cell(0, 10, text("Explanations & Feedback"), ln=True)
+        pdf.set_font(font, '', 11)
 
         for q_idx, exp_text in explanations.items():
-            #No se necesita concept_number
-            #if str(q_idx).isdigit():
-            #    concept_number = int(q_idx) + 1
-            #else:
-            #    concept_number = q_idx
-
             # Buscar "Concept to Study:" y ponerlo en negrita
-            exp_text = to_latin1(exp_text) # Convertir todo antes.
+            exp_text = text(exp_text) # Latin-1 solo si no hay fuente Unicode
             if "Concept to Study:" in exp_text:
                 parts = exp_text.split("Concept to Study:", 1)
                 before = parts[0]
@@ -214,9 +673,9 @@ def generate_pdf(user_data, score, status, photo_path=None):
 
                 pdf.multi_cell(0, 6, before) # Parte antes (si existe)
 
-                pdf.set_font("Arial", 'B', 11) # Negrita
+                pdf.set_font(font, 'B', 11) # Negrita
                 pdf.multi_cell(0, 6, "Concept to Study:")
-                pdf.set_font("Arial", '', 11) # Volver a normal
+                pdf.set_font(font, '', 11) # Volver a normal
 
                 pdf.multi_cell(0, 6, rest.lstrip()) #.lstrip() para quitar espacios
             else:
@@ -225,10 +684,115 @@ def generate_pdf(user_data, score, status, photo_path=None):
 
             pdf.ln(4)
 
-    # Guardar PDF
-    if not os.path.exists("results"):
-        os.makedirs("results")
-    file_name = f"{user_data.get('email', 'unknown')}_result.pdf"
-    path = os.path.join("results", file_name)
-    pdf.output(path)
-    return path
+
+def _bench_report(num_explanations: int):
+    """
+    Datos de un reporte de ejemplo con 'num_explanations' explicaciones del banco
+    (con una línea en español para ejercitar caracteres fuera de ASCII).
+    """
+    from openai_utils.explanations import local_explanation_text
+    from utils.question_manager import load_bank
+
+    texts = [t for t in (local_explanation_text(q) for q in load_bank("full")) if t]
+    note = "\nNota: válvula señalada — índice ≥ 0,9; ángulo ≤ 60° (señal ≈ 5 µV)."
+    explanations = {i: texts[i % len(texts)] + note for i in range(num_explanations)}
+    stats = {}
+    for q in load_bank("full")[:140]:
+        entry = stats.setdefault(q.get("clasificacion", "Other"), {"total": 0, "correct": 0})
+        entry["total"] += 1
+        entry["correct"] += len(q["clasificacion"]) % 2
+    user_data = {"nombre": "Usuario Benchmark Núñez", "email": "bench@example.com"}
+    return user_data, stats, explanations
+
+
+def run_benchmark(num_explanations: int = 140, repeat: int = 5, font_path=None):
+    """
+    Pico de memoria (tracemalloc), tiempo y reportes por segundo:
+    documento en memoria (CustomPDF + output) frente a StreamingPDF con fuentes
+    core, y StreamingPDF con fuente TrueType sin caché y con la caché del proceso.
+    """
+    import tempfile
+    import time
+    import tracemalloc
+    from utils import pdf_fonts
+
+    user_data, stats, explanations = _bench_report(num_explanations)
+    ttf_files = {"": font_path} if font_path else pdf_fonts.REPORT_FONT_FILES
+
+    def in_memory(path):
+        pdf = _get_custom_pdf_class()()
+        _build_report(pdf, user_data, 480, "Fail", None, stats, explanations)
+        pdf.output(path)
+
+    def streaming(path):
+        generate_pdf(user_data, 480, "Fail", classification_stats=stats,
+                     explanations=explanations, output_path=path)
+
+    def streaming_cold(path):
+        pdf_fonts.clear_cache()
+        streaming(path)
+
+    variants = [("in-memory", in_memory, {}), ("streaming", streaming, {})]
+    if os.path.exists(ttf_files.get("", "")):
+        variants += [("ttf cold", streaming_cold, ttf_files), ("ttf cached", streaming, ttf_files)]
+    else:
+        print(f"TrueType font not found ({ttf_files.get('')}): skipping ttf rows")
+
+    original_files = pdf_fonts.REPORT_FONT_FILES
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, build, font_files in variants:
+                pdf_fonts.REPORT_FONT_FILES = font_files
+                path = os.path.join(tmp, "report.pdf")
+                build(path)  # calentamiento: imports y cachés
+
+                tracemalloc.start()
+                build(path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                t0 = time.perf_counter()
+                for _ in range(repeat):
+                    build(path)
+                elapsed = (time.perf_counter() - t0) / repeat
+
+                results.append({
+                    "writer": label,
+                    "explanations": num_explanations,
+                    "pages": _count_pages(path),
+                    "bytes": os.path.getsize(path),
+                    "peak_kib": round(peak / 1024),
+                    "ms": round(elapsed * 1000, 1),
+                    "reports_per_s": round(1 / elapsed, 1),
+                })
+    finally:
+        pdf_fonts.REPORT_FONT_FILES = original_files
+    return results
+
+
+def _count_pages(path):
+    with open(path, 'rb') as f:
+        return f.read().count(b'/Type /Page\n')
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PDF report memory/time benchmark.")
+    parser.add_argument("--bench", action="store_true", help="compare report writers and font setups")
+    parser.add_argument("--explanations", type=int, default=140)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--font", help="TrueType file for the ttf rows (default: assets/fonts)")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    for r in run_benchmark(args.explanations, args.repeat, args.font):
+        print(f"{r['writer']:<10} {r['explanations']:>4} explanations  {r['pages']:>3} pages  "
+              f"{r['bytes']:>8} bytes  peak {r['peak_kib']:>7} KiB  {r['ms']:>7.1f} ms  "
+              f"{r['reports_per_s']:>6.1f} reports/s")
+
+
+if __name__ == "__main__":
+    main()
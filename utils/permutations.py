@@ -0,0 +1,100 @@
+# utils/permutations.py
+"""
+Orden de opciones como índice de permutación.
+
+Para n opciones (n <= MAX_PRECOMPUTED) todas las permutaciones están
+precalculadas: un orden se guarda como un entero (su rango en la tabla) y se
+recupera con una búsqueda en la tabla. perm[posición mostrada] = índice original.
+
+assign_key_positions reparte la posición de la respuesta correcta entre las
+preguntas del examen (la posición menos usada hasta el momento), de modo que
+ninguna letra concentre las respuestas correctas.
+"""
+import itertools
+import random
+from typing import List, Dict, Tuple, Optional
+
+MAX_PRECOMPUTED = 6
+
+_PERMUTATIONS: Dict[int, List[Tuple[int, ...]]] = {
+    n: list(itertools.permutations(range(n))) for n in range(1, MAX_PRECOMPUTED + 1)
+}
+_RANKS: Dict[int, Dict[Tuple[int, ...], int]] = {
+    n: {perm: rank for rank, perm in enumerate(perms)} for n, perms in _PERMUTATIONS.items()
+}
+
+
+def _factorial_code(perm: Tuple[int, ...]) -> int:
+    """
+    Rango lexicográfico (código de Lehmer) para permutaciones fuera de la tabla.
+    """
+    n = len(perm)
+    rank = 0
+    remaining = list(range(n))
+    for i, value in enumerate(perm):
+        pos = remaining.index(value)
+        rank = rank * (n - i) + pos
+        remaining.pop(pos)
+    return rank
+
+
+def _factorial_decode(rank: int, n: int) -> Tuple[int, ...]:
+    digits = []
+    for base in range(1, n + 1):
+        rank, digit = divmod(rank, base)
+        digits.append(digit)
+    remaining = list(range(n))
+    return tuple(remaining.pop(d) for d in reversed(digits))
+
+
+def perm_rank(perm) -> int:
+    """
+    Entero que identifica la permutación (orden lexicográfico).
+    """
+    perm = tuple(perm)
+    table = _RANKS.get(len(perm))
+    if table is not None:
+        return table[perm]
+    return _factorial_code(perm)
+
+
+def perm_unrank(rank: int, n: int) -> Tuple[int, ...]:
+    """
+    Permutación de n elementos con ese rango.
+    """
+    table = _PERMUTATIONS.get(n)
+    if table is not None:
+        return table[rank]
+    return _factorial_decode(rank, n)
+
+
+def assign_key_positions(option_counts: List[int], rng=random,
+                         used: Optional[Dict[int, int]] = None) -> List[int]:
+    """
+    Posición de destino de la respuesta correcta para cada pregunta.
+
+    Cada pregunta toma la posición válida (< su número de opciones) menos usada
+    hasta ahora; los empates se rompen al azar. 'used' ({posición: veces}) permite
+    continuar el reparto de un examen ya empezado (modo adaptativo) y se actualiza.
+    """
+    used = used if used is not None else {}
+    positions = []
+    for n in option_counts:
+        if n <= 0:
+            positions.append(0)
+            continue
+        fewest = min(used.get(p, 0) for p in range(n))
+        candidates = [p for p in range(n) if used.get(p, 0) == fewest]
+        position = rng.choice(candidates)
+        used[position] = used.get(position, 0) + 1
+        positions.append(position)
+    return positions
+
+
+def permutation_with_key_at(n: int, key_index: int, position: int, rng=random) -> Tuple[int, ...]:
+    """
+    Permutación aleatoria de n opciones con la opción original 'key_index' en 'position'.
+    """
+    others = [i for i in range(n) if i != key_index]
+    rng.shuffle(others)
+    return tuple(others[:position] + [key_index] + others[position:])
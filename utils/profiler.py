@@ -0,0 +1,215 @@
+# utils/profiler.py
+"""
+Perfilado bajo demanda de los reruns de Streamlit.
+
+El administrador lo activa en caliente (?admin=profiler) para:
+- sesiones concretas (por email del candidato): se guarda cada rerun, o
+- cualquier sesión cuyo rerun supere un umbral de latencia.
+
+Mientras está activo, un único hilo muestrea cada SAMPLE_INTERVAL la pila del
+hilo de cada rerun en curso (sys._current_frames). Al terminar el rerun, si
+cumple la condición, se guarda en formato "collapsed" (una pila por línea
+"marco;marco;marco N"), listo para flamegraph.pl o speedscope. La raíz de cada
+pila es la pantalla (authentication_screen, user_data_input, exam_screen,
+finalize_exam), que también va en el nombre del archivo.
+
+Desactivado, start() devuelve None tras leer un booleano: no hay hilo ni
+muestreo. Se conservan como máximo MAX_PROFILES archivos (los más recientes).
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import streamlit as st
+
+from utils.storage import DB_DIR
+
+PROFILE_DIR = os.path.join(DB_DIR, "profiles")
+MAX_PROFILES = 200
+SAMPLE_INTERVAL = 0.005
+
+_settings: Dict[str, Any] = {
+    "enabled": False,
+    "threshold_ms": 1000,
+    "emails": frozenset(),
+}
+_lock = threading.Lock()
+# {id del hilo del rerun: muestras}
+_targets: Dict[int, "RunProfile"] = {}
+_sampler: Optional[threading.Thread] = None
+
+# Marcos de la raíz de las pilas que se omiten (arranque del hilo y runner de Streamlit)
+_RUNNER_DIRS = (os.path.dirname(os.path.abspath(threading.__file__)), os.path.dirname(os.path.abspath(st.__file__)))
+
+
+class RunProfile:
+    """
+    Muestras de un rerun: Counter de pilas (tuplas de code objects).
+    """
+    def __init__(self, screen: str, email: str, session_id: str):
+        self.screen = screen
+        self.email = email
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.samples: Counter = Counter()
+
+
+def settings() -> Dict[str, Any]:
+    return dict(_settings)
+
+
+def configure(enabled: bool, threshold_ms: int = 1000, emails=()):
+    """
+    Activa o desactiva el perfilado para todo el proceso.
+    """
+    _settings.update(
+        threshold_ms=int(threshold_ms),
+        emails=frozenset(e.strip().lower() for e in emails if e.strip()),
+    )
+    _settings["enabled"] = bool(enabled)
+
+
+def start(screen: str, email: str = "", session_id: str = "") -> Optional[RunProfile]:
+    """
+    Empieza a muestrear el rerun del hilo actual. None si el perfilado está apagado.
+    """
+    if not _settings["enabled"]:
+        return None
+    run = RunProfile(screen, (email or "").lower(), session_id)
+    with _lock:
+        _targets[threading.get_ident()] = run
+        _ensure_sampler()
+    return run
+
+
+def stop(run: Optional[RunProfile]) -> Optional[str]:
+    """
+    Termina el muestreo; guarda el perfil si la sesión está seleccionada o si el
+    rerun superó el umbral. Devuelve la ruta del archivo o None.
+    """
+    if run is None:
+        return None
+    with _lock:
+        _targets.pop(threading.get_ident(), None)
+    elapsed_ms = (time.perf_counter() - run.started) * 1000
+    selected = run.email and run.email in _settings["emails"]
+    if not run.samples or not (selected or elapsed_ms >= _settings["threshold_ms"]):
+        return None
+    return _save(run, elapsed_ms)
+
+
+def _ensure_sampler():
+    global _sampler
+    if _sampler is None or not _sampler.is_alive():
+        _sampler = threading.Thread(target=_sample_loop, name="profiler-sampler", daemon=True)
+        _sampler.start()
+
+
+def _sample_loop():
+    global _sampler
+    while True:
+        with _lock:
+            if not _targets:
+                _sampler = None
+                return
+            targets = list(_targets.items())
+        frames = sys._current_frames()
+        stacks = []
+        for thread_id, run in targets:
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                stacks.append((thread_id, run, tuple(reversed(stack))))
+        del frames
+        with _lock:
+            # Un rerun ya terminado (stop) no recibe más muestras: _save las recorre sin lock
+            for thread_id, run, stack in stacks:
+                if _targets.get(thread_id) is run:
+                    run.samples[stack] += 1
+        time.sleep(SAMPLE_INTERVAL)
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename
+    if path.startswith(os.getcwd()):
+        path = os.path.relpath(path)
+    elif "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapsed(run: RunProfile) -> List[str]:
+    lines = []
+    for stack, count in run.samples.most_common():
+        # Desde el script de la app: se omite el runner de Streamlit por encima
+        start = 0
+        while start < len(stack) - 1 and stack[start].co_filename.startswith(_RUNNER_DIRS):
+            start += 1
+        frames = [run.screen] + [_frame_name(code) for code in stack[start:]]
+        lines.append(f"{';'.join(frames)} {count}")
+    return lines
+
+
+def _save(run: RunProfile, elapsed_ms: float) -> str:
+    if not os.path.exists(PROFILE_DIR):
+        os.makedirs(PROFILE_DIR)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    session = "".join(c for c in run.session_id[:8] if c.isalnum()) or "nosession"
+    name = f"{stamp}_{run.screen}_{int(elapsed_ms)}ms_{session}.folded"
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(_collapsed(run)) + "\n")
+    _prune()
+    return path
+
+
+def _prune():
+    """
+    Retención: solo los MAX_PROFILES perfiles más recientes.
+    """
+    files = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".folded"))
+    for name in files[:-MAX_PROFILES] if len(files) > MAX_PROFILES else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """
+    Perfiles guardados, del más reciente al más antiguo.
+    """
+    if not os.path.exists(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(".folded"):
+            continue
+        parts = name[:-len(".folded")].split("_")
+        if len(parts) < 4:
+            continue
+        stamp = datetime.strptime(parts[0], "%Y%m%d-%H%M%S-%f")
+        profiles.append({
+            "name": name,
+            "path": os.path.join(PROFILE_DIR, name),
+            "created": stamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "screen": "_".join(parts[1:-2]),
+            "elapsed_ms": int(parts[-2].rstrip("ms")),
+            "session": parts[-1],
+        })
+    return profiles
+
+
+def clear_profiles() -> int:
+    removed = 0
+    for p in list_profiles():
+        os.remove(p["path"])
+        removed += 1
+    return removed
@@ -1,15 +1,63 @@
-import json
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import streamlit as st
+from utils import data_versions
+from utils.bank_builder import compile_items, load_compiled_items
+from utils.exams import CLASSIFICATION_PERCENTAGES, get_banks, get_exam
+from utils.metrics import timed
+from utils.permutations import assign_key_positions, permutation_with_key_at, perm_rank, perm_unrank
+
+
+def _load_bank(path):
+    """
+    Carga un banco desde su artefacto precompilado (python -m utils.bank_builder)
+    si está al día; si no, lo compila ahora desde el JSON original (misma
+    normalización: ids estables, clasificaciones canónicas y grupos).
+    """
+    items = load_compiled_items(path)
+    if items is None:
+        return compile_items(path)
+    if any("cluster" not in q for q in items):
+        # Artefacto compilado antes de los grupos de casi-duplicados: se calculan ahora
+        from utils.near_duplicates import assign_cluster_keys
+
+        print(f"Artefacto de {path} sin grupos de casi-duplicados; se calculan al cargar. "
+              f"Ejecuta 'python -m utils.bank_builder {path}'.")
+        assign_cluster_keys(items)
+    return items
+
+
+def load_bank(bank: str) -> List[Dict[str, Any]]:
+    """
+    Preguntas del banco 'bank' (ver "banks" en config.json) en la versión de datos
+    de la sesión (utils.data_versions): cargado una vez por versión y compartido.
+    La lista es compartida: no modificar sus preguntas; usar _session_copy.
+    """
+    return data_versions.active().banks[bank]
+
+
+def load_bank_index(bank: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Preguntas del banco 'bank' por id (compartido, no modificar).
+    """
+    return data_versions.active().indexes[bank]
+
+
+def _session_copy(q: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copia de una pregunta del banco compartido para una sesión
+    (la sesión baraja 'opciones' sobre la copia).
+    """
+    question = dict(q)
+    question["opciones"] = list(q.get("opciones", []))
+    return question
 
 
 def load_questions():
     """
     Loads all questions from 'data/preguntas.json'.
     """
-    with open('data/preguntas.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_bank("full")
 
 
 def _qid(q: Dict[str, Any]) -> str:
@@ -19,6 +67,62 @@ def _qid(q: Dict[str, Any]) -> str:
     return str(q.get("id") or q.get("enunciado"))
 
 
+def _cluster(q: Dict[str, Any]) -> str:
+    """
+    Grupo de casi-duplicados de la pregunta (ver utils.near_duplicates); _load_bank
+    lo asigna siempre. Una pregunta sin grupo es su propio grupo.
+    """
+    return str(q.get("cluster") or _qid(q))
+
+
+def _sample_distinct_clusters(pool: List[Dict[str, Any]], k: int, used_clusters: set, rng=random) -> List[Dict[str, Any]]:
+    """
+    Toma hasta 'k' preguntas al azar de 'pool' sin repetir grupo de casi-duplicados.
+    Actualiza 'used_clusters' con los grupos elegidos. Un solo recorrido del pool barajado.
+    """
+    chosen = []
+    if k <= 0:
+        return chosen
+    for q in rng.sample(pool, len(pool)):
+        cluster = _cluster(q)
+        if cluster in used_clusters:
+            continue
+        used_clusters.add(cluster)
+        chosen.append(q)
+        if len(chosen) == k:
+            break
+    return chosen
+
+
+def _unseen_first(indices, seen, rng=random) -> List[int]:
+    """
+    Índices del banco barajados con los no vistos primero ('seen': máscara booleana
+    alineada con el banco, ver utils.seen_items). La separación es vectorizada.
+    """
+    import numpy as np
+
+    indices = np.asarray(indices, dtype=np.int64)
+    flags = seen[indices]
+    unseen, already_seen = indices[~flags].tolist(), indices[flags].tolist()
+    return rng.sample(unseen, len(unseen)) + rng.sample(already_seen, len(already_seen))
+
+
+def _take_distinct_clusters(ordered: List[Dict[str, Any]], k: int, used_clusters: set) -> List[Dict[str, Any]]:
+    """
+    Como _sample_distinct_clusters, pero respetando el orden dado (sin barajar).
+    """
+    chosen = []
+    for q in ordered:
+        if len(chosen) >= k:
+            break
+        cluster = _cluster(q)
+        if cluster in used_clusters:
+            continue
+        used_clusters.add(cluster)
+        chosen.append(q)
+    return chosen
+
+
 def _has_image(q: Dict[str, Any]) -> bool:
     """
     Determina si la pregunta tiene imagen (campo 'image' no vacío).
@@ -29,24 +133,30 @@ def _has_image(q: Dict[str, Any]) -> bool:
 
 def ensure_additional_images_by_distribution(
     selected_questions: List[Dict[str, Any]],
-    add_distribution: Dict[str, int]
+    add_distribution: Dict[str, int],
+    source: Optional[List[Dict[str, Any]]] = None,
+    rng=random,
+    seen=None
 ) -> List[Dict[str, Any]]:
     """
     Post-proceso: suma preguntas con imagen reemplazando preguntas SIN imagen
     dentro de la MISMA clasificación, según la distribución pedida (p.ej. 4/4/2).
-    - No duplica preguntas (usa id/enunciado para evitar repetir).
+    - No duplica preguntas (usa id/enunciado para evitar repetir) ni grupos de casi-duplicados.
     - No altera la distribución por clasificación (reemplazo en la misma clase).
     - Si en alguna clase no hay suficientes víctimas o candidatas, añade las que se pueda.
     - No redistribuye el faltante a otras clases (respeta el ratio).
+    - Con 'seen' (máscara alineada con 'source') entran primero las no vistas.
     """
     if not add_distribution:
         return selected_questions
 
-    # Fuente: banco completo (FULL). Esta utilidad se invoca desde select_random_questions (full).
-    source = load_questions()
+    # Fuente: banco del examen (por defecto el completo)
+    if source is None:
+        source = load_questions()
 
-    # Conjunto de IDs ya seleccionados
+    # Conjunto de IDs y grupos de casi-duplicados ya seleccionados
     selected_ids = {_qid(q) for q in selected_questions}
+    used_clusters = {_cluster(q) for q in selected_questions}
 
     # Víctimas (SIN imagen) por clase elegible
     victims_by_class: Dict[str, List[int]] = {}
@@ -56,19 +166,24 @@ def ensure_additional_images_by_distribution(
             victims_by_class.setdefault(c, []).append(idx)
 
     # Pool de candidatas (CON imagen) por clase elegible, evitando duplicados
-    pool_by_class: Dict[str, List[Dict[str, Any]]] = {}
-    for q in source:
+    pool_by_class: Dict[str, List[int]] = {}
+    for i, q in enumerate(source):
         c = q.get("clasificacion", "Other")
         if c in add_distribution and _has_image(q):
             qid = _qid(q)
-            if qid not in selected_ids:
-                pool_by_class.setdefault(c, []).append(q)
+            if qid not in selected_ids and _cluster(q) not in used_clusters:
+                pool_by_class.setdefault(c, []).append(i)
 
     # Aleatoriedad en víctimas y pool
     for c in victims_by_class:
-        random.shuffle(victims_by_class[c])
+        rng.shuffle(victims_by_class[c])
     for c in pool_by_class:
-        random.shuffle(pool_by_class[c])
+        if seen is None:
+            rng.shuffle(pool_by_class[c])
+        else:
+            # Se extrae con pop(): las no vistas van al final
+            pool_by_class[c] = _unseen_first(pool_by_class[c], seen, rng)[::-1]
+        pool_by_class[c] = [source[i] for i in pool_by_class[c]]
 
     # Ejecutar el plan por clase (no se redistribuye el faltante)
     for c, target in add_distribution.items():
@@ -77,113 +192,201 @@ def ensure_additional_images_by_distribution(
         victims = victims_by_class.get(c, [])
         pool = pool_by_class.get(c, [])
         while target > 0 and victims and pool:
-            v_idx = victims.pop()
             cand = pool.pop()
+            if _cluster(cand) in used_clusters:
+                continue
+            v_idx = victims.pop()
+            used_clusters.discard(_cluster(selected_questions[v_idx]))
             selected_questions[v_idx] = cand
             selected_ids.add(_qid(cand))
+            used_clusters.add(_cluster(cand))
             target -= 1
 
     return selected_questions
 
 
-def select_random_questions(total=120):
+def select_exam_questions(exam_id, rng=random, seen=None):
+    """
+    Selecciona las preguntas de un examen según su definición en config.json:
+    con blueprint se respeta la distribución por clasificación; sin él, muestreo simple.
+    Con un 'rng' propio (random.Random(seed)) la selección es reproducible.
+    'seen' (utils.seen_items.seen_mask) hace que se prefieran las preguntas no vistas.
+    """
+    exam = get_exam(exam_id)
+    if exam["blueprint"]:
+        return select_random_questions(total=exam["num_questions"], exam_id=exam_id, rng=rng, seen=seen)
+    return select_short_questions(total=exam["num_questions"], exam_id=exam_id, rng=rng, seen=seen)
+
+
+def select_random_questions(total=120, exam_id="full", rng=random, seen=None):
     """
     Selects questions randomly, based on classification percentages.
-    Aplica un post-proceso para sumar +10 preguntas con imagen (4/4/2)
+    Aplica un post-proceso para sumar preguntas con imagen ('image_boost' del examen)
     en las clases elegibles, sin alterar la distribución por clasificación.
-    (Solo afecta al examen FULL; el SHORT usa select_short_questions y no se modifica.)
-    """
-    preguntas = load_questions()
-    classification_percentages = {
-        "Normal Anatomy, Perfusion, and Function": 21,
-        "Pathology, Perfusion, and Function": 32,
-        "Surgically Altered Anatomy and Pathology": 6,
-        "Physiologic Exams": 12,
-        "Ultrasound-guided Procedures/Intraoperative Assessment": 7,
-        "Quality Assurance, Safety, and Physical Principles": 14,
-        "Preparation,Documentation, and communication": 8,
-    }
+    Devuelve copias de las preguntas (el banco es compartido entre sesiones).
+    Toda la aleatoriedad sale de 'rng' (por defecto, el módulo random).
+    Con 'seen' (máscara booleana alineada con el banco) cada clasificación toma
+    primero preguntas no vistas; sin 'seen' la selección es la de siempre.
+    """
+    exam = get_exam(exam_id)
+    preguntas = load_bank(exam["bank"])
+    classification_percentages = exam["blueprint"] or CLASSIFICATION_PERCENTAGES
     total_percentage = sum(classification_percentages.values())
     if total_percentage != 100:
         raise ValueError("The sum of classification percentages must be 100.")
 
     clasificaciones: Dict[str, List[Dict[str, Any]]] = {}
-    for pregunta in preguntas:
+    posiciones: Dict[str, List[int]] = {}
+    for i, pregunta in enumerate(preguntas):
         clasif = pregunta.get("clasificacion", "Other")
         if clasif not in clasificaciones:
             clasificaciones[clasif] = []
+            posiciones[clasif] = []
         clasificaciones[clasif].append(pregunta)
+        posiciones[clasif].append(i)
+
+    # Grupos de casi-duplicados ya usados: como máximo una pregunta por grupo
+    used_clusters = set()
 
     selected_questions: List[Dict[str, Any]] = []
     for clasif, percentage in classification_percentages.items():
         if clasif in clasificaciones:
             num_questions = int(total * (percentage / 100))
-            available_questions = clasificaciones[clasif]
-            selected_questions.extend(
-                random.sample(available_questions, min(num_questions, len(available_questions)))
-            )
+            if seen is None:
+                available_questions = clasificaciones[clasif]
+                selected_questions.extend(
+                    _sample_distinct_clusters(available_questions, num_questions, used_clusters, rng)
+                )
+            else:
+                ordered = [preguntas[i] for i in _unseen_first(posiciones[clasif], seen, rng)]
+                selected_questions.extend(_take_distinct_clusters(ordered, num_questions, used_clusters))
 
     remaining = total - len(selected_questions)
     if remaining > 0:
-        remaining_pool = [p for p in preguntas if p not in selected_questions]
-        selected_questions.extend(random.sample(remaining_pool, remaining))
-
-    # --- POST-PROCESO: sumar +10 con imagen en 3 clasificaciones (4/4/2) SOLO para FULL ---
-    add_plan_by_class = {
-        "Normal Anatomy, Perfusion, and Function": 7,
-        "Pathology, Perfusion, and Function": 7,
-        "Surgically Altered Anatomy and Pathology": 4,
-    }
-    selected_questions = ensure_additional_images_by_distribution(selected_questions, add_plan_by_class)
+        selected_ids = {_qid(q) for q in selected_questions}
+        if seen is None:
+            remaining_pool = [p for p in preguntas if _qid(p) not in selected_ids]
+            selected_questions.extend(_sample_distinct_clusters(remaining_pool, remaining, used_clusters, rng))
+        else:
+            remaining_idx = [i for i, p in enumerate(preguntas) if _qid(p) not in selected_ids]
+            ordered = [preguntas[i] for i in _unseen_first(remaining_idx, seen, rng)]
+            selected_questions.extend(_take_distinct_clusters(ordered, remaining, used_clusters))
+
+    # --- POST-PROCESO: sumar preguntas con imagen según el plan del examen ---
+    selected_questions = ensure_additional_images_by_distribution(
+        selected_questions, exam["image_boost"], source=preguntas, rng=rng, seen=seen
+    )
     # ----------------------------------------------------------------------------------------
 
-    random.shuffle(selected_questions)
-    return selected_questions
+    rng.shuffle(selected_questions)
+    return [_session_copy(q) for q in selected_questions]
 
 
-def shuffle_options(question):
+def shuffle_options(question, rng=random):
     """
     Shuffles the options of a question randomly.
     """
     opciones = question.get("opciones", []).copy()
-    random.shuffle(opciones)
+    rng.shuffle(opciones)
     return opciones
 
 
-def calculate_score():
+def apply_permutation(question, rank, base_options=None):
+    """
+    Ordena las opciones de una pregunta de sesión según el índice de permutación 'rank'
+    (ver utils.permutations) y guarda 'perm' y 'correct_positions' (posiciones mostradas
+    de las respuestas correctas), para comparar enteros al mostrar y calificar.
+    """
+    base = list(base_options if base_options is not None else question["opciones"])
+    order = perm_unrank(rank, len(base))
+    question["opciones"] = [base[i] for i in order]
+    question["perm"] = rank
+    correct = set(question.get("respuesta_correcta", []))
+    question["correct_positions"] = [pos for pos, option in enumerate(question["opciones"]) if option in correct]
+    return question
+
+
+def arrange_options(questions, rng=random, used_positions=None):
+    """
+    Baraja las opciones de preguntas de sesión (en su orden original del banco)
+    repartiendo la posición de la respuesta correcta entre todas las preguntas.
+    'used_positions' ({posición: veces}) continúa el reparto de un examen ya empezado.
+    Devuelve el índice de permutación de cada pregunta.
+    """
+    targets = assign_key_positions([len(q["opciones"]) for q in questions], rng, used_positions)
+    ranks = []
+    for q, target in zip(questions, targets):
+        opciones = q["opciones"]
+        correct = [i for i, option in enumerate(opciones) if option in q.get("respuesta_correcta", [])]
+        if correct:
+            order = permutation_with_key_at(len(opciones), correct[0], target, rng)
+        else:
+            order = tuple(rng.sample(range(len(opciones)), len(opciones)))
+        rank = perm_rank(order)
+        apply_permutation(q, rank)
+        ranks.append(rank)
+    return ranks
+
+
+def is_answer_correct(question, idx, state=None):
+    """
+    True si la respuesta de la pregunta 'idx' de la sesión es correcta.
+    Compara la posición elegida con 'correct_positions' (enteros); las preguntas
+    sin permutación (sesiones anteriores) se comparan por texto.
+    'state' es el session_state (por defecto, el de la sesión en curso).
+    """
+    state = st.session_state if state is None else state
+    position = state.get("answer_positions", {}).get(str(idx))
+    if position is not None and "correct_positions" in question:
+        return position in question["correct_positions"]
+    user_answer = state["answers"].get(str(idx))
+    return user_answer is not None and user_answer in question["respuesta_correcta"]
+
+
+@timed("calculate_score")
+def calculate_score(state=None):
     """
     Calculates the exam score and stores incorrect answers.
     Also calculates a classification-wise count of correct answers.
+    La puntuación se delega al motor vectorizado (utils.scoring) con una sola fila.
+    'state' es el session_state (por defecto, el de la sesión en curso; el reaper
+    de sesiones pasa el de una sesión inactiva).
     """
-    questions = st.session_state.selected_questions
+    # numpy / motor de puntuación solo se cargan al finalizar el examen
+    import numpy as np
+    from utils.scoring import score_attempts, classification_stats
+
+    state = st.session_state if state is None else state
+    questions = state["selected_questions"]
     total_questions = len(questions)
     if total_questions == 0:
         return 0
 
-    correct_count = 0
-    # Contadores de aciertos por clasificación
-    classification_stats: Dict[str, Dict[str, int]] = {}
-
     # Acceso más robusto al nombre del usuario
-    user_name = st.session_state.get('user_data', {}).get('nombre', 'Unknown User')
+    user_name = state.get('user_data', {}).get('nombre', 'Unknown User')
+
+    # Códigos de clasificación en orden de aparición
+    class_names: List[str] = []
+    class_index: Dict[str, int] = {}
+    class_codes = np.empty(total_questions, dtype=np.int64)
+    is_correct = np.zeros(total_questions, dtype=bool)
+
+    # Se reconstruye en cada llamada para que los reruns no dupliquen entradas
+    incorrect_answers = []
 
     for idx, question in enumerate(questions):
-        # Inicializar conteo para la clasificación de la pregunta
         clasif = question.get("clasificacion", "Other")
-        if clasif not in classification_stats:
-            classification_stats[clasif] = {"correct": 0, "total": 0}
-        classification_stats[clasif]["total"] += 1
+        if clasif not in class_index:
+            class_index[clasif] = len(class_names)
+            class_names.append(clasif)
+        class_codes[idx] = class_index[clasif]
 
-        user_answer = st.session_state.answers.get(str(idx), None)
+        user_answer = state["answers"].get(str(idx), None)
         print(f"[{user_name}] Pregunta {idx}: Respuesta del usuario: {user_answer}, Respuesta correcta: {question['respuesta_correcta']}")  # DEBUG
 
-        if user_answer is not None and user_answer in question["respuesta_correcta"]:
-            correct_count += 1
-            classification_stats[clasif]["correct"] += 1
+        if user_answer is not None and is_answer_correct(question, idx, state):
+            is_correct[idx] = True
         elif user_answer is not None:  # Solo registra si el usuario respondió
-            incorrect_info = """
-            """
-
             incorrect_info = {
                 "pregunta": {
                     "enunciado": question["enunciado"],
@@ -196,26 +399,18 @@ def calculate_score():
                 "respuesta_usuario": user_answer,
                 "indice_pregunta": idx
             }
-            st.session_state.incorrect_answers.append(incorrect_info)
-            print(f"[{user_name}] Añadida respuesta incorrecta a la lista: {incorrect_info}")  # DEBUG
+            incorrect_answers.append(incorrect_info)
+
+    result = score_attempts(is_correct[None, :], class_codes, len(class_names))
 
-    print(f"[{user_name}] Total de respuestas correctas: {correct_count}")  # DEBUG
-    print(f"[{user_name}] Lista final de respuestas incorrectas en calculate_score: {st.session_state.incorrect_answers}")  # DEBUG
+    state["incorrect_answers"] = incorrect_answers
+    print(f"[{user_name}] Total de respuestas correctas: {int(result.correct[0])}")  # DEBUG
+    print(f"[{user_name}] Respuestas incorrectas en calculate_score: {len(incorrect_answers)}")  # DEBUG
 
     # Guardar la estadística de clasificaciones
-    st.session_state.classification_stats = classification_stats
-
-    x = correct_count / total_questions
-    if x <= 0:
-        final_score = 0
-    elif x <= 0.75:
-        slope1 = 555 / 0.75
-        final_score = slope1 * x
-    else:
-        slope2 = (700 - 555) / (1 - 0.75)
-        final_score = slope2 * (x - 0.75) + 555
+    state["classification_stats"] = classification_stats(result, class_names)
 
-    return int(final_score)
+    return int(result.scaled[0])
 
 
 # ------------------------------------------
@@ -225,18 +420,97 @@ def load_short_questions():
     """
     Loads all questions from 'data/preguntas_corto.json'.
     """
-    with open('data/preguntas_corto.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_bank("short")
 
 
-def select_short_questions(total=30):
+def select_short_questions(total=30, exam_id="short", rng=random, seen=None):
     """
-    Selects 'total' questions randomly from the short exam questions file.
+    Selects 'total' questions randomly from the exam's bank (short exam by default).
     Since this is for the free/demo version, no distribution by classification is applied.
+    With 'seen' (mask aligned with the bank), unseen questions are taken first.
     """
-    questions = load_short_questions()
+    questions = load_bank(get_exam(exam_id)["bank"])
     if total > len(questions):
         total = len(questions)
-    selected_questions = random.sample(questions, total)
+    if seen is None:
+        selected_questions = rng.sample(questions, total)
+    else:
+        selected_questions = [questions[i] for i in _unseen_first(range(len(questions)), seen, rng)[:total]]
+    rng.shuffle(selected_questions)
+    return [_session_copy(q) for q in selected_questions]
+
+
+# ------------------------------------------
+# Para examen de repaso (review)
+# ------------------------------------------
+def select_review_questions(email, total=20, banks=None):
+    """
+    Selects up to 'total' questions whose review card is due for this email
+    (see utils.review_queue). Returns an empty list if nothing is due.
+    """
+    from utils.review_queue import due_items
+
+    due_ids = due_items(email, limit=total)
+    if not due_ids:
+        return []
+    selected_questions = [_session_copy(q) for q in find_questions_by_ids(due_ids, banks)]
+    random.shuffle(selected_questions)
+    return selected_questions
+
+
+def count_review_due(email, banks=None):
+    """
+    Number of due review questions for this email that are in 'banks'
+    (what select_review_questions can pick, before its 'total' cap).
+    """
+    from collections import ChainMap
+    from utils.review_queue import count_due
+
+    return count_due(email, item_ids=ChainMap(*(load_bank_index(bank) for bank in banks or get_banks())))
+
+
+# ------------------------------------------
+# Búsqueda de texto completo / modo "estudiar un concepto"
+# ------------------------------------------
+def ensure_search_index(banks=None):
+    """
+    Sincroniza el índice FTS con los bancos (no hace nada si los archivos no cambiaron).
+    Por defecto, todos los bancos de config.json.
+    """
+    from utils.search_index import is_current, sync_index
+
+    version = data_versions.active()
+    for bank in banks or version.banks:
+        source_sha1 = version.sha1[bank]
+        if not is_current(bank, source_sha1):
+            sync_index(bank, load_bank(bank), source_sha1=source_sha1)
+
+
+def find_questions_by_ids(item_ids, banks=None):
+    """
+    Preguntas de los bancos (por defecto todos) con los ids dados, en el mismo orden.
+    Devuelve las preguntas compartidas del banco, sin copiar.
+    """
+    indexes = [load_bank_index(bank) for bank in banks or get_banks()]
+    found = []
+    for item_id in item_ids:
+        for index in indexes:
+            if item_id in index:
+                found.append(index[item_id])
+                break
+    return found
+
+
+def select_concept_questions(query, total=20, banks=None):
+    """
+    Builds a practice exam from the questions that best match 'query'
+    (enunciado, opciones, concept_to_study and explicacion_openai).
+    """
+    from utils.search_index import search
+
+    ensure_search_index(banks)
+    results = search(query, limit=total, banks=banks)
+    item_ids = list(dict.fromkeys(r["item_id"] for r in results))
+    selected_questions = [_session_copy(q) for q in find_questions_by_ids(item_ids, banks)]
     random.shuffle(selected_questions)
     return selected_questions
@@ -0,0 +1,231 @@
+# utils/rescoring.py
+"""
+Re-calificación incremental de intentos guardados.
+
+Cuando se corrige 'respuesta_correcta' de un ítem cambia su hash de versión
+(utils.item_versions). Este trabajo busca solo los intentos que vieron una
+versión distinta a la actual, los vuelve a puntuar en lote con el motor
+vectorizado, actualiza los agregados del panel y regenera sus PDFs.
+
+Uso:
+    python -m utils.rescoring            # re-califica y regenera reportes
+    python -m utils.rescoring --dry-run  # solo muestra los intentos afectados
+    python -m utils.rescoring --no-pdf   # re-califica sin regenerar PDFs
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List
+
+import numpy as np
+
+from utils.attempts import get_attempts_connection, register_item_versions, set_pdf_path
+from utils.auth import load_config
+from utils.exams import get_banks
+from utils.question_manager import load_bank
+from utils.scoring import score_attempts, classification_stats
+
+
+def load_current_bank() -> Dict[str, Dict[str, Any]]:
+    """
+    Bancos actuales (todos los de config.json) indexados por id estable.
+    """
+    bank = {}
+    for name in get_banks():
+        for q in load_bank(name):
+            bank[q["id"]] = q
+    return bank
+
+
+def find_stale_versions(conn, bank: Dict[str, Dict[str, Any]]):
+    """
+    Pares (item_id, versión) presentes en intentos guardados que ya no son la versión actual.
+    Recorre el índice (item_id, item_version), no las filas de cada intento.
+    """
+    stale = []
+    for row in conn.execute("SELECT DISTINCT item_id, item_version FROM attempt_items"):
+        current = bank.get(row["item_id"])
+        if current is not None and current["version"] != row["item_version"]:
+            stale.append((row["item_id"], row["item_version"]))
+    return stale
+
+
+def find_affected_attempts(conn, stale) -> List[str]:
+    """
+    Intentos que contienen alguno de los pares desactualizados.
+    """
+    affected = set()
+    for item_id, version in stale:
+        for row in conn.execute(
+            "SELECT DISTINCT attempt_id FROM attempt_items WHERE item_id = ? AND item_version = ?",
+            (item_id, version),
+        ):
+            affected.add(row["attempt_id"])
+    return sorted(affected)
+
+
+def _historical_key(conn, item_id: str, version: str):
+    row = conn.execute(
+        "SELECT respuesta_correcta FROM item_versions WHERE item_id = ? AND version = ?",
+        (item_id, version),
+    ).fetchone()
+    return json.loads(row["respuesta_correcta"]) if row else []
+
+
+def rescore_attempts(conn, attempt_ids: List[str], bank: Dict[str, Dict[str, Any]], passing_score: int):
+    """
+    Puntúa de nuevo los intentos indicados en una sola pasada vectorizada.
+    Devuelve una lista de dicts con el resultado por intento.
+    """
+    if not attempt_ids:
+        return []
+
+    attempts = []
+    for attempt_id in attempt_ids:
+        items = conn.execute(
+            "SELECT position, item_id, item_version, clasificacion, answer FROM attempt_items "
+            "WHERE attempt_id = ? ORDER BY position",
+            (attempt_id,),
+        ).fetchall()
+        attempts.append((attempt_id, items))
+
+    n_questions = max((len(items) for _, items in attempts), default=0)
+    is_correct = np.zeros((len(attempts), n_questions), dtype=bool)
+    valid = np.zeros((len(attempts), n_questions), dtype=bool)
+    class_codes = np.zeros((len(attempts), n_questions), dtype=np.int64)
+    class_names: List[str] = []
+    class_index: Dict[str, int] = {}
+    incorrect_by_attempt = []
+
+    for row_idx, (_, items) in enumerate(attempts):
+        incorrect = []
+        for item in items:
+            col = item["position"]
+            clasif = item["clasificacion"] or "Other"
+            if clasif not in class_index:
+                class_index[clasif] = len(class_names)
+                class_names.append(clasif)
+            class_codes[row_idx, col] = class_index[clasif]
+            valid[row_idx, col] = True
+
+            question = bank.get(item["item_id"])
+            if question is not None:
+                key = question["respuesta_correcta"]
+            else:
+                # Ítem retirado del banco: se conserva la clave con la que se respondió
+                key = _historical_key(conn, item["item_id"], item["item_version"])
+
+            answer = item["answer"]
+            if answer is not None and answer in key:
+                is_correct[row_idx, col] = True
+            elif answer is not None and question is not None:
+                incorrect.append((col, question, answer))
+        incorrect_by_attempt.append(incorrect)
+
+    result = score_attempts(is_correct, class_codes, len(class_names), valid=valid, passing_score=passing_score)
+
+    outcomes = []
+    for row_idx, (attempt_id, _) in enumerate(attempts):
+        outcomes.append({
+            "attempt_id": attempt_id,
+            "score": int(result.scaled[row_idx]),
+            "status": "Passed" if result.passed[row_idx] else "Not Passed",
+            "classification_stats": classification_stats(result, class_names, row_idx),
+            "incorrect": incorrect_by_attempt[row_idx],
+        })
+    return outcomes
+
+
+def _regenerate_report(attempt_row, outcome) -> str:
+    """
+    Vuelve a generar el PDF del intento con el nuevo puntaje (explicaciones locales).
+    """
+    from utils.pdf_generator import RESULTS_DIR, generate_pdf
+    from openai_utils.explanations import local_explanation_text
+
+    explanations = {}
+    for idx, question, _ in outcome["incorrect"]:
+        text = local_explanation_text(question)
+        if text:
+            explanations[idx] = text
+
+    # Un archivo por intento: el nombre por email se reutiliza en cada examen nuevo
+    if not os.path.exists(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    output_path = os.path.join(RESULTS_DIR, f"{attempt_row['email'] or 'unknown'}_{attempt_row['attempt_id']}_result.pdf")
+
+    user_data = {"nombre": attempt_row["nombre"], "email": attempt_row["email"]}
+    return generate_pdf(
+        user_data,
+        outcome["score"],
+        outcome["status"],
+        classification_stats=outcome["classification_stats"],
+        explanations=explanations,
+        output_path=output_path,
+    )
+
+
+def run(dry_run=False, regenerate_pdfs=True):
+    """
+    Ejecuta el trabajo completo y devuelve un resumen.
+    """
+    from utils.analytics import apply_rescore
+
+    config = load_config()
+    passing_score = config.get("passing_score", 555)
+    conn = get_attempts_connection()
+    bank = load_current_bank()
+    register_item_versions(bank.values())
+
+    stale = find_stale_versions(conn, bank)
+    affected = find_affected_attempts(conn, stale)
+    summary = {"stale_items": len({item_id for item_id, _ in stale}), "affected_attempts": len(affected),
+               "changed_scores": 0, "reports": 0}
+    if dry_run or not affected:
+        summary["attempt_ids"] = affected
+        return summary
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for outcome in rescore_attempts(conn, affected, bank, passing_score):
+        attempt_row = conn.execute("SELECT * FROM attempts WHERE attempt_id = ?",
+                                   (outcome["attempt_id"],)).fetchone()
+        old_stats = json.loads(attempt_row["classification_stats"] or "{}")
+
+        with conn:
+            conn.execute(
+                "UPDATE attempts SET score = ?, status = ?, classification_stats = ?, rescored_at = ? "
+                "WHERE attempt_id = ?",
+                (outcome["score"], outcome["status"],
+                 json.dumps(outcome["classification_stats"], ensure_ascii=False), now, outcome["attempt_id"]),
+            )
+            # Se marca cada ítem con la versión actual para no volver a procesarlo
+            for item_id, version in stale:
+                conn.execute(
+                    "UPDATE attempt_items SET item_version = ? WHERE attempt_id = ? AND item_id = ? AND item_version = ?",
+                    (bank[item_id]["version"], outcome["attempt_id"], item_id, version),
+                )
+
+        if outcome["score"] != attempt_row["score"] or outcome["status"] != attempt_row["status"]:
+            summary["changed_scores"] += 1
+        apply_rescore(
+            attempt_row["exam_type"] or "unknown", (attempt_row["finished_at"] or now)[:10],
+            attempt_row["score"] or 0, attempt_row["status"] == "Passed", old_stats,
+            outcome["score"], outcome["status"] == "Passed", outcome["classification_stats"],
+        )
+
+        if regenerate_pdfs:
+            pdf_path = _regenerate_report(attempt_row, outcome)
+            if pdf_path != attempt_row["pdf_path"]:
+                set_pdf_path(outcome["attempt_id"], pdf_path)
+            summary["reports"] += 1
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore stored attempts after answer-key corrections.")
+    parser.add_argument("--dry-run", action="store_true", help="only list affected attempts")
+    parser.add_argument("--no-pdf", action="store_true", help="do not regenerate PDF reports")
+    args = parser.parse_args()
+    print(json.dumps(run(dry_run=args.dry_run, regenerate_pdfs=not args.no_pdf), indent=2))
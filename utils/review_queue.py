@@ -0,0 +1,140 @@
+# utils/review_queue.py
+"""
+Cola de repaso espaciado por usuario (algoritmo SM-2).
+
+Cada pregunta fallada crea una tarjeta (email, item_id). Las respuestas
+posteriores a esa pregunta actualizan su intervalo y fecha de repaso.
+El examen "review" se arma con las tarjetas vencidas mediante una consulta
+indexada por (email, due), sin recorrer el historial.
+"""
+import time
+from typing import Container, List, Optional, Tuple
+
+from utils.storage import get_connection, ensure_schema
+
+DAY_SECONDS = 86400
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+# Calidad SM-2 asignada a cada resultado (0-5)
+QUALITY_CORRECT = 4
+QUALITY_INCORRECT = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_cards (
+    email TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    due REAL NOT NULL,
+    interval_days REAL NOT NULL,
+    ease REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    lapses INTEGER NOT NULL,
+    last_review REAL NOT NULL,
+    PRIMARY KEY (email, item_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_review_cards_due ON review_cards (email, due);
+"""
+
+
+def _conn():
+    return ensure_schema(get_connection(), _SCHEMA)
+
+
+def sm2(quality: int, reps: int, interval_days: float, ease: float) -> Tuple[int, float, float]:
+    """
+    Un paso de SM-2. Devuelve (reps, interval_days, ease) actualizados.
+    """
+    if quality < 3:
+        reps = 0
+        interval_days = 1.0
+    else:
+        reps += 1
+        if reps == 1:
+            interval_days = 1.0
+        elif reps == 2:
+            interval_days = 6.0
+        else:
+            interval_days = round(interval_days * ease, 1)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return reps, interval_days, ease
+
+
+def record_results(email: str, results: List[Tuple[str, bool]], now: float = None) -> int:
+    """
+    Actualiza la cola con los resultados de un examen: lista de (item_id, acierto).
+
+    - Un fallo crea la tarjeta si no existía.
+    - Un acierto solo actualiza tarjetas existentes (no se repasa lo que nunca se falló).
+    Devuelve cuántas tarjetas se escribieron.
+    """
+    email = email.strip().lower()
+    if not email or not results:
+        return 0
+    now = now or time.time()
+    conn = _conn()
+
+    item_ids = [item_id for item_id, _ in results]
+    existing = {}
+    # Consulta por bloques para respetar el límite de parámetros de SQLite
+    for start in range(0, len(item_ids), 500):
+        chunk = item_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT item_id, interval_days, ease, reps, lapses FROM review_cards "
+            f"WHERE email = ? AND item_id IN ({placeholders})",
+            [email, *chunk],
+        ):
+            existing[row["item_id"]] = row
+
+    rows = []
+    for item_id, correct in results:
+        card = existing.get(item_id)
+        if card is None and correct:
+            continue
+        reps, interval_days, ease, lapses = (0, 0.0, DEFAULT_EASE, 0) if card is None else (
+            card["reps"], card["interval_days"], card["ease"], card["lapses"])
+        quality = QUALITY_CORRECT if correct else QUALITY_INCORRECT
+        if not correct:
+            lapses += 1
+        reps, interval_days, ease = sm2(quality, reps, interval_days, ease)
+        rows.append((email, item_id, now + interval_days * DAY_SECONDS, interval_days, ease, reps, lapses, now))
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO review_cards (email, item_id, due, interval_days, ease, reps, lapses, last_review) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(email, item_id) DO UPDATE SET due = excluded.due, interval_days = excluded.interval_days, "
+            "ease = excluded.ease, reps = excluded.reps, lapses = excluded.lapses, last_review = excluded.last_review",
+            rows,
+        )
+    return len(rows)
+
+
+def due_items(email: str, limit: int = 20, now: float = None) -> List[str]:
+    """
+    IDs de las tarjetas vencidas del usuario, las más atrasadas primero.
+    """
+    now = now or time.time()
+    rows = _conn().execute(
+        "SELECT item_id FROM review_cards WHERE email = ? AND due <= ? ORDER BY due LIMIT ?",
+        (email.strip().lower(), now, limit),
+    ).fetchall()
+    return [r["item_id"] for r in rows]
+
+
+def count_due(email: str, now: float = None, item_ids: Optional[Container[str]] = None) -> int:
+    """
+    Número de tarjetas vencidas del usuario (solo las de 'item_ids' si se da).
+    """
+    now = now or time.time()
+    if item_ids is None:
+        row = _conn().execute(
+            "SELECT COUNT(*) AS n FROM review_cards WHERE email = ? AND due <= ?",
+            (email.strip().lower(), now),
+        ).fetchone()
+        return row["n"]
+    rows = _conn().execute(
+        "SELECT item_id FROM review_cards WHERE email = ? AND due <= ?",
+        (email.strip().lower(), now),
+    )
+    return sum(1 for r in rows if r["item_id"] in item_ids)
@@ -0,0 +1,97 @@
+# utils/scoring.py
+"""
+Motor de puntuación vectorizado (sin Streamlit).
+
+Trabaja con matrices de intentos × preguntas, de modo que el examen en vivo
+(una fila) y el re-cálculo de cohortes históricas (miles de filas) usan
+exactamente la misma lógica.
+"""
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# Escala: 75% de aciertos → 555, 100% → 700 (lineal por tramos)
+CUT_FRACTION = 0.75
+CUT_SCORE = 555
+MAX_SCORE = 700
+
+
+class ScoreResult(NamedTuple):
+    correct: np.ndarray          # (A,) aciertos por intento
+    total: np.ndarray            # (A,) preguntas válidas por intento
+    fraction: np.ndarray         # (A,) aciertos / total
+    scaled: np.ndarray           # (A,) puntaje escalado (entero)
+    passed: np.ndarray           # (A,) bool, scaled >= passing_score
+    class_correct: np.ndarray    # (A, C) aciertos por clasificación
+    class_total: np.ndarray      # (A, C) preguntas por clasificación
+
+
+def scale_scores(fraction) -> np.ndarray:
+    """
+    Convierte la fracción de aciertos en el puntaje escalado (0-700).
+    Trunca a entero igual que int() en la versión original.
+    """
+    x = np.asarray(fraction, dtype=np.float64)
+    slope1 = CUT_SCORE / CUT_FRACTION
+    slope2 = (MAX_SCORE - CUT_SCORE) / (1 - CUT_FRACTION)
+    scaled = np.where(x <= CUT_FRACTION, slope1 * x, slope2 * (x - CUT_FRACTION) + CUT_SCORE)
+    scaled = np.where(x <= 0, 0.0, scaled)
+    return scaled.astype(np.int64)
+
+
+def score_attempts(
+    is_correct,
+    class_codes,
+    n_classes: int,
+    valid: Optional[np.ndarray] = None,
+    passing_score: int = CUT_SCORE,
+) -> ScoreResult:
+    """
+    Puntúa todos los intentos en una sola pasada.
+
+    - is_correct: (A, Q) bool
+    - class_codes: (A, Q) o (Q,) enteros 0..n_classes-1 con la clasificación de cada pregunta
+    - valid: (A, Q) bool opcional para intentos de distinta longitud (relleno = False)
+    """
+    is_correct = np.atleast_2d(np.asarray(is_correct, dtype=bool))
+    n_attempts, n_questions = is_correct.shape
+    class_codes = np.broadcast_to(np.asarray(class_codes, dtype=np.int64), is_correct.shape)
+    if valid is None:
+        valid = np.ones(is_correct.shape, dtype=bool)
+    else:
+        valid = np.broadcast_to(np.asarray(valid, dtype=bool), is_correct.shape)
+
+    hits = is_correct & valid
+    correct = hits.sum(axis=1)
+    total = valid.sum(axis=1)
+    fraction = np.divide(correct, total, out=np.zeros(n_attempts, dtype=np.float64), where=total > 0)
+    scaled = np.where(total > 0, scale_scores(fraction), 0)
+
+    # Desglose por clasificación con un único bincount sobre (intento, clase)
+    flat = (np.arange(n_attempts)[:, None] * n_classes + class_codes).ravel()
+    size = n_attempts * n_classes
+    class_total = np.bincount(flat, weights=valid.ravel(), minlength=size)
+    class_correct = np.bincount(flat, weights=hits.ravel(), minlength=size)
+
+    return ScoreResult(
+        correct=correct,
+        total=total,
+        fraction=fraction,
+        scaled=scaled,
+        passed=scaled >= passing_score,
+        class_correct=class_correct.reshape(n_attempts, n_classes).astype(np.int64),
+        class_total=class_total.reshape(n_attempts, n_classes).astype(np.int64),
+    )
+
+
+def classification_stats(result: ScoreResult, class_names: Sequence[str], row: int = 0):
+    """
+    Convierte una fila del resultado al formato de st.session_state.classification_stats:
+    {clasificacion: {"correct": n, "total": m}} (solo clases con preguntas).
+    """
+    stats = {}
+    for code, name in enumerate(class_names):
+        total = int(result.class_total[row, code])
+        if total:
+            stats[name] = {"correct": int(result.class_correct[row, code]), "total": total}
+    return stats
@@ -0,0 +1,151 @@
+# utils/search_index.py
+"""
+Índice de texto completo (SQLite FTS5) sobre el banco de preguntas.
+
+Indexa 'enunciado', 'opciones', 'concept_to_study' y 'explicacion_openai'.
+La sincronización es incremental: solo se reescriben los ítems cuyo contenido
+cambió, y si el archivo del banco no cambió desde la última sincronización
+no se hace nada.
+"""
+import hashlib
+import json
+import re
+from typing import List, Dict, Any, Optional
+
+from utils.storage import get_connection, ensure_schema
+
+DB_NAME = "search_index.db"
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+    enunciado, opciones, concept, explicacion,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS indexed_items (
+    bank TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    fts_rowid INTEGER NOT NULL,
+    PRIMARY KEY (bank, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_indexed_items_rowid ON indexed_items (fts_rowid);
+CREATE TABLE IF NOT EXISTS index_meta (
+    bank TEXT PRIMARY KEY,
+    source_sha1 TEXT NOT NULL
+);
+"""
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _conn():
+    return ensure_schema(get_connection(DB_NAME), _SCHEMA)
+
+
+def _fields(q: Dict[str, Any]):
+    return (
+        q.get("enunciado", ""),
+        "\n".join(str(o) for o in q.get("opciones", [])),
+        q.get("concept_to_study", "") or "",
+        q.get("explicacion_openai", "") or "",
+    )
+
+
+def _content_hash(fields) -> str:
+    return hashlib.sha1(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def is_current(bank: str, source_sha1: str) -> bool:
+    """
+    True si el índice del banco ya corresponde a ese archivo fuente.
+    """
+    row = _conn().execute("SELECT source_sha1 FROM index_meta WHERE bank = ?", (bank,)).fetchone()
+    return bool(row and row["source_sha1"] == source_sha1)
+
+
+def sync_index(bank: str, questions: List[Dict[str, Any]], source_sha1: Optional[str] = None) -> Dict[str, int]:
+    """
+    Sincroniza el índice de un banco con sus preguntas actuales.
+
+    Si se pasa 'source_sha1' y coincide con el de la última sincronización, no hace nada.
+    Devuelve cuántos ítems se añadieron, actualizaron y eliminaron.
+    """
+    conn = _conn()
+    stats = {"added": 0, "updated": 0, "removed": 0}
+    if source_sha1 and is_current(bank, source_sha1):
+        return stats
+
+    existing = {
+        r["item_id"]: (r["content_hash"], r["fts_rowid"])
+        for r in conn.execute("SELECT item_id, content_hash, fts_rowid FROM indexed_items WHERE bank = ?", (bank,))
+    }
+
+    with conn:
+        current_ids = set()
+        for q in questions:
+            item_id = q["id"]
+            current_ids.add(item_id)
+            fields = _fields(q)
+            content_hash = _content_hash(fields)
+            previous = existing.get(item_id)
+            if previous and previous[0] == content_hash:
+                continue
+            if previous:
+                conn.execute("DELETE FROM questions_fts WHERE rowid = ?", (previous[1],))
+                stats["updated"] += 1
+            else:
+                stats["added"] += 1
+            cursor = conn.execute(
+                "INSERT INTO questions_fts (enunciado, opciones, concept, explicacion) VALUES (?, ?, ?, ?)", fields
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_items (bank, item_id, content_hash, fts_rowid) VALUES (?, ?, ?, ?)",
+                (bank, item_id, content_hash, cursor.lastrowid),
+            )
+
+        for item_id, (_, fts_rowid) in existing.items():
+            if item_id not in current_ids:
+                conn.execute("DELETE FROM questions_fts WHERE rowid = ?", (fts_rowid,))
+                conn.execute("DELETE FROM indexed_items WHERE bank = ? AND item_id = ?", (bank, item_id))
+                stats["removed"] += 1
+
+        if source_sha1:
+            conn.execute(
+                "INSERT OR REPLACE INTO index_meta (bank, source_sha1) VALUES (?, ?)", (bank, source_sha1)
+            )
+    return stats
+
+
+def _match_expression(query: str) -> str:
+    """
+    Convierte el texto del usuario en una expresión FTS5 segura:
+    todas las palabras deben aparecer; la última admite prefijo.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return ""
+    terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return " ".join(terms)
+
+
+def search(query: str, limit: int = 50, banks: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Busca preguntas (en todos los bancos o solo en 'banks').
+    Devuelve [{item_id, bank, stem, concept, snippet}] ordenadas por relevancia (bm25).
+    """
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    sql = (
+        "SELECT i.item_id, i.bank, f.enunciado AS stem, f.concept AS concept, "
+        "snippet(questions_fts, -1, '**', '**', ' … ', 12) AS snippet "
+        "FROM questions_fts f JOIN indexed_items i ON i.fts_rowid = f.rowid "
+        "WHERE questions_fts MATCH ?"
+    )
+    params: List[Any] = [expression]
+    if banks:
+        sql += f" AND i.bank IN ({', '.join('?' for _ in banks)})"
+        params.extend(banks)
+    sql += " ORDER BY bm25(questions_fts, 4.0, 1.0, 6.0, 1.0) LIMIT ?"
+    params.append(limit)
+    return [dict(r) for r in _conn().execute(sql, params).fetchall()]
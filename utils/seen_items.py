@@ -0,0 +1,253 @@
+# utils/seen_items.py
+"""
+Preguntas ya vistas por cada usuario, como bitset por email.
+
+Cada id estable de pregunta recibe una posición de bit fija (tabla item_bits,
+solo se añaden posiciones: un banco nuevo no mueve las anteriores). Lo visto
+por un email es un BLOB con esos bits: ~126 bytes para las 1.001 preguntas del
+banco, así que 100k usuarios ocupan ~13 MB en disco y nada en memoria (se lee
+solo el usuario que empieza un examen).
+
+El muestreo recibe una máscara booleana alineada con el banco (seen_mask) y
+prefiere, dentro de cada clasificación del blueprint, las preguntas no vistas;
+la máscara se calcula con np.unpackbits e indexado por posiciones, sin
+recorrer conjuntos. Cuando se agotan las no vistas se usan las vistas.
+numpy se importa dentro de las funciones: importar el módulo no lo carga al
+arrancar la app.
+
+Uso:
+    python -m utils.seen_items --bench --users 100000
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from utils import data_versions, storage
+
+DB_NAME = "seen_items.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS item_bits (
+    item_id TEXT PRIMARY KEY,
+    bit INTEGER NOT NULL UNIQUE
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen_items (
+    email TEXT PRIMARY KEY,
+    bits BLOB NOT NULL,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# {item_id: bit} ya asignados (unos pocos miles de entradas por proceso)
+_bits: Dict[str, int] = {}
+_bits_lock = threading.Lock()
+
+
+def _conn():
+    return storage.ensure_schema(storage.get_connection(DB_NAME), _SCHEMA)
+
+
+def _normalize(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+def bit_positions(item_ids: List[str]) -> "np.ndarray":
+    """
+    Posición de bit de cada id (asigna las que falten, a continuación de la última).
+    """
+    import numpy as np
+
+    missing = [i for i in dict.fromkeys(item_ids) if i not in _bits]
+    if missing:
+        with _bits_lock:
+            conn = _conn()
+            with conn:
+                next_bit = conn.execute("SELECT COALESCE(MAX(bit) + 1, 0) FROM item_bits").fetchone()[0]
+                for item_id in missing:
+                    cur = conn.execute("INSERT OR IGNORE INTO item_bits (item_id, bit) VALUES (?, ?)",
+                                       (item_id, next_bit))
+                    next_bit += cur.rowcount
+            placeholders = ",".join("?" * len(missing))
+            for row in conn.execute(f"SELECT item_id, bit FROM item_bits WHERE item_id IN ({placeholders})", missing):
+                _bits[row["item_id"]] = row["bit"]
+    return np.fromiter((_bits[i] for i in item_ids), dtype=np.int64, count=len(item_ids))
+
+
+@lru_cache(maxsize=16)
+def _bank_positions(bank: str, version: int) -> "np.ndarray":
+    from utils.question_manager import load_bank
+
+    return bit_positions([q["id"] for q in load_bank(bank)])
+
+
+def bank_positions(bank: str) -> "np.ndarray":
+    """
+    Posiciones de bit de las preguntas del banco, en el orden de load_bank(bank).
+    """
+    return _bank_positions(bank, data_versions.active().number)
+
+
+def _load_bits(email: str) -> Optional["np.ndarray"]:
+    import numpy as np
+
+    row = _conn().execute("SELECT bits FROM seen_items WHERE email = ?", (_normalize(email),)).fetchone()
+    if row is None:
+        return None
+    return np.unpackbits(np.frombuffer(row["bits"], dtype=np.uint8), bitorder="little").astype(bool)
+
+
+def seen_mask(email: str, bank: str) -> Optional["np.ndarray"]:
+    """
+    Máscara booleana alineada con load_bank(bank): True si el usuario ya la vio.
+    None si el usuario no tiene historial (o no vio nada de este banco).
+    """
+    import numpy as np
+
+    bits = _load_bits(email)
+    if bits is None:
+        return None
+    positions = bank_positions(bank)
+    mask = np.zeros(len(positions), dtype=bool)
+    inside = positions < len(bits)
+    mask[inside] = bits[positions[inside]]
+    return mask if mask.any() else None
+
+
+def mark_seen(email: str, item_ids: Iterable[str]):
+    """
+    Añade preguntas a lo visto por el usuario (OR de bits, una fila por email).
+    """
+    import numpy as np
+
+    item_ids = [i for i in item_ids if i]
+    email = _normalize(email)
+    if not email or not item_ids:
+        return
+    positions = bit_positions(item_ids)
+    conn = _conn()
+    with conn:
+        row = conn.execute("SELECT bits FROM seen_items WHERE email = ?", (email,)).fetchone()
+        current = np.frombuffer(row["bits"], dtype=np.uint8) if row else np.zeros(0, dtype=np.uint8)
+        packed = np.zeros(max(len(current), int(positions.max()) // 8 + 1), dtype=np.uint8)
+        packed[:len(current)] = current
+        np.bitwise_or.at(packed, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+        conn.execute(
+            "INSERT INTO seen_items (email, bits, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET bits = excluded.bits, updated_at = excluded.updated_at",
+            (email, packed.tobytes(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+def _clear_positions():
+    with _bits_lock:
+        _bits.clear()
+    _bank_positions.cache_clear()
+
+
+def run_benchmark(users: int = 100000, exams: int = 5) -> Dict[str, float]:
+    """
+    Tamaño y latencias del almacén con 'users' usuarios, y preguntas repetidas
+    en 'exams' exámenes completos seguidos de un usuario, con y sin preferencia.
+    """
+    global DB_NAME
+    import numpy as np
+    from utils.question_manager import load_bank, select_exam_questions
+
+    previous, DB_NAME = DB_NAME, "seen_items_bench.db"
+    path = os.path.join(storage.DB_DIR, DB_NAME)
+    _clear_positions()
+    try:
+        bank = load_bank("full")
+        positions = bank_positions("full")
+        rng = np.random.default_rng(1)
+        conn = _conn()
+        t0 = time.perf_counter()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO seen_items (email, bits, updated_at) VALUES (?, ?, '')",
+                ((f"user{n}@example.com",
+                  np.packbits(rng.random(len(positions)) < 0.3, bitorder="little").tobytes())
+                 for n in range(users)),
+            )
+        load_s = time.perf_counter() - t0
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        lookups = 2000
+        t0 = time.perf_counter()
+        for n in range(lookups):
+            seen_mask(f"user{n * 37 % users}@example.com", "full")
+        mask_us = (time.perf_counter() - t0) / lookups * 1e6
+        ids = [q["id"] for q in bank[:140]]
+        t0 = time.perf_counter()
+        for n in range(200):
+            mark_seen(f"user{n}@example.com", ids)
+        mark_us = (time.perf_counter() - t0) / 200 * 1e6
+
+        repeats = {}
+        for label, prefer in (("without", False), ("with", True)):
+            email = f"repeat-{label}@example.com"
+            py_rng = random.Random(7)
+            shown = []
+            for _ in range(exams):
+                seen = seen_mask(email, "full") if prefer else None
+                questions = select_exam_questions("full", rng=py_rng, seen=seen)
+                shown.append([q["id"] for q in questions])
+                mark_seen(email, shown[-1])
+            last = set(shown[-1])
+            before = set(i for ids_ in shown[:-1] for i in ids_)
+            repeats[label] = len(last & before) / len(last)
+
+        t0 = time.perf_counter()
+        seen = seen_mask("user1@example.com", "full")
+        for _ in range(20):
+            select_exam_questions("full", rng=random.Random(3), seen=seen)
+        sample_with_ms = (time.perf_counter() - t0) / 20 * 1000
+        t0 = time.perf_counter()
+        for _ in range(20):
+            select_exam_questions("full", rng=random.Random(3))
+        sample_without_ms = (time.perf_counter() - t0) / 20 * 1000
+        db_bytes = os.path.getsize(path)
+    finally:
+        storage.close_connection(DB_NAME)
+        DB_NAME = previous
+        _clear_positions()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return {
+        "users": users,
+        "load_s": round(load_s, 2),
+        "db_bytes_per_user": round(db_bytes / users, 1),
+        "seen_mask_us": round(mask_us, 1),
+        "mark_seen_us": round(mark_us, 1),
+        "repeat_without": round(repeats["without"], 3),
+        "repeat_with": round(repeats["with"], 3),
+        "sample_without_ms": round(sample_without_ms, 2),
+        "sample_with_ms": round(sample_with_ms, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-user seen-question bitsets.")
+    parser.add_argument("--bench", action="store_true", help="store size, lookup latency and repeat rate")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--exams", type=int, default=5, help="consecutive full exams for the repeat rate")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    r = run_benchmark(args.users, args.exams)
+    print(f"{r['users']} users loaded in {r['load_s']:.1f} s, {r['db_bytes_per_user']:.0f} B/user on disk")
+    print(f"seen_mask {r['seen_mask_us']:.0f} us, mark_seen (140 items) {r['mark_seen_us']:.0f} us")
+    print(f"exam {args.exams}: {r['repeat_without']:.1%} of questions already seen without preference, "
+          f"{r['repeat_with']:.1%} with")
+    print(f"select_exam_questions: {r['sample_without_ms']:.2f} ms without mask, {r['sample_with_ms']:.2f} ms with")
+
+
+if __name__ == "__main__":
+    main()
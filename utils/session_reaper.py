@@ -0,0 +1,464 @@
+# utils/session_reaper.py
+"""
+Ciclo de vida de las sesiones: suelta lo pesado de session_state cuando ya no hace falta.
+
+Streamlit conserva el session_state de cada pestaña hasta que se cierra su
+websocket, así que un examen terminado (o abandonado con la pestaña abierta)
+seguía reteniendo preguntas, respuestas, explicaciones y la versión de datos
+fijada (utils.data_versions).
+
+- Examen terminado: cuando finalize_exam ya guardó el intento (attempts.db) y el
+  PDF, release_finished deja solo final_result (puntuación, estado, desglose por
+  tema, explicaciones y ruta del PDF) para volver a pintar la página de
+  resultados, y suelta el resto (HEAVY_KEYS).
+- Sesión inactiva: cada rerun registra la sesión con touch(). Un hilo
+  (start_reaper) revisa cada REAP_INTERVAL_SECONDS las que pasan
+  IDLE_SESSION_SECONDS sin rerun (en examen, hasta el final de su tiempo más
+  EXAM_GRACE_SECONDS). Un examen sin guardar (p.ej. modo normal, sin cuenta
+  atrás en el navegador, con la pestaña abierta al acabar el tiempo) se
+  califica y se guarda antes, como al finalizarlo (calculate_score,
+  save_attempt, record_exam), y queda anotado en logs/reaped_sessions.db; si
+  no se puede guardar, la sesión se conserva y se reintenta. La sesión vuelve
+  al login si el usuario regresa.
+- results/ (opcional, desactivado por defecto): con "results_max_age_days" y/o
+  "results_max_files" en data/config.json se borran los PDF más antiguos que
+  ese número de días y, por encima de ese número de archivos, los más antiguos.
+  Sin esas claves no se borra ningún PDF; uno borrado no se recupera (rescoring
+  solo regenera los de intentos recalificados).
+
+Lo liberado (tamaño profundo de los valores soltados, sin contar lo compartido
+con el banco) se suma en exam_session_reclaimed_bytes_total{reason}.
+
+Uso:
+    python -m utils.session_reaper --reaped
+    python -m utils.session_reaper --prune --max-age-days 30
+    python -m utils.session_reaper --soak --exams 300
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils import data_versions, metrics, storage
+
+DB_NAME = "reaped_sessions.db"
+
+# Sin reruns en este tiempo una sesión se suelta (fuera de examen o ya terminada)
+IDLE_SESSION_SECONDS = 1800
+# En examen se espera al final de su tiempo más este margen
+EXAM_GRACE_SECONDS = 600
+REAP_INTERVAL_SECONDS = 60
+# Poda de results/: None = sin límite (ver configure)
+RESULTS_MAX_AGE_DAYS: Optional[int] = None
+RESULTS_MAX_FILES: Optional[int] = None
+
+# Estado por examen que se suelta al terminar o por inactividad
+HEAVY_KEYS = (
+    "selected_questions", "answers", "answer_positions", "marked", "incorrect_answers",
+    "classification_stats", "explanations", "explanations_key", "data_version",
+    "runner_media", "runner_form_sent", "runner_seq", "exam_runner", "question_palette",
+    "adaptive_exam", "adaptive_length", "unanswered_questions",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reaped_attempts (
+    attempt_id TEXT,
+    email TEXT NOT NULL,
+    exam_id TEXT,
+    reaped_at TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+# {session_id: [referencia débil al estado, hora límite de inactividad]}
+_sessions: Dict[str, list] = {}
+_reaper = None
+# Solo para --soak --no-release: la sesión terminada lo conserva todo, como antes
+_keep_finished_state = False
+
+
+def _conn():
+    return storage.ensure_schema(storage.get_connection(DB_NAME), _SCHEMA)
+
+
+def configure(config: Dict):
+    """
+    Lee de config.json los límites de la poda de results/ (sin ellos no se poda).
+    """
+    global RESULTS_MAX_AGE_DAYS, RESULTS_MAX_FILES
+    RESULTS_MAX_AGE_DAYS = config.get("results_max_age_days")
+    RESULTS_MAX_FILES = config.get("results_max_files")
+
+
+def _shared_ids(version: data_versions.DataVersion) -> frozenset:
+    # Objetos del banco a los que apuntan las copias de sesión: no se liberan con la sesión.
+    # Se calcula una vez por versión y se libera con ella.
+    ids = getattr(version, "_shared_ids", None)
+    if ids is None:
+        found = set()
+        for questions in version.banks.values():
+            for q in questions:
+                found.add(id(q))
+                found.update(id(value) for value in q.values())
+                found.update(id(option) for option in q.get("opciones", ()))
+        ids = version._shared_ids = frozenset(found)
+    return ids
+
+
+def deep_size(value: Any, shared: frozenset = frozenset()) -> int:
+    """
+    Bytes de 'value' y de lo que contiene (dict, list, tuple, set), sin 'shared'
+    ni versiones de datos (se liberan aparte).
+    """
+    seen = set(shared)
+    total = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, data_versions.DataVersion):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+def release(state, reason: str, keys=HEAVY_KEYS) -> int:
+    """
+    Quita 'keys' de 'state' (st.session_state, el de otra sesión o un dict) y
+    devuelve los bytes liberados.
+    """
+    version = state["data_version"] if "data_version" in state else None
+    shared = _shared_ids(version) if version is not None else frozenset()
+    reclaimed = 0
+    for key in keys:
+        if key in state:
+            reclaimed += deep_size(state[key], shared)
+            del state[key]
+    metrics.inc("exam_sessions_reaped_total", reason=reason)
+    metrics.inc("exam_session_reclaimed_bytes_total", reclaimed, reason=reason)
+    return reclaimed
+
+
+def release_finished(state, final_result: Dict[str, Any]) -> int:
+    """
+    Examen guardado: conserva solo lo que muestra la página de resultados.
+    """
+    state["final_result"] = final_result
+    if _keep_finished_state:
+        return 0
+    return release(state, "finished")
+
+
+def touch(session_id: str, state, deadline: Optional[float] = None):
+    """
+    Registra actividad de la sesión ('state': ctx.session_state). 'deadline' es
+    el final del examen en curso, si lo hay.
+    """
+    now = time.time()
+    idle_until = now + IDLE_SESSION_SECONDS
+    if deadline is not None:
+        idle_until = max(idle_until, deadline + EXAM_GRACE_SECONDS)
+    with _lock:
+        entry = _sessions.get(session_id)
+        if entry is not None and entry[0]() is state:
+            entry[1] = idle_until
+        else:
+            _sessions[session_id] = [weakref.ref(state), idle_until]
+
+
+def _submit_unsaved(plain: Dict[str, Any]):
+    """
+    Califica y guarda el examen de una sesión inactiva, como finalize_exam pero
+    sin interfaz: intento, agregados, cola de repaso y preguntas vistas.
+    """
+    from utils.analytics import record_exam
+    from utils.attempts import save_attempt
+    from utils.question_manager import calculate_score, is_answer_correct
+    from utils.review_queue import record_results
+    from utils.seen_items import mark_seen
+
+    version = data_versions.bind(plain)
+    try:
+        score = calculate_score(plain)
+    finally:
+        data_versions.unbind()
+    status = "Passed" if score >= version.config["passing_score"] else "Not Passed"
+    user_data = plain.get("user_data", {})
+    email = user_data.get("email", "")
+    exam_type = plain.get("exam_type", "unknown")
+    exam_key = plain.get("attempt_id") or f"{email}|{plain.get('start_time')}"
+    questions = plain["selected_questions"]
+
+    record_exam(exam_key, exam_type, score, status == "Passed", plain.get("classification_stats"))
+    if plain.get("metrics_finalized") != exam_key:
+        metrics.inc("exam_finalized_total", exam_type=exam_type, status=status)
+    newly_saved = save_attempt(exam_key, user_data, exam_type, plain.get("start_time"), questions,
+                               plain["answers"], score, status, plain.get("classification_stats"),
+                               None, plain.get("form_id"))
+    if newly_saved:
+        # Una fila por intento: un reintento tras un fallo posterior no la repite
+        conn = _conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO reaped_attempts (attempt_id, email, exam_id, reaped_at, score, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (exam_key, email, plain.get("exam_id"), datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                 score, status),
+            )
+        record_results(email, [(q["id"], is_answer_correct(q, idx, plain))
+                               for idx, q in enumerate(questions)
+                               if plain["answers"].get(str(idx)) is not None and q.get("id")])
+        mark_seen(email, [q.get("id") for q in questions])
+
+
+def reap_idle(now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Suelta las sesiones inactivas; un examen sin guardar se califica y guarda antes.
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        expired = [(sid, entry[0]) for sid, entry in _sessions.items() if entry[1] <= now]
+        for sid, _ in expired:
+            del _sessions[sid]
+    stats = {"sessions": 0, "saved": 0, "bytes": 0}
+    for session_id, ref in expired:
+        state = ref()
+        if state is None:
+            continue  # Streamlit ya la cerró
+        try:
+            plain = state.filtered_state if hasattr(state, "filtered_state") else dict(state)
+            submitted = bool(plain.get("selected_questions")) and "final_result" not in plain
+            if submitted:
+                _submit_unsaved(plain)
+                stats["saved"] += 1
+            del plain
+            stats["bytes"] += release(state, "idle")
+            state["session_expired"] = "submitted" if submitted else "idle"
+            stats["sessions"] += 1
+        except Exception as e:
+            # Sin guardar no se suelta: se conserva el examen y se reintenta más tarde
+            print(f"No se pudo liberar la sesión {session_id}: {e}")
+            with _lock:
+                _sessions.setdefault(session_id, [ref, now + REAP_INTERVAL_SECONDS])
+    return stats
+
+
+def prune_results(now: Optional[float] = None, max_age_days: Optional[int] = None,
+                  max_files: Optional[int] = None) -> int:
+    """
+    Borra PDF de results/ antiguos o por encima del máximo (por defecto los
+    límites de configure; sin ninguno no borra nada). Devuelve cuántos borró.
+    """
+    from utils.pdf_generator import RESULTS_DIR
+
+    max_age_days = RESULTS_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_files = RESULTS_MAX_FILES if max_files is None else max_files
+    if (max_age_days is None and max_files is None) or not os.path.isdir(RESULTS_DIR):
+        return 0
+    now = time.time() if now is None else now
+    files = []
+    for entry in os.scandir(RESULTS_DIR):
+        if entry.is_file() and entry.name.endswith(".pdf"):
+            files.append((entry.stat().st_mtime, entry.path))
+    files.sort(reverse=True)
+    cutoff = now - max_age_days * 86400 if max_age_days is not None else None
+    removed = 0
+    for n, (mtime, path) in enumerate(files):
+        if (max_files is not None and n >= max_files) or (cutoff is not None and mtime < cutoff):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                print(f"No se pudo borrar {path}: {e}")
+    return removed
+
+
+def _loop(interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            stats = reap_idle()
+            removed = prune_results()
+            if stats["sessions"] or removed:
+                print(f"Reaper: {stats['sessions']} sesiones inactivas ({stats['saved']} exámenes guardados, "
+                      f"{stats['bytes'] / 1024:.0f} KB), {removed} PDF borrados")
+        except Exception as e:
+            print(f"Error en el reaper de sesiones: {e}")
+
+
+def start_reaper(interval: float = REAP_INTERVAL_SECONDS):
+    """
+    Arranca (una vez por proceso) el hilo que suelta sesiones inactivas y, si
+    está configurado, poda results/.
+    """
+    global _reaper
+    if _reaper is not None:
+        return _reaper
+    with _lock:
+        if _reaper is None:
+            thread = threading.Thread(target=_loop, args=(interval,), name="session-reaper", daemon=True)
+            thread.start()
+            _reaper = thread
+    return _reaper
+
+
+def reaped_attempts(limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Exámenes calificados y guardados por el reaper, del más reciente al más antiguo.
+    """
+    rows = _conn().execute(
+        "SELECT * FROM reaped_attempts ORDER BY reaped_at DESC LIMIT ?", (limit,)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _reclaimed_bytes() -> float:
+    with metrics._lock:
+        return sum(v for (name, _), v in metrics._counters.items() if name == "exam_session_reclaimed_bytes_total")
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_soak(exams: int = 300, access_code: str = "prueba2", every: int = 25,
+             release_state: bool = True, max_pdfs: int = 50) -> Dict[str, Any]:
+    """
+    Exámenes seguidos (AppTest, modo navegador) dejando todas las pestañas
+    abiertas, como el peor caso de un día de examen. Mide el RSS cada 'every'
+    exámenes. Las explicaciones las sirve un servidor local falso. Bases y PDF
+    van a un directorio temporal: logs/ y results/ no se tocan.
+    """
+    from utils import pdf_generator
+
+    previous = pdf_generator.RESULTS_DIR
+    with storage.temporary_db_dir() as tmp:
+        pdf_generator.RESULTS_DIR = os.path.join(tmp, "results")
+        try:
+            return _run_soak(exams, access_code, every, release_state, max_pdfs)
+        finally:
+            pdf_generator.RESULTS_DIR = previous
+
+
+def _run_soak(exams: int, access_code: str, every: int, release_state: bool, max_pdfs: int) -> Dict[str, Any]:
+    global _keep_finished_state
+    import openai
+    from http.server import ThreadingHTTPServer
+    from streamlit.testing.v1 import AppTest
+    from openai_utils.explanations import _FakeCompletionsHandler
+    from components.exam_runner import RUNNER_KEY
+    from utils.pdf_generator import RESULTS_DIR
+    from utils.exam_loadtest import APP_SCRIPT, _runner_exam
+
+    handler = type("_SoakHandler", (_FakeCompletionsHandler,), {"FIRST_TOKEN_DELAY": 0, "TOKEN_DELAY": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    previous = (openai.base_url, openai.api_key, _keep_finished_state)
+    openai.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    openai.api_key = "soak"
+    _keep_finished_state = not release_state
+
+    tabs = []
+    samples = []
+    reclaimed_before = _reclaimed_bytes()
+    start = time.perf_counter()
+    try:
+        for n in range(exams):
+            rng = random.Random(n)
+            at = AppTest.from_file(APP_SCRIPT, default_timeout=300).run()
+            at.text_input[0].input(f"soak{n}@example.com")
+            at.text_input[1].input(access_code)
+            at.button[0].click().run()
+            [t for t in at.text_input if t.label == "Full Name:"][0].input("Soak Test")
+            [c for c in at.checkbox if c.label.startswith("Run the exam")][0].check()
+            [b for b in at.button if b.label == "Start Exam"][0].click().run()
+            _runner_exam(at, rng, 10)
+            at.session_state[RUNNER_KEY] = {"attempt": at.session_state["attempt_id"], "seq": 10 ** 6,
+                                            "answers": {}, "marked": [], "current": 0, "finish": True}
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            if "final_result" not in at.session_state:
+                raise RuntimeError("the exam did not finish")
+            tabs.append(at)
+            if (n + 1) % every == 0:
+                prune_results(max_files=max_pdfs)
+                gc.collect()
+                samples.append((n + 1, _rss_bytes()))
+    finally:
+        server.shutdown()
+        openai.base_url, openai.api_key, _keep_finished_state = previous
+
+    pdfs = len([f for f in os.listdir(RESULTS_DIR) if f.endswith(".pdf")]) if os.path.isdir(RESULTS_DIR) else 0
+    first_half = [rss for n, rss in samples if n <= exams // 2]
+    second_half = [rss for n, rss in samples if n > exams // 2]
+    return {
+        "exams": exams,
+        "release": release_state,
+        "seconds": round(time.perf_counter() - start, 1),
+        "samples": [(n, round(rss / 2 ** 20, 1)) for n, rss in samples],
+        "growth_kb_per_exam": round((samples[-1][1] - samples[0][1]) / max(1, samples[-1][0] - samples[0][0]) / 1024, 1)
+        if len(samples) > 1 else None,
+        "second_half_growth_mb": round((max(second_half) - min(second_half)) / 2 ** 20, 1) if second_half else None,
+        "first_half_max_mb": round(max(first_half) / 2 ** 20, 1) if first_half else None,
+        "pdfs": pdfs,
+        "reclaimed_kb_per_exam": round((_reclaimed_bytes() - reclaimed_before) / exams / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Release finished and idle exam sessions.")
+    parser.add_argument("--reaped", action="store_true", help="exams graded and saved when their session went idle")
+    parser.add_argument("--prune", action="store_true", help="prune results/ now (needs --max-age-days or --max-files)")
+    parser.add_argument("--max-age-days", type=int, help="with --prune: remove PDFs older than this")
+    parser.add_argument("--max-files", type=int, help="with --prune: keep only the newest N PDFs")
+    parser.add_argument("--soak", action="store_true", help="RSS across consecutive exams with tabs left open")
+    parser.add_argument("--exams", type=int, default=300)
+    parser.add_argument("--every", type=int, default=25)
+    parser.add_argument("--code", default="prueba2", help="access code (master code of the exam to run)")
+    parser.add_argument("--no-release", action="store_true", help="soak without releasing finished sessions")
+    args = parser.parse_args()
+    if args.reaped:
+        print(json.dumps(reaped_attempts(), indent=2, ensure_ascii=False))
+        return
+    if args.prune:
+        if args.max_age_days is None and args.max_files is None:
+            parser.error("--prune needs --max-age-days and/or --max-files")
+        print(f"{prune_results(max_age_days=args.max_age_days, max_files=args.max_files)} PDF removed")
+        return
+    if not args.soak:
+        parser.print_help()
+        return
+    # Con python -m este módulo es __main__; la app usa utils.session_reaper, que es otro
+    from utils import session_reaper
+
+    r = session_reaper.run_soak(args.exams, args.code, args.every, not args.no_release)
+    print(f"{r['exams']} exams in {r['seconds']:.0f} s, release={'on' if r['release'] else 'off'}, "
+          f"{r['pdfs']} PDFs left in the temporary results/")
+    print("RSS (MB): " + ", ".join(f"{n}: {mb}" for n, mb in r["samples"]))
+    print(f"growth {r['growth_kb_per_exam']} KB/exam; second half spread {r['second_half_growth_mb']} MB; "
+          f"released {r['reclaimed_kb_per_exam']} KB of session state per exam")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# utils/session_registry.py
+"""
+Sesiones de examen activas por (email, hash del código de acceso).
+
+Detecta el mismo email y código abiertos a la vez en dos navegadores. Cada
+rerun de una sesión autenticada (y cada sincronización del examen en el
+navegador) es un latido; al iniciar sesión se miran las otras sesiones con la
+misma clave que han latido en los últimos SESSION_TTL_SECONDS. Según
+"concurrent_sessions" de data/config.json el login se registra y se permite
+("warn", por defecto), se rechaza ("block") o no se comprueba ("off").
+
+En memoria hay un OrderedDict {session_id: (clave, último latido)} ordenado por
+latido, más {clave: session_ids}: latir, comprobar y liberar son O(1), y las
+entradas caducadas se quitan por el principio del OrderedDict al latir, así que
+el coste de expirar se amortiza. MAX_SESSIONS acota la memoria (~450 B por
+sesión, ver --bench). Las sesiones de este proceso cuyo navegador ya se
+desconectó (Runtime.is_active_session) no cuentan: recargar la página no bloquea.
+
+Con "concurrent_sessions_shared": true los latidos se escriben también en
+logs/sessions.db (como mucho uno cada STORE_HEARTBEAT_SECONDS por sesión), para
+ver las sesiones de otros procesos de la misma máquina. Cada fila lleva el
+proceso que la escribió (host, pid y hora de arranque): las de un proceso que ya
+no existe (p.ej. antes de un reinicio) se borran al configurar y no cuentan al
+comprobar. Los logins marcados se guardan siempre en la tabla login_flags para
+investigarlos.
+
+Uso:
+    python -m utils.session_registry --flags
+    python -m utils.session_registry --bench --sessions 10000
+"""
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from streamlit import runtime
+
+from utils import metrics, storage
+
+DB_NAME = "sessions.db"
+
+# Sin latidos en este tiempo una sesión deja de contar como abierta
+SESSION_TTL_SECONDS = 600
+# Máximo de sesiones en memoria (se descartan las de latido más antiguo)
+MAX_SESSIONS = 50000
+# Intervalo mínimo entre escrituras del latido de una sesión en el almacén compartido
+STORE_HEARTBEAT_SECONDS = 30
+
+POLICIES = ("off", "warn", "block")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS active_sessions (
+    access_key TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    process_id TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (access_key, session_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_active_sessions_last_seen ON active_sessions (last_seen);
+CREATE TABLE IF NOT EXISTS login_flags (
+    flagged_at TEXT NOT NULL,
+    email TEXT NOT NULL,
+    access_key TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    others INTEGER NOT NULL,
+    action TEXT NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+# {session_id: [clave, último latido, última escritura en el almacén]}, ordenado por latido
+_sessions: "OrderedDict[str, list]" = OrderedDict()
+_by_key: Dict[str, Set[str]] = {}
+_shared = False
+_last_purge = 0.0
+_dead_purged = False
+
+
+def _process_start(pid: int) -> Optional[str]:
+    """
+    Hora de arranque del proceso (ticks desde el boot, /proc), o None si no se puede leer.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[1].split()[19].decode()
+    except (OSError, IndexError):
+        return None
+
+
+_HOST = socket.gethostname()
+# Identifica las filas de este proceso en el almacén compartido: host:pid:arranque
+_PROCESS_ID = f"{_HOST}:{os.getpid()}:{_process_start(os.getpid()) or uuid.uuid4().hex[:12]}"
+
+
+def _process_alive(process_id: str) -> bool:
+    """
+    False si la fila es de un proceso de esta máquina que ya terminó (un pid
+    reutilizado tiene otra hora de arranque). Filas de otro host o sin pid: True.
+    """
+    parts = process_id.split(":")
+    if process_id == _PROCESS_ID or len(parts) != 3 or parts[0] != _HOST or not parts[1].isdigit():
+        return True
+    pid = int(parts[1])
+    if pid == os.getpid():
+        return False  # misma pid, ejecución anterior
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # existe, de otro usuario
+    start = _process_start(pid)
+    return start is None or start == parts[2]
+
+
+def _purge_dead_processes() -> int:
+    """
+    Borra del almacén compartido las filas de procesos de esta máquina que ya terminaron.
+    """
+    conn = _conn()
+    dead = [row["process_id"] for row in conn.execute("SELECT DISTINCT process_id FROM active_sessions")
+            if not _process_alive(row["process_id"])]
+    with conn:
+        conn.executemany("DELETE FROM active_sessions WHERE process_id = ?", [(p,) for p in dead])
+    return len(dead)
+
+
+def _conn():
+    return storage.ensure_schema(storage.get_connection(DB_NAME), _SCHEMA)
+
+
+def configure(config: Dict):
+    """
+    Activa el almacén compartido si config.json lo pide (y, la primera vez,
+    borra las filas de procesos terminados).
+    """
+    global _shared, _dead_purged
+    _shared = bool(config.get("concurrent_sessions_shared", False))
+    if _shared and not _dead_purged:
+        _dead_purged = True
+        _purge_dead_processes()
+
+
+def policy(config: Dict) -> str:
+    value = config.get("concurrent_sessions", "warn")
+    return value if value in POLICIES else "warn"
+
+
+def access_key(email: str, token: str) -> str:
+    """
+    Clave de registro: hash de email normalizado y código (el código no se guarda).
+    """
+    raw = f"{(email or '').strip().lower()}\0{(token or '').strip()}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _connected(session_id: str) -> bool:
+    # Fuera de un servidor de Streamlit (CLI, benchmark) no hay a quién preguntar
+    try:
+        if not runtime.exists():
+            return True
+        return runtime.get_instance().is_active_session(session_id)
+    except Exception:
+        return True
+
+
+def _forget(session_id: str):
+    entry = _sessions.pop(session_id, None)
+    if entry is None:
+        return
+    ids = _by_key.get(entry[0])
+    if ids is not None:
+        ids.discard(session_id)
+        if not ids:
+            del _by_key[entry[0]]
+
+
+def _expire(now: float):
+    cutoff = now - SESSION_TTL_SECONDS
+    while _sessions:
+        session_id, entry = next(iter(_sessions.items()))
+        if entry[1] >= cutoff and len(_sessions) <= MAX_SESSIONS:
+            break
+        _forget(session_id)
+
+
+def heartbeat(session_id: str, key: str, now: Optional[float] = None):
+    """
+    Latido de una sesión autenticada con esa clave.
+    """
+    now = time.time() if now is None else now
+    write = False
+    with _lock:
+        entry = _sessions.get(session_id)
+        if entry is not None and entry[0] != key:
+            _forget(session_id)
+            entry = None
+        if entry is None:
+            entry = [key, now, 0.0]
+            _sessions[session_id] = entry
+            _by_key.setdefault(key, set()).add(session_id)
+        else:
+            entry[1] = now
+            _sessions.move_to_end(session_id)
+        if _shared and now - entry[2] >= STORE_HEARTBEAT_SECONDS:
+            entry[2] = now
+            write = True
+        _expire(now)
+    if write:
+        _store_heartbeat(session_id, key, now)
+
+
+def _store_heartbeat(session_id: str, key: str, now: float):
+    global _last_purge
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO active_sessions (access_key, session_id, process_id, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(access_key, session_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (key, session_id, _PROCESS_ID, now),
+        )
+        if now - _last_purge >= SESSION_TTL_SECONDS:
+            _last_purge = now
+            conn.execute("DELETE FROM active_sessions WHERE last_seen < ?", (now - SESSION_TTL_SECONDS,))
+
+
+def release(session_id: str):
+    """
+    La sesión terminó su examen: deja de contar como abierta.
+    """
+    with _lock:
+        entry = _sessions.get(session_id)
+        _forget(session_id)
+    if entry is not None and entry[2]:
+        conn = _conn()
+        with conn:
+            conn.execute("DELETE FROM active_sessions WHERE access_key = ? AND session_id = ?",
+                         (entry[0], session_id))
+
+
+def concurrent_sessions(key: str, session_id: str, now: Optional[float] = None) -> List[str]:
+    """
+    Otras sesiones abiertas con la misma clave (vacío si no hay ninguna).
+    """
+    now = time.time() if now is None else now
+    cutoff = now - SESSION_TTL_SECONDS
+    with _lock:
+        local = [sid for sid in _by_key.get(key, ()) if sid != session_id and _sessions[sid][1] >= cutoff]
+    others = [sid for sid in local if _connected(sid)]
+    if _shared:
+        rows = _conn().execute(
+            "SELECT session_id, process_id FROM active_sessions "
+            "WHERE access_key = ? AND session_id != ? AND process_id != ? AND last_seen >= ?",
+            (key, session_id, _PROCESS_ID, cutoff),
+        ).fetchall()
+        others.extend(row["session_id"] for row in rows if _process_alive(row["process_id"]))
+    return others
+
+
+def flag_login(email: str, key: str, session_id: str, others: int, action: str):
+    """
+    Registra un login con la clave ya abierta en otra sesión.
+    """
+    metrics.inc("exam_concurrent_logins_total", action=action)
+    print(f"Sesión concurrente ({action}): {email} con {others} sesión(es) abierta(s)")
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT INTO login_flags (flagged_at, email, access_key, session_id, others, action) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), (email or "").strip().lower(), key,
+             session_id, others, action),
+        )
+
+
+def recent_flags(limit: int = 50) -> List[Dict]:
+    rows = _conn().execute("SELECT * FROM login_flags ORDER BY flagged_at DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _reset():
+    with _lock:
+        _sessions.clear()
+        _by_key.clear()
+
+
+def run_benchmark(sessions: int = 10000) -> Dict[str, float]:
+    """
+    Latido y comprobación con 'sessions' sesiones en memoria (y con el almacén
+    compartido), memoria por sesión y tope de memoria con el doble de MAX_SESSIONS.
+    """
+    global DB_NAME, _shared, MAX_SESSIONS
+    previous = DB_NAME, _shared, MAX_SESSIONS
+    DB_NAME = "sessions_bench.db"
+    path = os.path.join(storage.DB_DIR, DB_NAME)
+    result: Dict[str, float] = {"sessions": sessions}
+    try:
+        _reset()
+        keys = [access_key(f"user{n}@example.com", "RVT-CODE") for n in range(sessions)]
+        now = time.time()
+        t0 = time.perf_counter()
+        for n, key in enumerate(keys):
+            heartbeat(f"s{n}", key, now)
+        result["heartbeat_us"] = round((time.perf_counter() - t0) / sessions * 1e6, 2)
+        _reset()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        for n, key in enumerate(keys):
+            heartbeat(f"s{n}", key, now)
+        result["bytes_per_session"] = round((tracemalloc.get_traced_memory()[0] - base) / len(_sessions))
+        tracemalloc.stop()
+
+        # Las más recientes (con más de MAX_SESSIONS, las antiguas ya se descartaron)
+        checks = range(max(0, sessions - 10000), sessions)
+        t0 = time.perf_counter()
+        found = sum(bool(concurrent_sessions(keys[n], f"other{n}", now)) for n in checks)
+        result["check_us"] = round((time.perf_counter() - t0) / len(checks) * 1e6, 2)
+        result["detected"] = round(found / len(checks), 3)
+        result["false_positive"] = round(
+            sum(bool(concurrent_sessions(keys[n], f"s{n}", now)) for n in checks) / len(checks), 3)
+        result["kept"] = len(_sessions)
+
+        # Pasado el TTL, un latido basta para vaciar lo caducado
+        later = now + SESSION_TTL_SECONDS + 1
+        t0 = time.perf_counter()
+        heartbeat("late", keys[0], later)
+        result["expire_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        result["after_expiry"] = len(_sessions)
+
+        _reset()
+        MAX_SESSIONS = max(1, sessions // 2)
+        for n, key in enumerate(keys):
+            heartbeat(f"s{n}", key, now)
+        result["capped"] = len(_sessions)
+        MAX_SESSIONS = previous[2]
+
+        _reset()
+        _shared = True
+        for n, key in enumerate(keys):
+            heartbeat(f"s{n}", key, now)
+        _reset()  # como si las sesiones fueran de otro proceso
+        conn = _conn()
+        conn.execute("UPDATE active_sessions SET process_id = 'other'")
+        conn.commit()
+        t0 = time.perf_counter()
+        found = sum(bool(concurrent_sessions(keys[n], f"other{n}", now)) for n in checks)
+        result["shared_check_us"] = round((time.perf_counter() - t0) / len(checks) * 1e6, 2)
+        result["shared_detected"] = round(found / len(checks), 3)
+
+        # Reinicio: las filas son de un proceso de esta máquina que ya terminó
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        conn.execute("UPDATE active_sessions SET process_id = ?", (f"{_HOST}:{finished.pid}:0",))
+        conn.commit()
+        result["stale_detected"] = round(
+            sum(bool(concurrent_sessions(keys[n], f"other{n}", now)) for n in checks) / len(checks), 3)
+        t0 = time.perf_counter()
+        result["purged_processes"] = _purge_dead_processes()
+        result["purge_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        result["stale_rows_left"] = conn.execute("SELECT COUNT(*) FROM active_sessions").fetchone()[0]
+    finally:
+        _reset()
+        storage.close_connection(DB_NAME)
+        DB_NAME, _shared, MAX_SESSIONS = previous
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent exam sessions per email and access code.")
+    parser.add_argument("--flags", action="store_true", help="recent logins flagged as concurrent")
+    parser.add_argument("--bench", action="store_true", help="heartbeat/check latency and memory per session")
+    parser.add_argument("--sessions", type=int, nargs="*", default=[10000])
+    args = parser.parse_args()
+    if args.flags:
+        print(json.dumps(recent_flags(), indent=2, ensure_ascii=False))
+        return
+    if not args.bench:
+        parser.print_help()
+        return
+    for sessions in args.sessions:
+        r = run_benchmark(sessions)
+        print(f"{r['sessions']} sessions: heartbeat {r['heartbeat_us']:.1f} us, check {r['check_us']:.1f} us "
+              f"(detected {r['detected']:.0%}, false positives {r['false_positive']:.0%}), "
+              f"{r['bytes_per_session']:.0f} B/session, {r['kept']} kept in memory")
+        print(f"  expiry after TTL: {r['expire_ms']:.1f} ms for one heartbeat, {r['after_expiry']} left; "
+              f"cap {max(1, sessions // 2)} -> {r['capped']} kept")
+        print(f"  shared store: check {r['shared_check_us']:.1f} us (detected {r['shared_detected']:.0%})")
+        print(f"  after a restart: rows of the dead process detected {r['stale_detected']:.0%}; "
+              f"purge {r['purge_ms']:.1f} ms, {r['stale_rows_left']} rows left")
+
+
+if __name__ == "__main__":
+    main()
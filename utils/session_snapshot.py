@@ -0,0 +1,355 @@
+# utils/session_snapshot.py
+"""
+Instantánea binaria de un examen en curso.
+
+Guarda solo lo necesario para reconstruir la sesión en otro worker o archivarla:
+ids de pregunta, índices de permutación de las opciones, posiciones respondidas,
+marcadas, hora de inicio, pregunta actual y tipo de examen. Si la sesión salió
+de una forma (utils.forms) se guarda solo la semilla de la forma, que se
+reconstruye de forma determinista; un examen de 140 preguntas ocupa ~200 bytes.
+Una forma "seen" (generada prefiriendo preguntas no vistas) no se reconstruye
+con la semilla: se guardan la semilla (para su form_id) y sus preguntas.
+Guardado por preguntas (sin forma, forma "seen", adaptativo) cada pregunta son
+8 bytes: ~1.3 KB para 140 preguntas y ~270 bytes para 20 (ver --bench).
+
+La app todavía no guarda ni restaura sesiones con este módulo; firmar o cifrar
+la instantánea (cookie, almacén compartido) queda a cargo de quien la use.
+
+Formato (little-endian, versión 1):
+    cabecera  "ESS" + versión (u8) + flags (u8)
+    textos    u8 longitud + UTF-8: exam_id, exam_type, attempt_id, nombre, email, adaptive_exam
+    números   start_time (f64, NaN = sin iniciar), índice actual (u16), nº de preguntas (u16),
+              longitud adaptativa (u16)
+    preguntas FLAG_FORM o FLAG_SEEN_FORM: semilla (u64) + 4 bytes del hash del banco
+              salvo FLAG_FORM, por pregunta: id (6 bytes si es hex de 12, si no texto u8)
+              + permutación (u16)
+    respuestas nibbles (posición + 1, 0 = sin responder)
+    marcadas  bitset de n bits
+
+Uso (benchmark):
+    python -m utils.session_snapshot --bench
+"""
+import argparse
+import math
+import struct
+import time
+from typing import Dict, Any, List, MutableMapping
+
+MAGIC = b"ESS"
+VERSION = 1
+
+FLAG_FORM = 1
+FLAG_HEX_IDS = 2
+FLAG_END_EXAM = 4
+FLAG_SEEN_FORM = 8
+
+_HEADER = struct.Struct("<3sBB")
+_NUMBERS = struct.Struct("<dHHH")
+_FORM = struct.Struct("<Q4s")
+_RANK = struct.Struct("<H")
+
+
+class SnapshotError(ValueError):
+    """Instantánea inválida, de otra versión o de otro banco."""
+
+
+def _pack_str(value: str) -> bytes:
+    raw = (value or "").encode("utf-8")
+    if len(raw) > 255:
+        raise SnapshotError("text field longer than 255 bytes")
+    return bytes((len(raw),)) + raw
+
+
+def _unpack_str(data: bytes, pos: int):
+    length = data[pos]
+    return data[pos + 1:pos + 1 + length].decode("utf-8"), pos + 1 + length
+
+
+def _is_hex_id(item_id: str) -> bool:
+    if len(item_id) != 12:
+        return False
+    try:
+        bytes.fromhex(item_id)
+    except ValueError:
+        return False
+    return True
+
+
+def _form_seed(form_id: str) -> int:
+    return int(form_id.rsplit("-", 1)[1], 16)
+
+
+def snapshot_session(state: MutableMapping[str, Any]) -> bytes:
+    """
+    Serializa el examen en curso de 'state' (st.session_state o un dict).
+    """
+    questions = state.get("selected_questions", [])
+    n = len(questions)
+    positions = state.get("answer_positions", {})
+    form_id = state.get("form_id")
+    exam_id = state.get("exam_id", "full")
+
+    from utils.forms import is_seen_form
+
+    flags = 0
+    if form_id and is_seen_form(form_id):
+        flags |= FLAG_SEEN_FORM
+    elif form_id:
+        flags |= FLAG_FORM
+    if not flags & FLAG_FORM and all(_is_hex_id(str(q.get("id", ""))) for q in questions):
+        flags |= FLAG_HEX_IDS
+    if state.get("end_exam"):
+        flags |= FLAG_END_EXAM
+
+    user_data = state.get("user_data", {})
+    start_time = state.get("start_time")
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, flags),
+        _pack_str(exam_id),
+        _pack_str(state.get("exam_type", exam_id)),
+        _pack_str(state.get("attempt_id", "")),
+        _pack_str(user_data.get("nombre", "")),
+        _pack_str(user_data.get("email", "")),
+        _pack_str(state.get("adaptive_exam", "")),
+        _NUMBERS.pack(
+            math.nan if start_time is None else float(start_time),
+            int(state.get("current_question_index", 0)),
+            n,
+            int(state.get("adaptive_length", 0)),
+        ),
+    ]
+
+    if flags & (FLAG_FORM | FLAG_SEEN_FORM):
+        from utils.forms import bank_sha1
+
+        parts.append(_FORM.pack(_form_seed(form_id), bytes.fromhex(bank_sha1(exam_id)[:8])))
+    if not flags & FLAG_FORM:
+        for q in questions:
+            item_id = str(q["id"])
+            parts.append(bytes.fromhex(item_id) if flags & FLAG_HEX_IDS else _pack_str(item_id))
+            rank = int(q.get("perm", 0))
+            if rank > 0xFFFF:
+                raise SnapshotError("option permutation does not fit in 16 bits")
+            parts.append(_RANK.pack(rank))
+
+    answers = bytearray((n + 1) // 2)
+    for i in range(n):
+        position = positions.get(str(i))
+        if position is None:
+            continue
+        if position > 14:
+            raise SnapshotError("answer position does not fit in a nibble")
+        answers[i // 2] |= (position + 1) << (4 * (i % 2))
+    parts.append(bytes(answers))
+
+    marked = bytearray((n + 7) // 8)
+    for i in state.get("marked", ()):
+        if 0 <= i < n:
+            marked[i // 8] |= 1 << (i % 8)
+    parts.append(bytes(marked))
+    return b"".join(parts)
+
+
+def _rebuild_questions(exam_id: str, items: List[Any]) -> List[Dict[str, Any]]:
+    from utils.exams import exam_banks
+    from utils.question_manager import find_questions_by_ids, apply_permutation, _session_copy
+
+    found = {q["id"]: q for q in find_questions_by_ids([item_id for item_id, _ in items], exam_banks(exam_id))}
+    questions = []
+    for item_id, rank in items:
+        if item_id not in found:
+            raise SnapshotError(f"question {item_id} is no longer in the bank")
+        questions.append(apply_permutation(_session_copy(found[item_id]), rank))
+    return questions
+
+
+def restore_session(data: bytes, state: MutableMapping[str, Any]) -> MutableMapping[str, Any]:
+    """
+    Reconstruye en 'state' el examen guardado con snapshot_session.
+    Lanza SnapshotError si la instantánea es inválida o el banco cambió.
+    """
+    try:
+        magic, version, flags = _HEADER.unpack_from(data, 0)
+    except struct.error as e:
+        raise SnapshotError(f"truncated snapshot: {e}")
+    if magic != MAGIC:
+        raise SnapshotError("not an exam session snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+
+    try:
+        pos = _HEADER.size
+        exam_id, pos = _unpack_str(data, pos)
+        exam_type, pos = _unpack_str(data, pos)
+        attempt_id, pos = _unpack_str(data, pos)
+        nombre, pos = _unpack_str(data, pos)
+        email, pos = _unpack_str(data, pos)
+        adaptive_exam, pos = _unpack_str(data, pos)
+        start_time, current_index, n, adaptive_length = _NUMBERS.unpack_from(data, pos)
+        pos += _NUMBERS.size
+
+        form_id = None
+        if flags & (FLAG_FORM | FLAG_SEEN_FORM):
+            from utils.forms import bank_sha1, build_form, form_id_for, stored_form_items
+
+            seed, sha_prefix = _FORM.unpack_from(data, pos)
+            pos += _FORM.size
+            if bank_sha1(exam_id)[:8] != sha_prefix.hex():
+                raise SnapshotError("the question bank changed since the snapshot was taken")
+            form_id = form_id_for(exam_id, seed, seen=bool(flags & FLAG_SEEN_FORM))
+        if flags & FLAG_FORM:
+            # La forma guardada evita volver a muestrear; si este worker no la tiene, se regenera
+            items = stored_form_items(form_id) or build_form(exam_id, seed)["items"]
+        else:
+            items = []
+            for _ in range(n):
+                if flags & FLAG_HEX_IDS:
+                    item_id = data[pos:pos + 6].hex()
+                    pos += 6
+                else:
+                    item_id, pos = _unpack_str(data, pos)
+                items.append((item_id, _RANK.unpack_from(data, pos)[0]))
+                pos += _RANK.size
+
+        answer_bytes = data[pos:pos + (n + 1) // 2]
+        pos += (n + 1) // 2
+        marked_bytes = data[pos:pos + (n + 7) // 8]
+        if len(marked_bytes) != (n + 7) // 8:
+            raise SnapshotError("truncated snapshot")
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise SnapshotError(f"corrupt snapshot: {e}")
+
+    questions = _rebuild_questions(exam_id, items)
+    if len(questions) != n:
+        raise SnapshotError("question count does not match the snapshot")
+    if adaptive_exam:
+        from utils.question_manager import load_bank
+        from utils.exams import get_exam
+
+        bank = load_bank(get_exam(adaptive_exam)["bank"])
+        bank_pos = {q["id"]: i for i, q in enumerate(bank)}
+        for q in questions:
+            q["bank_pos"] = bank_pos.get(q["id"])
+
+    positions, answers = {}, {}
+    for i, q in enumerate(questions):
+        nibble = (answer_bytes[i // 2] >> (4 * (i % 2))) & 0xF
+        position = nibble - 1 if nibble else None
+        positions[str(i)] = position
+        answers[str(i)] = q["opciones"][position] if position is not None else None
+
+    state["exam_id"] = exam_id
+    state["exam_type"] = exam_type
+    state["attempt_id"] = attempt_id
+    state["form_id"] = form_id
+    state["user_data"] = {"nombre": nombre, "email": email}
+    state["selected_questions"] = questions
+    state["answer_positions"] = positions
+    state["answers"] = answers
+    state["marked"] = {i for i in range(n) if marked_bytes[i // 8] >> (i % 8) & 1}
+    state["start_time"] = None if math.isnan(start_time) else start_time
+    state["current_question_index"] = current_index
+    state["end_exam"] = bool(flags & FLAG_END_EXAM)
+    state["authenticated"] = True
+    if adaptive_exam:
+        state["adaptive_exam"] = adaptive_exam
+        state["adaptive_length"] = adaptive_length
+    return state
+
+
+def _bench_state(exam_id: str, use_form: bool) -> Dict[str, Any]:
+    """
+    Sesión de ejemplo a mitad de examen para el benchmark.
+    """
+    import random
+    import uuid
+    from utils.forms import build_form, materialize_form, _conn as _forms_conn, _insert as _insert_form
+    from utils.question_manager import select_exam_questions, arrange_options
+
+    rng = random.Random(0)
+    attempt_id = uuid.UUID(int=rng.getrandbits(128)).hex
+    if use_form:
+        # Forma registrada como en claim_form (en la base temporal de run_benchmark)
+        form = build_form(exam_id, rng.getrandbits(60))
+        with _forms_conn() as conn:
+            _insert_form(conn, form, attempt_id=f"benchmark-{exam_id}")
+        form_id, questions = form["form_id"], materialize_form(exam_id, form["items"])
+    else:
+        form_id, questions = None, select_exam_questions(exam_id, rng=rng)
+        arrange_options(questions, rng)
+    n = len(questions)
+    positions = {str(i): (rng.randrange(len(q["opciones"])) if i < n * 2 // 3 else None)
+                 for i, q in enumerate(questions)}
+    return {
+        "exam_id": exam_id,
+        "exam_type": exam_id,
+        "attempt_id": attempt_id,
+        "form_id": form_id,
+        "user_data": {"nombre": "Benchmark User", "email": "bench@example.com"},
+        "selected_questions": questions,
+        "answer_positions": positions,
+        "answers": {k: (questions[int(k)]["opciones"][v] if v is not None else None) for k, v in positions.items()},
+        "marked": {3, 17, min(n - 1, 42)},
+        "start_time": time.time(),
+        "current_question_index": n * 2 // 3,
+    }
+
+
+def run_benchmark(repeat: int = 2000) -> List[Dict[str, Any]]:
+    """
+    Tamaño y tiempo de snapshot / restore para sesiones típicas.
+    Las formas se registran en una base temporal, no en logs/forms.db.
+    """
+    from utils import storage
+
+    with storage.temporary_db_dir():
+        return _run_benchmark(repeat)
+
+
+def _run_benchmark(repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for label, exam_id, use_form in (("full (form)", "full", True), ("full (items)", "full", False),
+                                     ("short (items)", "short", False)):
+        state = _bench_state(exam_id, use_form)
+        data = snapshot_session(state)
+        restored = restore_session(data, {})
+        assert restored["answer_positions"] == state["answer_positions"]
+        assert [q["opciones"] for q in restored["selected_questions"]] == \
+               [q["opciones"] for q in state["selected_questions"]]
+
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            snapshot_session(state)
+        snapshot_us = (time.perf_counter() - t0) / repeat * 1e6
+
+        restores = max(1, repeat // 10)
+        t0 = time.perf_counter()
+        for _ in range(restores):
+            restore_session(data, {})
+        restore_us = (time.perf_counter() - t0) / restores * 1e6
+
+        results.append({
+            "session": label,
+            "questions": len(state["selected_questions"]),
+            "bytes": len(data),
+            "snapshot_us": round(snapshot_us, 1),
+            "restore_us": round(restore_us, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exam session snapshot benchmark.")
+    parser.add_argument("--bench", action="store_true", help="measure payload size and snapshot/restore time")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        return
+    for r in run_benchmark(args.repeat):
+        print(f"{r['session']:<14} {r['questions']:>4} questions  {r['bytes']:>5} bytes  "
+              f"snapshot {r['snapshot_us']:>7.1f} us  restore {r['restore_us']:>8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# utils/storage.py
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Carpeta donde viven las bases de datos locales (junto a logs/exam_activity.csv)
+DB_DIR = "logs"
+
+# Conexiones libres que se guardan por archivo; las que sobran se cierran
+MAX_IDLE_CONNECTIONS = 8
+
+_local = threading.local()
+_idle: Dict[str, List[sqlite3.Connection]] = {}
+_idle_lock = threading.Lock()
+
+
+class _Connection(sqlite3.Connection):
+    """
+    Conexión que recuerda qué esquemas ya se aplicaron en ella (ensure_schema).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.schemas = set()
+
+
+class _ThreadConnections(dict):
+    """
+    {ruta: conexión} del hilo actual. Cuando el hilo termina, Python libera
+    este dict y las conexiones vuelven a la reserva del proceso.
+    """
+
+    def __del__(self):
+        for path, conn in self.items():
+            try:
+                _release(path, conn)
+            except Exception:
+                pass
+
+
+def _release(path: str, conn: sqlite3.Connection):
+    """
+    Devuelve una conexión a la reserva (o la cierra si ya hay bastantes libres).
+    """
+    if conn.in_transaction:
+        conn.rollback()
+    with _idle_lock:
+        idle = _idle.setdefault(path, [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def get_connection(db_name="exam_results.db"):
+    """
+    Devuelve una conexión SQLite reutilizable para el hilo actual.
+
+    Streamlit ejecuta cada rerun del script en un hilo nuevo, así que una
+    conexión por hilo se abriría de nuevo en cada rerun. Cada hilo toma una
+    conexión de la reserva del proceso (por archivo) y la devuelve al
+    terminar; así se reutilizan entre reruns y sesiones sin que dos hilos la
+    usen a la vez. Se activa WAL para que las lecturas del panel de
+    administración no bloqueen las escrituras.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = _ThreadConnections()
+
+    path = os.path.join(DB_DIR, db_name)
+    conn = connections.get(path)
+    if conn is None:
+        with _idle_lock:
+            idle = _idle.get(path)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            if not os.path.exists(DB_DIR):
+                os.makedirs(DB_DIR)
+            # Pasa de un hilo a otro, pero nunca la usan dos a la vez
+            conn = sqlite3.connect(path, timeout=30, check_same_thread=False, factory=_Connection)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+    return conn
+
+
+def ensure_schema(conn, schema: str, upgrade: Optional[Callable] = None):
+    """
+    Ejecuta 'schema' (sentencias CREATE ... IF NOT EXISTS) la primera vez que
+    esta conexión lo ve y, si se pasa, upgrade(conn) para migrar bases antiguas.
+    La marca vive en la propia conexión: desaparece al cerrarla. Devuelve conn.
+    """
+    if schema not in conn.schemas:
+        conn.executescript(schema)
+        if upgrade is not None:
+            upgrade(conn)
+        conn.schemas.add(schema)
+    return conn
+
+
+def close_connection(db_name: str):
+    """
+    Cierra la conexión del hilo actual a 'db_name' sin devolverla a la reserva
+    (antes de borrar el archivo, p.ej. en los benchmarks).
+    """
+    path = os.path.join(DB_DIR, db_name)
+    connections = getattr(_local, "connections", None)
+    conn = connections.pop(path, None) if connections is not None else None
+    if conn is not None:
+        conn.close()
+    with _idle_lock:
+        for idle in _idle.pop(path, []):
+            idle.close()
+
+
+@contextmanager
+def temporary_db_dir():
+    """
+    Apunta DB_DIR a un directorio temporal mientras dura el bloque (benchmarks
+    y pruebas de carga): las bases reales de logs/ no se tocan. Al salir se
+    cierran las conexiones del hilo actual y de la reserva a ese directorio.
+    """
+    global DB_DIR
+    previous = DB_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        DB_DIR = tmp
+        try:
+            yield tmp
+        finally:
+            DB_DIR = previous
+            prefix = os.path.join(tmp, "")
+            connections = getattr(_local, "connections", None) or {}
+            for path in [p for p in connections if p.startswith(prefix)]:
+                connections.pop(path).close()
+            with _idle_lock:
+                for path in [p for p in _idle if p.startswith(prefix)]:
+                    for conn in _idle.pop(path):
+                        conn.close()
@@ -1,7 +1,9 @@
-import pandas as pd
 import streamlit as st
 
 def validate_selection(selected_questions, total_questions):
+    # pandas solo se importa cuando se usa esta utilidad
+    import pandas as pd
+
     # Contar preguntas por clasificación
     classification_count = {}
     for question in selected_questions: